@@ -0,0 +1,86 @@
+"""
+Low-stock alerts on threshold crossings.
+
+product_stock already holds on_hand against min_stock_level for every
+product. stock_alert_state remembers, per product, whether it was below its
+minimum the last time alerts were checked. One aggregation returns only the
+products whose state changed. Products that just went below their minimum
+get a notification. Products back above it are re-armed and alert again the
+next time they drop.
+"""
+
+from datetime import datetime, timezone
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+DUPLICATE_KEY = 11000
+
+
+def _crossing_stages(query):
+    return [
+        {'$match': query},
+        {'$lookup': {'from': 'stock_alert_state', 'localField': '_id', 'foreignField': '_id', 'as': 'state'}},
+        {'$project': {
+            'client_id': 1,
+            'sku': 1,
+            'name': 1,
+            'on_hand': 1,
+            'min_stock_level': 1,
+            'below_min': 1,
+            'was_below': {'$ifNull': [{'$arrayElemAt': ['$state.below_min', 0]}, False]},
+        }},
+        {'$match': {'$expr': {'$ne': ['$below_min', '$was_below']}}},
+    ]
+
+
+async def check_low_stock(db, query, recipient):
+    """Alert on products that crossed below their minimum. Returns (alerted, recovered)."""
+    crossings = await db.product_stock.aggregate(_crossing_stages(query)).to_list(length=None)
+    if not crossings:
+        return 0, 0
+
+    now = datetime.now(timezone.utc)
+    operations = []
+    for row in crossings:
+        update = {'$set': {
+            'below_min': row['below_min'],
+            'client_id': row.get('client_id'),
+            'sku': row.get('sku'),
+            'on_hand': row.get('on_hand', 0),
+            'min_stock_level': row.get('min_stock_level', 0),
+            'changed_at': now,
+        }}
+        # Only the run that flips the state owns the crossing
+        operations.append(UpdateOne({'_id': row['_id'], 'below_min': {'$ne': row['below_min']}}, update, upsert=True))
+
+    lost = set()
+    try:
+        await db.stock_alert_state.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        errors = e.details.get('writeErrors', [])
+        if any(error['code'] != DUPLICATE_KEY for error in errors):
+            raise
+        # A concurrent run already recorded these crossings
+        lost = {error['index'] for error in errors}
+
+    notifications = [
+        {
+            'type': 'low_stock',
+            'recipient': recipient,
+            'client_id': row.get('client_id'),
+            'product_id': row['_id'],
+            'sku': row.get('sku'),
+            'on_hand': row.get('on_hand', 0),
+            'min_stock_level': row.get('min_stock_level', 0),
+            'subject': f"Stock faible : {row.get('name', '')}",
+            'status': 'pending',
+            'created_at': now.replace(tzinfo=None).isoformat()
+        }
+        for index, row in enumerate(crossings)
+        if row['below_min'] and index not in lost
+    ]
+    if notifications:
+        await db.email_notifications.insert_many(notifications, ordered=False)
+    recovered = sum(1 for index, row in enumerate(crossings) if not row['below_min'] and index not in lost)
+    return len(notifications), recovered
@@ -0,0 +1,94 @@
+"""
+Benchmark de la facturation de fin de mois (POST /api/billing/runs)
+- Crée BENCH_TENANTS clients de test (code BENCH-xxxxx) avec commandes et réceptions sur la période,
+  directement en base via MONGO_URL / DB_NAME
+- Référence : /api/billing/invoices/generate client par client sur un échantillon, extrapolé
+- Facturation groupée de tous les clients, puis relance de la même période (doit être un no-op)
+
+Usage :
+    DB_NAME=wms_bench uvicorn server:app --port 8001 &
+    BASE_URL=http://localhost:8001 DB_NAME=wms_bench python benchmarks/bench_billing_run.py
+"""
+
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import httpx
+from pymongo import MongoClient
+
+BASE_URL = os.environ.get('BASE_URL', 'http://localhost:8001').rstrip('/')
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+DB_NAME = os.environ.get('DB_NAME', 'wms_database')
+USERNAME = os.environ.get('BENCH_USERNAME', 'admin')
+PASSWORD = os.environ.get('BENCH_PASSWORD', 'admin123')
+TENANTS = int(os.environ.get('BENCH_TENANTS', '1000'))
+ORDERS_PER_TENANT = int(os.environ.get('BENCH_ORDERS_PER_TENANT', '50'))
+SAMPLE = int(os.environ.get('BENCH_SAMPLE', '50'))
+# Période dédiée : ne touche pas à la facturation réelle
+PERIOD_START = datetime(2001, 1, 1)
+PERIOD_END = datetime(2001, 1, 31, 23, 59, 59)
+
+
+def seed(db):
+    existing = db.clients.count_documents({'code': {'$regex': '^BENCH-'}})
+    if existing >= TENANTS:
+        print(f"   {existing} clients de test déjà présents")
+        return
+    print(f"   Création de {TENANTS - existing} clients de test...")
+    clients = [
+        {'code': f'BENCH-{n:05d}', 'name': f'Bench {n}', 'email': f'bench{n}@test.fr', 'active': True, 'is_demo': False}
+        for n in range(existing, TENANTS)
+    ]
+    client_ids = db.clients.insert_many(clients).inserted_ids
+    orders, receipts = [], []
+    for n, client_id in enumerate(client_ids):
+        for i in range(ORDERS_PER_TENANT):
+            orders.append({
+                'order_number': f'BENCH-{client_id}-{i}',
+                'client_id': client_id,
+                'status': 'shipped',
+                'is_demo_tenant': False,
+                'created_at': PERIOD_START + timedelta(hours=i),
+            })
+        receipts.append({'receipt_number': f'BENCH-{client_id}', 'client_id': client_id, 'created_at': PERIOD_START + timedelta(days=n % 28)})
+    db.orders.insert_many(orders, ordered=False)
+    db.receipts.insert_many(receipts, ordered=False)
+
+
+async def run():
+    db = MongoClient(MONGO_URL)[DB_NAME]
+    print(f"🏁 Facturation de {TENANTS} clients ({ORDERS_PER_TENANT} commandes chacun)")
+    seed(db)
+    period = {'start_date': PERIOD_START.isoformat(), 'end_date': PERIOD_END.isoformat()}
+
+    async with httpx.AsyncClient(base_url=BASE_URL, timeout=600.0) as http:
+        response = await http.post('/api/auth/login', json={'username': USERNAME, 'password': PASSWORD})
+        response.raise_for_status()
+        headers = {'Authorization': f"Bearer {response.json()['token']}"}
+
+        sample = [str(c['_id']) for c in db.clients.find({'code': {'$regex': '^BENCH-'}}, {'_id': 1}).limit(SAMPLE)]
+        started = time.perf_counter()
+        for client_id in sample:
+            r = await http.post('/api/billing/invoices/generate', headers=headers, json={'client_id': client_id, **period})
+            r.raise_for_status()
+        per_client = (time.perf_counter() - started) / len(sample)
+        print(f"   Client par client : {per_client * 1000:.1f} ms/client -> ~{per_client * TENANTS:.1f} s pour {TENANTS} clients")
+        # Les factures manuelles de l'échantillon ne comptent pas pour la facturation groupée
+        db.invoices.delete_many({'client_id': {'$in': [c['_id'] for c in db.clients.find({'code': {'$regex': '^BENCH-'}}, {'_id': 1}).limit(SAMPLE)]},
+                                 'billing_run_id': {'$exists': False}})
+
+        for label in ('Facturation groupée', 'Relance (idempotente)'):
+            started = time.perf_counter()
+            r = await http.post('/api/billing/runs', headers=headers, json=period)
+            r.raise_for_status()
+            result = r.json()
+            print(f"   {label:<22}: {time.perf_counter() - started:6.2f} s  |  {result['invoices_created']} factures  |  "
+                  f"déjà terminée : {result['already_completed']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(run()))
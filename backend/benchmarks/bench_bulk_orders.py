@@ -0,0 +1,74 @@
+"""
+Benchmark d'import de commandes en masse (POST /api/orders/bulk)
+- Crée N produits de test puis importe M commandes (3 lignes chacune) par lots
+- Mesure le débit en commandes/s (objectif : >= 2000 commandes/s)
+
+Usage :
+    BASE_URL=http://localhost:8001 BENCH_CLIENT_ID=<id client> python benchmarks/bench_bulk_orders.py
+"""
+
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+
+import httpx
+
+BASE_URL = os.environ.get('BASE_URL', 'http://localhost:8001').rstrip('/')
+USERNAME = os.environ.get('BENCH_USERNAME', 'admin')
+PASSWORD = os.environ.get('BENCH_PASSWORD', 'admin123')
+CLIENT_ID = os.environ.get('BENCH_CLIENT_ID')
+TOTAL_ORDERS = int(os.environ.get('BENCH_TOTAL', '20000'))
+BATCH_SIZE = int(os.environ.get('BENCH_BATCH', '5000'))
+PRODUCTS = int(os.environ.get('BENCH_PRODUCTS', '50'))
+TARGET = 2000
+
+
+async def run():
+    async with httpx.AsyncClient(base_url=BASE_URL, timeout=300.0) as http:
+        response = await http.post('/api/auth/login', json={'username': USERNAME, 'password': PASSWORD})
+        response.raise_for_status()
+        headers = {'Authorization': f"Bearer {response.json()['token']}"}
+
+        client_id = CLIENT_ID
+        if not client_id:
+            clients = (await http.get('/api/clients', headers=headers)).json()
+            client_id = clients[0]['id']
+
+        run_id = uuid.uuid4().hex[:8]
+        skus = [f'BENCH-{run_id}-{i:04d}' for i in range(PRODUCTS)]
+        for sku in skus:
+            r = await http.post('/api/products', headers=headers, json={
+                'client_id': client_id, 'sku': sku, 'name': f'Produit bench {sku}'
+            })
+            r.raise_for_status()
+
+        def order(i):
+            return {
+                'customer_name': f'Client bench {i}',
+                'external_order_id': f'BENCH-{run_id}-{i}',
+                'lines': [{'sku': random.choice(skus), 'quantity': random.randint(1, 5)} for _ in range(3)]
+            }
+
+        created = failed = 0
+        started = time.perf_counter()
+        for start in range(0, TOTAL_ORDERS, BATCH_SIZE):
+            batch = [order(i) for i in range(start, min(start + BATCH_SIZE, TOTAL_ORDERS))]
+            r = await http.post('/api/orders/bulk', headers=headers, json={'client_id': client_id, 'orders': batch})
+            r.raise_for_status()
+            body = r.json()
+            created += body['created']
+            failed += body['failed']
+        elapsed = time.perf_counter() - started
+
+    rate = created / elapsed if elapsed else 0.0
+    print(f"🏁 {TOTAL_ORDERS} commandes par lots de {BATCH_SIZE} sur {BASE_URL}")
+    print(f"   Créées  : {created}  |  Rejetées : {failed}")
+    print(f"   Débit   : {rate:.0f} commandes/s ({elapsed:.2f} s) — objectif {TARGET}/s")
+    return 0 if rate >= TARGET and not failed else 1
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(run()))
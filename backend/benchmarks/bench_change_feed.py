@@ -0,0 +1,113 @@
+"""
+Benchmark du flux temps réel (/api/changes/stream, SSE)
+- Ouvre BENCH_CONNECTIONS connexions SSE inactives (client de test) sur un seul worker
+- Relève la mémoire du serveur (VmRSS) avant / après si BENCH_SERVER_PID est fourni
+- Crée BENCH_WRITES commandes et mesure le délai écriture -> réception sur toutes les connexions (p50 / p95)
+
+Usage (le serveur doit pointer sur un replica set, voir benchmarks/replset.py) :
+    ulimit -n 65536
+    MONGO_URL=mongodb://127.0.0.1:27018/?replicaSet=rs0 uvicorn server:app --port 8001 & echo $!
+    BASE_URL=http://localhost:8001 BENCH_SERVER_PID=<pid> python benchmarks/bench_change_feed.py
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import httpx
+
+BASE_URL = os.environ.get('BASE_URL', 'http://localhost:8001').rstrip('/')
+CLIENT_USERNAME = os.environ.get('BENCH_USERNAME', 'test')
+CLIENT_PASSWORD = os.environ.get('BENCH_PASSWORD', 'test')
+ADMIN_USERNAME = os.environ.get('BENCH_ADMIN_USERNAME', 'admin')
+ADMIN_PASSWORD = os.environ.get('BENCH_ADMIN_PASSWORD', 'admin123')
+CONNECTIONS = int(os.environ.get('BENCH_CONNECTIONS', '2000'))
+WRITES = int(os.environ.get('BENCH_WRITES', '20'))
+SERVER_PID = os.environ.get('BENCH_SERVER_PID')
+
+
+def server_rss_mb():
+    with open(f'/proc/{SERVER_PID}/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+async def login(http, username, password):
+    response = await http.post('/api/auth/login', json={'username': username, 'password': password})
+    response.raise_for_status()
+    return response.json()
+
+
+async def listen(http, token, ready, received):
+    """Une connexion SSE : signale 'ready', puis horodate chaque événement 'change' reçu"""
+    async with http.stream('GET', f'/api/changes/stream?token={token}&collections=orders') as r:
+        r.raise_for_status()
+        event = None
+        async for line in r.aiter_lines():
+            if line.startswith('event: '):
+                event = line[7:]
+            elif line.startswith('data: ') and event == 'ready':
+                ready.release()
+            elif line.startswith('data: ') and event == 'change':
+                received.append(time.perf_counter())
+
+
+async def run():
+    limits = httpx.Limits(max_connections=CONNECTIONS + 10, max_keepalive_connections=CONNECTIONS + 10)
+    async with httpx.AsyncClient(base_url=BASE_URL, timeout=httpx.Timeout(60.0, read=None), limits=limits) as http:
+        client_login = await login(http, CLIENT_USERNAME, CLIENT_PASSWORD)
+        admin_login = await login(http, ADMIN_USERNAME, ADMIN_PASSWORD)
+        admin_headers = {'Authorization': f"Bearer {admin_login['token']}"}
+        client_id = client_login['user']['client_id']
+
+        print(f"🏁 {CONNECTIONS} connexions SSE inactives, {WRITES} écritures")
+        rss_before = server_rss_mb() if SERVER_PID else None
+        ready = asyncio.Semaphore(0)
+        received = []
+        started = time.perf_counter()
+        listeners = [asyncio.create_task(listen(http, client_login['token'], ready, received)) for _ in range(CONNECTIONS)]
+        for _ in range(CONNECTIONS):
+            await ready.acquire()
+        print(f"   Connexions ouvertes en {time.perf_counter() - started:.1f} s")
+        if SERVER_PID:
+            rss_after = server_rss_mb()
+            print(f"   Mémoire serveur : {rss_before:.0f} -> {rss_after:.0f} Mo "
+                  f"({(rss_after - rss_before) * 1024 / CONNECTIONS:.1f} Ko par connexion)")
+
+        latencies = []
+        for n in range(WRITES):
+            received.clear()
+            sent_at = time.perf_counter()
+            r = await http.post('/api/orders/create', headers=admin_headers, json={
+                'client_id': client_id,
+                'customer_name': f'BENCH_FEED {n}',
+                'customer_email': f'feed{n}@test.fr',
+                'shipping_address': '1 Rue du Test, 75001 Paris',
+                'products': [],
+            })
+            r.raise_for_status()
+            deadline = time.perf_counter() + 10
+            while len(received) < CONNECTIONS and time.perf_counter() < deadline:
+                await asyncio.sleep(0.005)
+            if len(received) < CONNECTIONS:
+                print(f"   ⚠️ écriture {n} : {len(received)}/{CONNECTIONS} connexions servies en 10 s")
+            latencies += [(t - sent_at) * 1000 for t in received]
+            await asyncio.sleep(0.2)
+
+        for task in listeners:
+            task.cancel()
+        await asyncio.gather(*listeners, return_exceptions=True)
+
+    latencies.sort()
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+    print(f"   Écriture -> navigateur : p50 {statistics.median(latencies):.1f} ms  |  p95 {p95:.1f} ms  "
+          f"({len(latencies)} livraisons)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(run()))
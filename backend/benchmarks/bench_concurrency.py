@@ -0,0 +1,80 @@
+"""
+Benchmark de concurrence pour l'API NEWSTAQ WMS
+- Envoie N requêtes authentifiées en parallèle (200 par défaut) sur les routes de lecture
+- Mesure le débit et les latences p50 / p95 / p99
+
+Usage (avant / après) :
+    BASE_URL=http://localhost:8001 python benchmarks/bench_concurrency.py
+    git checkout <commit-avant> && uvicorn server:app --port 8001   # puis relancer le script
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import httpx
+
+BASE_URL = os.environ.get('BASE_URL', 'http://localhost:8001').rstrip('/')
+USERNAME = os.environ.get('BENCH_USERNAME', 'admin')
+PASSWORD = os.environ.get('BENCH_PASSWORD', 'admin123')
+IN_FLIGHT = int(os.environ.get('BENCH_IN_FLIGHT', '200'))
+TOTAL_REQUESTS = int(os.environ.get('BENCH_TOTAL', '2000'))
+
+ENDPOINTS = [
+    '/api/dashboard/stats',
+    '/api/products',
+    '/api/orders',
+    '/api/inventory',
+    '/api/receipts',
+    '/api/health',
+]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run():
+    limits = httpx.Limits(max_connections=IN_FLIGHT, max_keepalive_connections=IN_FLIGHT)
+    async with httpx.AsyncClient(base_url=BASE_URL, timeout=60.0, limits=limits) as http:
+        response = await http.post('/api/auth/login', json={'username': USERNAME, 'password': PASSWORD})
+        response.raise_for_status()
+        headers = {'Authorization': f"Bearer {response.json()['token']}"}
+
+        latencies = []
+        errors = 0
+        semaphore = asyncio.Semaphore(IN_FLIGHT)
+
+        async def one(i):
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    r = await http.get(ENDPOINTS[i % len(ENDPOINTS)], headers=headers)
+                    if r.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(TOTAL_REQUESTS)))
+        elapsed = time.perf_counter() - started
+
+    print(f"🏁 {TOTAL_REQUESTS} requêtes, {IN_FLIGHT} en parallèle sur {BASE_URL}")
+    print(f"   Débit   : {TOTAL_REQUESTS / elapsed:.1f} req/s ({elapsed:.2f} s)")
+    print(f"   Erreurs : {errors}")
+    print(f"   p50     : {statistics.median(latencies):.1f} ms")
+    print(f"   p95     : {percentile(latencies, 95):.1f} ms")
+    print(f"   p99     : {percentile(latencies, 99):.1f} ms")
+    return errors
+
+
+if __name__ == '__main__':
+    sys.exit(1 if asyncio.run(run()) else 0)
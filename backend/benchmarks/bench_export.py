@@ -0,0 +1,82 @@
+"""
+Benchmark des exports en flux (/api/export/{ressource})
+- Télécharge l'export complet et compte lignes et octets reçus
+- Relève la mémoire du serveur (VmRSS / pic VmHWM) pendant l'export si BENCH_SERVER_PID est fourni
+- Affiche le débit en lignes/s
+
+Usage :
+    uvicorn server:app --port 8001 & echo $!    # PID du serveur
+    BASE_URL=http://localhost:8001 BENCH_SERVER_PID=<pid> BENCH_RESOURCE=orders python benchmarks/bench_export.py
+    # Pour un gros volume, importer d'abord des commandes avec benchmarks/bench_bulk_orders.py (BENCH_TOTAL=1000000)
+"""
+
+import asyncio
+import os
+import sys
+import time
+import zlib
+
+import httpx
+
+BASE_URL = os.environ.get('BASE_URL', 'http://localhost:8001').rstrip('/')
+USERNAME = os.environ.get('BENCH_USERNAME', 'admin')
+PASSWORD = os.environ.get('BENCH_PASSWORD', 'admin123')
+RESOURCE = os.environ.get('BENCH_RESOURCE', 'orders')
+FORMAT = os.environ.get('BENCH_FORMAT', 'csv')
+GZIP = os.environ.get('BENCH_GZIP', 'false').lower() == 'true'
+SERVER_PID = os.environ.get('BENCH_SERVER_PID')
+
+
+def server_memory_kb():
+    """(VmRSS, VmHWM) du serveur en Ko, lus dans /proc (Linux)"""
+    values = {}
+    with open(f'/proc/{SERVER_PID}/status') as status:
+        for line in status:
+            key, _, value = line.partition(':')
+            if key in ('VmRSS', 'VmHWM'):
+                values[key] = int(value.split()[0])
+    return values.get('VmRSS', 0), values.get('VmHWM', 0)
+
+
+async def sample_memory(samples, stop):
+    while not stop.is_set():
+        samples.append(server_memory_kb()[0])
+        await asyncio.sleep(0.1)
+
+
+async def run():
+    async with httpx.AsyncClient(base_url=BASE_URL, timeout=None) as http:
+        response = await http.post('/api/auth/login', json={'username': USERNAME, 'password': PASSWORD})
+        response.raise_for_status()
+        headers = {'Authorization': f"Bearer {response.json()['token']}"}
+
+        samples, stop = [], asyncio.Event()
+        sampler = asyncio.ensure_future(sample_memory(samples, stop)) if SERVER_PID else None
+        rss_before = server_memory_kb()[0] if SERVER_PID else 0
+
+        lines = received = 0
+        decompressor = zlib.decompressobj(31) if GZIP else None
+        started = time.perf_counter()
+        params = {'format': FORMAT, 'gzip': str(GZIP).lower()}
+        async with http.stream('GET', f'/api/export/{RESOURCE}', headers=headers, params=params) as r:
+            r.raise_for_status()
+            async for chunk in r.aiter_raw():
+                received += len(chunk)
+                lines += (decompressor.decompress(chunk) if decompressor else chunk).count(b'\n')
+        elapsed = time.perf_counter() - started
+        stop.set()
+        if sampler:
+            await sampler
+
+    rows = lines - (1 if FORMAT == 'csv' else 0)
+    print(f"🏁 Export {RESOURCE} ({FORMAT}{', gzip' if GZIP else ''}) depuis {BASE_URL}")
+    print(f"   Lignes  : {rows}  |  Reçu : {received / 1e6:.1f} Mo en {elapsed:.2f} s")
+    print(f"   Débit   : {rows / elapsed:.0f} lignes/s")
+    if SERVER_PID:
+        print(f"   RSS serveur : avant {rss_before / 1024:.0f} Mo, pic pendant l'export {max(samples, default=0) / 1024:.0f} Mo "
+              f"(VmHWM {server_memory_kb()[1] / 1024:.0f} Mo)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(run()))
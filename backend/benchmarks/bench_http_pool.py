@@ -0,0 +1,73 @@
+"""
+Benchmark des appels HTTP sortants : client partagé (pool) vs un client par appel
+- Interroge un serveur bouchon local (par défaut le faux Shopify de benchmarks/fake_shopify.py)
+- Mesure le débit et les latences p50 / p95 des deux variantes
+
+Usage :
+    FAKE_SHOPIFY_ORDERS=100 uvicorn benchmarks.fake_shopify:app --port 8010 &
+    STUB_URL=http://localhost:8010 python benchmarks/bench_http_pool.py
+    # Avec TLS devant le bouchon, l'écart est bien plus grand (poignée de main évitée)
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from http_clients import HttpClients  # noqa: E402
+
+STUB_URL = os.environ.get('STUB_URL', 'http://localhost:8010').rstrip('/')
+PATH = os.environ.get('STUB_PATH', '/admin/api/2024-01/orders.json?limit=1')
+IN_FLIGHT = int(os.environ.get('BENCH_IN_FLIGHT', '50'))
+TOTAL_REQUESTS = int(os.environ.get('BENCH_TOTAL', '2000'))
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def measure(call):
+    latencies = []
+    semaphore = asyncio.Semaphore(IN_FLIGHT)
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            response = await call()
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(TOTAL_REQUESTS)))
+    return latencies, time.perf_counter() - started
+
+
+async def run():
+    async def per_call():
+        async with httpx.AsyncClient(timeout=30.0) as http:
+            return await http.get(STUB_URL + PATH)
+
+    clients = HttpClients(max_connections=IN_FLIGHT, max_keepalive=IN_FLIGHT)
+    pooled = clients.get('stub')
+
+    async def shared():
+        return await pooled.get(STUB_URL + PATH)
+
+    print(f"🏁 {TOTAL_REQUESTS} requêtes, {IN_FLIGHT} en parallèle sur {STUB_URL}")
+    for label, call in (('Client par appel', per_call), ('Client partagé  ', shared)):
+        latencies, elapsed = await measure(call)
+        print(f"   {label} : {TOTAL_REQUESTS / elapsed:7.1f} req/s  p50 {statistics.median(latencies):6.1f} ms  "
+              f"p95 {percentile(latencies, 95):6.1f} ms")
+    print(f"   Pool : {clients.stats()['upstreams']['stub']}")
+    await clients.aclose()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(run()))
@@ -0,0 +1,132 @@
+"""
+Benchmark de /api/inventory sur un gros volume (1 million de lignes par défaut)
+- Complète la collection inventory jusqu'à BENCH_ROWS lignes (produits et emplacements existants,
+  client_id / is_demo_tenant recopiés du produit), directement en base via MONGO_URL / DB_NAME
+- Mesure p50 / p95 de la première page, de la 10e page (curseur), des filtres sku / zone / emplacement
+  et de la vue admin tous clients
+- Affiche les clés et documents examinés par MongoDB pour le filtre client (explain)
+
+Usage :
+    DB_NAME=wms_bench uvicorn server:app --port 8001 &
+    BASE_URL=http://localhost:8001 DB_NAME=wms_bench python benchmarks/bench_inventory.py
+    # Comparer avec la version précédente : git checkout <commit> -- server.py, relancer le serveur
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+import httpx
+from pymongo import MongoClient
+
+BASE_URL = os.environ.get('BASE_URL', 'http://localhost:8001').rstrip('/')
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+DB_NAME = os.environ.get('DB_NAME', 'wms_database')
+CLIENT_USERNAME = os.environ.get('BENCH_USERNAME', 'test')
+CLIENT_PASSWORD = os.environ.get('BENCH_PASSWORD', 'test')
+ADMIN_USERNAME = os.environ.get('BENCH_ADMIN_USERNAME', 'admin')
+ADMIN_PASSWORD = os.environ.get('BENCH_ADMIN_PASSWORD', 'admin123')
+ROWS = int(os.environ.get('BENCH_ROWS', '1000000'))
+REPEAT = int(os.environ.get('BENCH_REPEAT', '20'))
+PAGE_SIZE = int(os.environ.get('BENCH_PAGE_SIZE', '500'))
+BATCH = 10000
+
+
+def seed(db):
+    """Complète inventory jusqu'à ROWS lignes, par lots de BATCH"""
+    existing = db.inventory.estimated_document_count()
+    missing = ROWS - existing
+    if missing <= 0:
+        print(f"   {existing} lignes d'inventaire déjà présentes")
+        return
+    products = list(db.products.find({}, {'client_id': 1, 'is_demo_tenant': 1}))
+    locations = [l['_id'] for l in db.locations.find({}, {'_id': 1})]
+    if not products or not locations:
+        raise SystemExit('❌ Base vide : démarrer le serveur une fois pour créer les données de démo')
+    print(f"   Insertion de {missing} lignes d'inventaire...")
+    started = time.perf_counter()
+    now = datetime.now(timezone.utc)
+    for offset in range(0, missing, BATCH):
+        rows = []
+        for n in range(offset, min(offset + BATCH, missing)):
+            product = products[n % len(products)]
+            rows.append({
+                'product_id': product['_id'],
+                'location_id': locations[(n // len(products)) % len(locations)],
+                'client_id': product['client_id'],
+                'is_demo_tenant': product.get('is_demo_tenant', False),
+                'quantity': n % 200,
+                'lot_number': f'BENCH-{n:07d}',
+                'last_updated': now,
+            })
+        db.inventory.insert_many(rows, ordered=False)
+    print(f"   ✅ {missing} lignes insérées en {time.perf_counter() - started:.1f} s")
+
+
+def explain_tenant_page(db, client_id):
+    """Clés / documents examinés pour la première page d'un client"""
+    plan = db.inventory.find({'client_id': client_id}).sort('_id', 1).limit(PAGE_SIZE + 1).explain()
+    stats = plan.get('executionStats', {})
+    return stats.get('totalKeysExamined'), stats.get('totalDocsExamined')
+
+
+async def login(http, username, password):
+    response = await http.post('/api/auth/login', json={'username': username, 'password': password})
+    response.raise_for_status()
+    return {'Authorization': f"Bearer {response.json()['token']}"}
+
+
+async def timed(http, headers, path, pages=1):
+    """Latence (ms) de `pages` pages consécutives, en suivant X-Next-Cursor"""
+    started = time.perf_counter()
+    cursor = None
+    for _ in range(pages):
+        url = path + (f'&cursor={cursor}' if cursor else '')
+        r = await http.get(url, headers=headers)
+        r.raise_for_status()
+        cursor = r.headers.get('X-Next-Cursor')
+        if not cursor:
+            break
+    return (time.perf_counter() - started) * 1000
+
+
+async def run():
+    db = MongoClient(MONGO_URL)[DB_NAME]
+    print(f"🏁 /api/inventory sur {ROWS} lignes ({DB_NAME}), pages de {PAGE_SIZE}, {REPEAT} répétitions")
+    seed(db)
+
+    async with httpx.AsyncClient(base_url=BASE_URL, timeout=120.0) as http:
+        client_headers = await login(http, CLIENT_USERNAME, CLIENT_PASSWORD)
+        admin_headers = await login(http, ADMIN_USERNAME, ADMIN_PASSWORD)
+        user = db.users.find_one({'username': CLIENT_USERNAME}, {'client_id': 1})
+        sample = db.inventory.find_one({'client_id': user['client_id']}) or {}
+        product = db.products.find_one({'_id': sample.get('product_id')}, {'sku': 1}) or {}
+        location = db.locations.find_one({'_id': sample.get('location_id')}, {'code': 1, 'zone_id': 1}) or {}
+
+        base = f'/api/inventory?limit={PAGE_SIZE}'
+        scenarios = [
+            ('Client, 1re page', client_headers, base, 1),
+            ('Client, 10 pages', client_headers, base, 10),
+            ('Client, filtre SKU', client_headers, f"{base}&sku={product.get('sku', '')}", 1),
+            ('Client, filtre zone', client_headers, f"{base}&zone_id={location.get('zone_id', '')}", 1),
+            ('Client, allée (code)', client_headers, f"{base}&location_code={location.get('code', '')[:4]}", 1),
+            ('Client, champs réduits', client_headers, f'{base}&fields=id,product_id,quantity', 1),
+            ('Admin tous clients', admin_headers, base, 1),
+        ]
+        for label, headers, path, pages in scenarios:
+            # Échauffement (cache WiredTiger, pool de connexions)
+            await timed(http, headers, path, pages)
+            samples = sorted([await timed(http, headers, path, pages) for _ in range(REPEAT)])
+            p95 = samples[max(0, int(len(samples) * 0.95) - 1)]
+            print(f"   {label:<24}: p50 {statistics.median(samples):8.1f} ms  |  p95 {p95:8.1f} ms")
+
+    keys, docs = explain_tenant_page(db, user['client_id'])
+    print(f"   Explain filtre client : {keys} clés, {docs} documents examinés pour {PAGE_SIZE + 1} lignes")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(run()))
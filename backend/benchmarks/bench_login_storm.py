@@ -0,0 +1,82 @@
+"""
+Benchmark "changement d'équipe" : tempête de connexions + trafic API normal
+- Phase 1 : trafic API normal seul (référence)
+- Phase 2 : le même trafic pendant que N opérateurs se connectent en boucle
+- Compare la latence p99 du trafic normal entre les deux phases et le débit de login
+
+Usage :
+    BASE_URL=http://localhost:8001 python benchmarks/bench_login_storm.py
+"""
+
+import asyncio
+import os
+import time
+
+import httpx
+
+BASE_URL = os.environ.get('BASE_URL', 'http://localhost:8001').rstrip('/')
+USERNAME = os.environ.get('BENCH_USERNAME', 'admin')
+PASSWORD = os.environ.get('BENCH_PASSWORD', 'admin123')
+OPERATORS = int(os.environ.get('BENCH_OPERATORS', '80'))
+API_CONCURRENCY = int(os.environ.get('BENCH_API_CONCURRENCY', '20'))
+PHASE_SECONDS = float(os.environ.get('BENCH_PHASE_SECONDS', '15'))
+
+API_ENDPOINTS = ['/api/products', '/api/orders', '/api/dashboard/stats', '/api/health']
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def api_traffic(http, headers, deadline, latencies):
+    i = 0
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        await http.get(API_ENDPOINTS[i % len(API_ENDPOINTS)], headers=headers)
+        latencies.append((time.perf_counter() - started) * 1000)
+        i += 1
+
+
+async def login_storm(http, deadline, latencies, statuses):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        r = await http.post('/api/auth/login', json={'username': USERNAME, 'password': PASSWORD})
+        latencies.append((time.perf_counter() - started) * 1000)
+        statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+
+
+async def phase(http, headers, with_storm):
+    deadline = time.perf_counter() + PHASE_SECONDS
+    api_latencies, login_latencies, statuses = [], [], {}
+    tasks = [api_traffic(http, headers, deadline, api_latencies) for _ in range(API_CONCURRENCY)]
+    if with_storm:
+        tasks += [login_storm(http, deadline, login_latencies, statuses) for _ in range(OPERATORS)]
+    await asyncio.gather(*tasks)
+    return api_latencies, login_latencies, statuses
+
+
+async def run():
+    limits = httpx.Limits(max_connections=OPERATORS + API_CONCURRENCY)
+    async with httpx.AsyncClient(base_url=BASE_URL, timeout=120.0, limits=limits) as http:
+        r = await http.post('/api/auth/login', json={'username': USERNAME, 'password': PASSWORD})
+        r.raise_for_status()
+        headers = {'Authorization': f"Bearer {r.json()['token']}"}
+
+        base_api, _, _ = await phase(http, headers, with_storm=False)
+        storm_api, logins, statuses = await phase(http, headers, with_storm=True)
+
+        pool = await http.get('/api/admin/password-pool-stats', headers=headers)
+
+    print(f"🏁 {PHASE_SECONDS:.0f} s par phase, {API_CONCURRENCY} clients API, {OPERATORS} opérateurs")
+    print(f"   API seule        : p50 {percentile(base_api, 50):.1f} ms | p99 {percentile(base_api, 99):.1f} ms")
+    print(f"   API + tempête    : p50 {percentile(storm_api, 50):.1f} ms | p99 {percentile(storm_api, 99):.1f} ms")
+    print(f"   Logins           : {len(logins) / PHASE_SECONDS:.1f} /s | p99 {percentile(logins, 99):.1f} ms | statuts {statuses}")
+    if pool.status_code == 200:
+        print(f"   Pool bcrypt      : {pool.json()['password_pool']}")
+
+
+if __name__ == '__main__':
+    asyncio.run(run())
@@ -0,0 +1,62 @@
+"""
+Benchmark des tournées de préparation (pick_route)
+- Entrepôt de démonstration (4 zones x 3 allées x 5 racks) et grand entrepôt
+  (BENCH_ZONES zones x BENCH_AISLES allées x BENCH_RACKS racks x 4 niveaux)
+- Pour des tournées de 10 à 200 lignes : distance parcourue dans l'ordre des codes
+  contre la tournée optimisée, et temps de calcul (médiane sur BENCH_ROUNDS tirages)
+
+Usage :
+    python benchmarks/bench_pick_route.py
+"""
+
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pick_route import Layout, naive_order, plan_route, route_length  # noqa: E402
+
+ZONES = int(os.environ.get('BENCH_ZONES', '6'))
+AISLES = int(os.environ.get('BENCH_AISLES', '10'))
+RACKS = int(os.environ.get('BENCH_RACKS', '30'))
+ROUNDS = int(os.environ.get('BENCH_ROUNDS', '20'))
+LINES = (10, 50, 100, 200)
+
+
+def grid(zones, aisles, racks, levels):
+    return [f'Z{z}-{chr(65 + a)}{r:02d}-{l}'
+            for z in range(1, zones + 1) for a in range(aisles) for r in range(1, racks + 1) for l in range(1, levels + 1)]
+
+
+def bench(name, codes):
+    layout = Layout(codes)
+    rng = random.Random(42)
+    print(f"   {name} ({len(codes)} emplacements)")
+    for lines in LINES:
+        naive, optimized, timings = [], [], []
+        for _ in range(ROUNDS):
+            # Lignes de commande : plusieurs lignes peuvent tomber sur le même emplacement
+            picks = rng.choices(codes, k=lines)
+            started = time.perf_counter()
+            route = plan_route(layout, picks)
+            timings.append(time.perf_counter() - started)
+            naive.append(route_length(layout, naive_order(picks)))
+            optimized.append(route.distance)
+        gain = 1 - sum(optimized) / sum(naive)
+        print(f"     {lines:>3} lignes : {statistics.mean(naive):7.0f} m -> {statistics.mean(optimized):7.0f} m "
+              f"(-{gain:.0%})  |  calcul {statistics.median(timings) * 1000:6.2f} ms (max {max(timings) * 1000:.2f} ms)")
+
+
+async def run():
+    print(f"🏁 Tournées de préparation : ordre des codes contre tournée optimisée ({ROUNDS} tirages)")
+    bench('Entrepôt de démonstration', grid(4, 3, 5, 3))
+    bench('Grand entrepôt', grid(ZONES, AISLES, RACKS, 4))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(run()))
@@ -0,0 +1,86 @@
+"""
+Rejeu d'une trace de polling du portail client (produits, inventaire, commandes)
+- Passe 1 (référence) : sans If-None-Match ni compression (Accept-Encoding: identity)
+- Passe 2 : ETag + If-None-Match et compression (br, gzip)
+- Une écriture (mise à jour d'un produit) toutes les BENCH_WRITE_EVERY rondes invalide les ETags
+- Mesure octets reçus, réponses 304 et CPU serveur consommé (utime + stime, si BENCH_SERVER_PID est fourni)
+
+Usage :
+    uvicorn server:app --port 8001 & echo $!
+    BASE_URL=http://localhost:8001 BENCH_SERVER_PID=<pid> python benchmarks/bench_polling.py
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+
+BASE_URL = os.environ.get('BASE_URL', 'http://localhost:8001').rstrip('/')
+USERNAME = os.environ.get('BENCH_USERNAME', 'admin')
+PASSWORD = os.environ.get('BENCH_PASSWORD', 'admin123')
+ROUNDS = int(os.environ.get('BENCH_ROUNDS', '200'))
+WRITE_EVERY = int(os.environ.get('BENCH_WRITE_EVERY', '20'))
+SERVER_PID = os.environ.get('BENCH_SERVER_PID')
+
+TRACE = ['/api/products?limit=200', '/api/inventory?limit=500', '/api/orders?limit=100']
+
+
+def server_cpu_seconds():
+    with open(f'/proc/{SERVER_PID}/stat') as stat:
+        fields = stat.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+async def replay(http, headers, conditional, encoding, product_id):
+    received = not_modified = 0
+    etags = {}
+    cpu_before = server_cpu_seconds() if SERVER_PID else 0.0
+    started = time.perf_counter()
+    for round_number in range(ROUNDS):
+        if WRITE_EVERY and product_id and round_number % WRITE_EVERY == WRITE_EVERY - 1:
+            r = await http.put(f'/api/products/{product_id}', headers=headers, json={'description': f'polling {round_number}'})
+            r.raise_for_status()
+        for path in TRACE:
+            request_headers = {**headers, 'Accept-Encoding': encoding}
+            if conditional and path in etags:
+                request_headers['If-None-Match'] = etags[path]
+            async with http.stream('GET', path, headers=request_headers) as r:
+                raw = b''.join([chunk async for chunk in r.aiter_raw()])
+            received += len(raw)
+            if r.status_code == 304:
+                not_modified += 1
+            elif 'etag' in r.headers:
+                etags[path] = r.headers['etag']
+    elapsed = time.perf_counter() - started
+    cpu = server_cpu_seconds() - cpu_before if SERVER_PID else None
+    return received, not_modified, elapsed, cpu
+
+
+async def run():
+    async with httpx.AsyncClient(base_url=BASE_URL, timeout=60.0) as http:
+        response = await http.post('/api/auth/login', json={'username': USERNAME, 'password': PASSWORD})
+        response.raise_for_status()
+        headers = {'Authorization': f"Bearer {response.json()['token']}"}
+        products = (await http.get('/api/products?limit=1&fields=id', headers=headers)).json()
+        product_id = products[0]['id'] if products else None
+
+        total = ROUNDS * len(TRACE)
+        print(f"🏁 Trace de {ROUNDS} rondes x {len(TRACE)} routes ({total} requêtes), écriture toutes les {WRITE_EVERY} rondes")
+        results = {}
+        for label, conditional, encoding in (('Référence', False, 'identity'), ('ETag + br/gzip', True, 'br, gzip')):
+            received, not_modified, elapsed, cpu = await replay(http, headers, conditional, encoding, product_id)
+            results[label] = (received, cpu)
+            cpu_text = f"  |  CPU serveur {cpu:.2f} s" if cpu is not None else ''
+            print(f"   {label:<15}: {received / 1e6:8.2f} Mo reçus  |  {not_modified:4d} réponses 304  |  {elapsed:6.2f} s{cpu_text}")
+
+    (base_bytes, base_cpu), (new_bytes, new_cpu) = results.values()
+    print(f"   Octets économisés : {100 * (1 - new_bytes / base_bytes):.1f} %")
+    if SERVER_PID and base_cpu:
+        print(f"   CPU économisé     : {100 * (1 - new_cpu / base_cpu):.1f} %")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(run()))
@@ -0,0 +1,79 @@
+"""
+Benchmark du moteur de tarifs transporteurs
+- Moteur seul : cotation de BENCH_PARCELS colis sur tous les services (à froid, puis à chaud)
+- API : BENCH_SINGLE appels /api/carriers/rates (un colis par appel, extrapolé) contre un seul
+  POST /api/carriers/rates/batch pour BENCH_PARCELS colis
+
+Usage :
+    uvicorn server:app --port 8001 &
+    BASE_URL=http://localhost:8001 python benchmarks/bench_rates.py
+    BENCH_API=false python benchmarks/bench_rates.py     # moteur seul, sans serveur
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rates import DEFAULT_RATE_CARDS, compile_cards, quote_batch  # noqa: E402
+
+BASE_URL = os.environ.get('BASE_URL', 'http://localhost:8001').rstrip('/')
+USERNAME = os.environ.get('BENCH_USERNAME', 'admin')
+PASSWORD = os.environ.get('BENCH_PASSWORD', 'admin123')
+PARCELS = int(os.environ.get('BENCH_PARCELS', '10000'))
+SINGLE = int(os.environ.get('BENCH_SINGLE', '200'))
+API = os.environ.get('BENCH_API', 'true').lower() == 'true'
+
+
+def wave():
+    rng = np.random.default_rng(42)
+    zips = [f'{z:05d}' for z in rng.integers(1000, 98000, PARCELS)]
+    weights = np.round(rng.uniform(0.1, 29, PARCELS), 2)
+    return zips, weights
+
+
+def bench_engine(zips, weights):
+    cards = compile_cards([{'code': code, 'name': code} for code in DEFAULT_RATE_CARDS])
+    for label in ('à froid', 'à chaud'):
+        started = time.perf_counter()
+        prices = quote_batch(cards, zips, weights)
+        print(f"   Moteur {label:<8}: {(time.perf_counter() - started) * 1000:7.1f} ms pour {prices.size} tarifs")
+
+
+async def bench_api(zips, weights):
+    async with httpx.AsyncClient(base_url=BASE_URL, timeout=120.0) as http:
+        response = await http.post('/api/auth/login', json={'username': USERNAME, 'password': PASSWORD})
+        response.raise_for_status()
+        headers = {'Authorization': f"Bearer {response.json()['token']}"}
+
+        started = time.perf_counter()
+        for zip_code, weight in zip(zips[:SINGLE], weights[:SINGLE]):
+            r = await http.get('/api/carriers/rates', headers=headers, params={'to_zip': zip_code, 'weight': float(weight)})
+            r.raise_for_status()
+        per_call = (time.perf_counter() - started) / SINGLE
+        print(f"   Un appel par colis : {per_call * 1000:.1f} ms/colis -> ~{per_call * PARCELS:.1f} s pour {PARCELS} colis")
+
+        parcels = [{'id': i, 'to_zip': z, 'weight': float(w)} for i, (z, w) in enumerate(zip(zips, weights))]
+        for label, cheapest in (('Lot (tous services)', False), ('Lot (moins cher)', True)):
+            started = time.perf_counter()
+            r = await http.post('/api/carriers/rates/batch', headers=headers, json={'parcels': parcels, 'cheapest_only': cheapest})
+            r.raise_for_status()
+            print(f"   {label:<20}: {(time.perf_counter() - started) * 1000:7.1f} ms  |  {len(r.content) / 1e6:.2f} Mo")
+
+
+async def run():
+    zips, weights = wave()
+    print(f"🏁 Cotation de {PARCELS} colis")
+    bench_engine(zips, weights)
+    if API:
+        await bench_api(zips, weights)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(run()))
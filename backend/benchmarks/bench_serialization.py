@@ -0,0 +1,79 @@
+"""
+Micro-benchmark de sérialisation JSON des réponses de liste
+- Ancien chemin : serialize_doc + jsonable_encoder + JSONResponse (json.dumps)
+- Nouveau chemin : MongoJSONResponse (orjson, ObjectId/datetime natifs)
+- Documents réalistes : lignes d'inventaire, commandes et produits, pages de 500
+
+Usage :
+    python benchmarks/bench_serialization.py
+"""
+
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from responses import MongoJSONResponse  # noqa: E402
+from server import serialize_doc  # noqa: E402
+
+PAGE = int(os.environ.get('BENCH_PAGE', '500'))
+ROUNDS = int(os.environ.get('BENCH_ROUNDS', '200'))
+now = datetime.now(timezone.utc)
+
+
+def inventory_row(i):
+    return {
+        '_id': ObjectId(), 'product_id': ObjectId(), 'location_id': ObjectId(),
+        'quantity': i % 120, 'last_updated': now - timedelta(hours=i),
+        'is_demo_tenant': False, 'product_name': f'T-shirt coton bio taille {i % 5}',
+        'product_sku': f'TSH-{i:05d}', 'location_code': f'Z{i % 4 + 1}-A{i % 20:02d}-{i % 5}',
+        'client_name': 'Boutique Exemple', 'client_id': ObjectId(),
+    }
+
+
+def order_row(i):
+    return {
+        '_id': ObjectId(), 'order_number': f'CMD-{i:06d}', 'client_id': str(ObjectId()),
+        'customer_name': f'Client {i}', 'customer_email': f'client{i}@example.fr',
+        'shipping_address': f'{i} rue de la République, 69002 Lyon, France',
+        'order_date': now, 'status': 'pending', 'priority': 'medium', 'tracking_number': None,
+        'external_order_id': str(5000000 + i), 'external_platform': 'shopify',
+        'created_by': ObjectId(), 'created_at': now, 'client_name': 'Boutique Exemple',
+    }
+
+
+def product_row(i):
+    return {
+        '_id': ObjectId(), 'client_id': ObjectId(), 'sku': f'SKU-{i:05d}', 'name': f'Produit {i}',
+        'description': 'Description produit ' * 3, 'barcode': f'{3760000000000 + i}',
+        'category': 'Textile', 'unit_weight': 0.25, 'min_stock_level': 10, 'active': True,
+        'created_at': now, 'total_stock': i * 3, 'client_name': 'Boutique Exemple',
+    }
+
+
+def old_path(docs):
+    return JSONResponse(jsonable_encoder(serialize_doc(docs))).body
+
+
+def new_path(docs):
+    return MongoJSONResponse(docs).body
+
+
+def run():
+    print(f"🏁 Sérialisation de pages de {PAGE} documents, {ROUNDS} répétitions")
+    for label, factory in (('inventaire', inventory_row), ('commandes', order_row), ('produits', product_row)):
+        docs = [factory(i) for i in range(PAGE)]
+        old = timeit.timeit(lambda: old_path(docs), number=ROUNDS) / ROUNDS * 1000
+        new = timeit.timeit(lambda: new_path(docs), number=ROUNDS) / ROUNDS * 1000
+        print(f"   {label:<11}: ancien {old:7.2f} ms  |  orjson {new:6.2f} ms  |  x{old / new:.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(run())
@@ -0,0 +1,65 @@
+"""
+Benchmark de synchronisation Shopify contre le faux serveur (benchmarks/fake_shopify.py)
+- 1er appel : import complet (50k commandes par défaut, pages de 250 via l'en-tête Link)
+- 2e appel : incrémental après modification de BENCH_TOUCH commandes
+- Mesure la durée et le débit de chaque passe
+
+Usage :
+    FAKE_SHOPIFY_ORDERS=50000 uvicorn benchmarks.fake_shopify:app --port 8010 &
+    BASE_URL=http://localhost:8001 FAKE_SHOPIFY_URL=http://localhost:8010 python benchmarks/bench_shopify_sync.py
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+
+BASE_URL = os.environ.get('BASE_URL', 'http://localhost:8001').rstrip('/')
+FAKE_SHOPIFY_URL = os.environ.get('FAKE_SHOPIFY_URL', 'http://localhost:8010').rstrip('/')
+USERNAME = os.environ.get('BENCH_USERNAME', 'admin')
+PASSWORD = os.environ.get('BENCH_PASSWORD', 'admin123')
+TOUCH = int(os.environ.get('BENCH_TOUCH', '500'))
+
+
+async def sync(http, headers, integration_id):
+    started = time.perf_counter()
+    r = await http.post('/api/shopify/sync-orders', headers=headers, json={'integration_id': integration_id})
+    r.raise_for_status()
+    return r.json(), time.perf_counter() - started
+
+
+async def run():
+    async with httpx.AsyncClient(base_url=BASE_URL, timeout=3600.0) as http:
+        response = await http.post('/api/auth/login', json={'username': USERNAME, 'password': PASSWORD})
+        response.raise_for_status()
+        headers = {'Authorization': f"Bearer {response.json()['token']}"}
+
+        integrations = (await http.get('/api/integrations', headers=headers)).json()
+        integration = next((i for i in integrations if i['platform'] == 'shopify'), None)
+        if integration is None:
+            print("❌ Aucune intégration Shopify")
+            return 1
+        r = await http.post('/api/shopify/configure', headers=headers, json={
+            'integration_id': integration['id'],
+            'store_url': FAKE_SHOPIFY_URL,
+            'api_key': 'bench', 'api_secret': 'bench', 'access_token': 'bench'
+        })
+        r.raise_for_status()
+
+        full, full_time = await sync(http, headers, integration['id'])
+        async with httpx.AsyncClient(base_url=FAKE_SHOPIFY_URL) as shop:
+            (await shop.post('/_touch', params={'count': TOUCH})).raise_for_status()
+        incremental, incremental_time = await sync(http, headers, integration['id'])
+
+    print(f"🏁 Synchronisation Shopify depuis {FAKE_SHOPIFY_URL}")
+    print(f"   Complète     : {full['totalOrdersFetched']} commandes, {full['pages']} pages, "
+          f"{full['ordersImported']} importées en {full_time:.2f} s ({full['totalOrdersFetched'] / full_time:.0f} commandes/s)")
+    print(f"   Incrémentale : {incremental['totalOrdersFetched']} commandes, {incremental['ordersImported']} importées, "
+          f"{incremental['ordersUpdated']} mises à jour en {incremental_time:.2f} s (attendu ≈ {TOUCH})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(run()))
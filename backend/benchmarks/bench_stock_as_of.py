@@ -0,0 +1,88 @@
+"""
+Benchmark de la requête de stock à date (journal des mouvements + instantanés)
+- Écrit un historique synthétique de mouvements (BENCH_PAIRS couples produit/emplacement, un mouvement
+  par couple et par heure) directement en base, par paliers jusqu'à BENCH_MOVEMENTS mouvements
+- Compacte les instantanés une fois par jour d'historique (comme la tâche périodique)
+- Mesure stock_as_of sur un produit à chaque palier : le temps doit rester à peu près constant
+
+Usage (base dédiée, vidée au démarrage) :
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/bench_stock_as_of.py
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indexes import ensure_indexes  # noqa: E402
+from stock_ledger import compact_snapshots, stock_as_of  # noqa: E402
+
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+DB_NAME = os.environ.get('BENCH_DB_NAME', 'wms_bench_ledger')
+PAIRS = int(os.environ.get('BENCH_PAIRS', '200'))
+MOVEMENTS = int(os.environ.get('BENCH_MOVEMENTS', '1000000'))
+STEPS = int(os.environ.get('BENCH_STEPS', '5'))
+REPEAT = int(os.environ.get('BENCH_REPEAT', '20'))
+START = datetime(2020, 1, 1)
+
+
+async def write_hours(db, pairs, first_hour, hours):
+    movements = []
+    for hour in range(first_hour, first_hour + hours):
+        at = START + timedelta(hours=hour)
+        for n, (product_id, location_id) in enumerate(pairs):
+            movements.append({
+                'type': 'receipt' if (hour + n) % 3 else 'pick',
+                'product_id': product_id,
+                'location_id': location_id,
+                'quantity': 5 if (hour + n) % 3 else -3,
+                'client_id': 'bench',
+                'is_demo_tenant': False,
+                'created_at': at,
+            })
+        if hour % 24 == 23:
+            await db.stock_movements.insert_many(movements, ordered=False)
+            movements = []
+            await compact_snapshots(db, until=at)
+    if movements:
+        await db.stock_movements.insert_many(movements, ordered=False)
+
+
+async def run():
+    client = AsyncIOMotorClient(MONGO_URL)
+    await client.drop_database(DB_NAME)
+    db = client[DB_NAME]
+    await ensure_indexes(db)
+    products = [ObjectId() for _ in range(max(1, PAIRS // 10))]
+    pairs = [(products[n % len(products)], ObjectId()) for n in range(PAIRS)]
+    hours_per_step = max(24, MOVEMENTS // PAIRS // STEPS // 24 * 24)
+    print(f"🏁 Stock à date : {PAIRS} couples, jusqu'à {MOVEMENTS} mouvements en {STEPS} paliers")
+
+    written_hours = 0
+    for _ in range(STEPS):
+        await write_hours(db, pairs, written_hours, hours_per_step)
+        written_hours += hours_per_step
+        at = START + timedelta(hours=written_hours - 5)
+        query = {'product_id': products[0]}
+        samples = []
+        for _ in range(REPEAT):
+            started = time.perf_counter()
+            rows = await stock_as_of(db, query, at)
+            samples.append((time.perf_counter() - started) * 1000)
+        total = await db.stock_movements.estimated_document_count()
+        print(f"   {total:>9} mouvements  |  p50 {statistics.median(samples):6.2f} ms  |  {len(rows)} lignes")
+
+    await client.drop_database(DB_NAME)
+    client.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(run()))
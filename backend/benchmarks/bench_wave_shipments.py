@@ -0,0 +1,82 @@
+"""
+Benchmark des expéditions par vague
+- Crée BENCH_ORDERS commandes, configure le transporteur BENCH_CARRIER sur le faux transporteur
+- Expédie BENCH_SINGLE commandes une par une (POST /api/carriers/create-shipment, extrapolé)
+  puis le reste en un seul POST /api/carriers/shipments/batch
+
+Usage :
+    FAKE_CARRIER_LATENCY_MS=200 uvicorn benchmarks.fake_carrier:app --port 8011 &
+    uvicorn server:app --port 8001 &
+    BASE_URL=http://localhost:8001 CARRIER_URL=http://localhost:8011 python benchmarks/bench_wave_shipments.py
+    # CARRIER_CONCURRENCY côté serveur règle le nombre d'appels transporteur simultanés
+"""
+
+import asyncio
+import os
+import sys
+import time
+import uuid
+
+import httpx
+
+BASE_URL = os.environ.get('BASE_URL', 'http://localhost:8001').rstrip('/')
+CARRIER_URL = os.environ.get('CARRIER_URL', 'http://localhost:8011')
+USERNAME = os.environ.get('BENCH_USERNAME', 'admin')
+PASSWORD = os.environ.get('BENCH_PASSWORD', 'admin123')
+CARRIER = os.environ.get('BENCH_CARRIER', 'COLISSIMO')
+ORDERS = int(os.environ.get('BENCH_ORDERS', '500'))
+SINGLE = int(os.environ.get('BENCH_SINGLE', '20'))
+
+
+async def run():
+    async with httpx.AsyncClient(base_url=BASE_URL, timeout=600.0) as http:
+        response = await http.post('/api/auth/login', json={'username': USERNAME, 'password': PASSWORD})
+        response.raise_for_status()
+        headers = {'Authorization': f"Bearer {response.json()['token']}"}
+        client_id = (await http.get('/api/clients', headers=headers)).json()[0]['id']
+
+        r = await http.post('/api/carriers/configure', headers=headers, json={
+            'carrier': CARRIER, 'client_id': client_id, 'account_number': 'BENCH',
+            'api_key': 'bench', 'api_base_url': CARRIER_URL,
+        })
+        r.raise_for_status()
+
+        run_id = uuid.uuid4().hex[:8]
+        r = await http.post('/api/orders/bulk', headers=headers, json={'client_id': client_id, 'orders': [
+            {'customer_name': f'Vague bench {i}', 'shipping_address': '1 Rue du Test, 75001 Paris',
+             'external_order_id': f'WAVE-{run_id}-{i}', 'lines': []}
+            for i in range(ORDERS)
+        ]})
+        r.raise_for_status()
+        order_ids = [row['order_id'] for row in r.json()['results'] if row['success']]
+
+        print(f"🏁 Expédition de {len(order_ids)} commandes via {CARRIER} ({CARRIER_URL})")
+        started = time.perf_counter()
+        for order_id in order_ids[:SINGLE]:
+            r = await http.post('/api/carriers/create-shipment', headers=headers,
+                                json={'order_id': order_id, 'carrier': CARRIER, 'weight': 1.0})
+            r.raise_for_status()
+        per_order = (time.perf_counter() - started) / SINGLE
+        print(f"   Une par une : {per_order * 1000:.0f} ms/commande -> ~{per_order * len(order_ids):.1f} s pour la vague")
+
+        wave = order_ids[SINGLE:]
+        started = time.perf_counter()
+        r = await http.post('/api/carriers/shipments/batch', headers=headers,
+                            json={'order_ids': wave, 'carrier': CARRIER, 'weight': 1.0})
+        r.raise_for_status()
+        body = r.json()
+        elapsed = time.perf_counter() - started
+        print(f"   Vague       : {elapsed:.2f} s pour {len(wave)} commandes "
+              f"({elapsed / max(len(wave), 1) * 1000:.1f} ms/commande)  |  expédiées {body['shipped']}, échecs {body['failed']}")
+        peak = (await http.get(f'{CARRIER_URL}/_stats')).json()['peak_in_flight']
+        print(f"   Pic d'appels simultanés chez le transporteur : {peak}")
+
+        r = await http.post('/api/carriers/configure', headers=headers, json={
+            'carrier': CARRIER, 'client_id': client_id, 'account_number': 'BENCH', 'api_key': 'bench',
+        })
+        r.raise_for_status()
+    return 0 if not body['failed'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(run()))
@@ -0,0 +1,62 @@
+"""
+Faux transporteur pour tester les expéditions en local
+- POST /shipments : renvoie un numéro de suivi et une URL d'étiquette après FAKE_CARRIER_LATENCY_MS ms
+- Refuse (422) les colis de plus de FAKE_CARRIER_MAX_WEIGHT kg
+- Renvoie un 503 toutes les FAKE_CARRIER_503_EVERY requêtes (0 = jamais)
+- Répond une page HTML (500) aux références commençant par BROKEN
+- Rejoue la même étiquette pour une Idempotency-Key déjà vue
+- GET /_stats : requêtes reçues et pic de requêtes simultanées
+
+Usage :
+    FAKE_CARRIER_LATENCY_MS=200 uvicorn benchmarks.fake_carrier:app --port 8011
+    # puis renseigner api_base_url=http://localhost:8011 sur le transporteur
+"""
+
+import asyncio
+import itertools
+import os
+
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, JSONResponse
+
+LATENCY_MS = float(os.environ.get('FAKE_CARRIER_LATENCY_MS', '100'))
+MAX_WEIGHT = float(os.environ.get('FAKE_CARRIER_MAX_WEIGHT', '30'))
+UNAVAILABLE_EVERY = int(os.environ.get('FAKE_CARRIER_503_EVERY', '0'))
+
+app = FastAPI(title='Fake Carrier')
+
+_numbers = itertools.count(100000000)
+stats = {'requests': 0, 'in_flight': 0, 'peak_in_flight': 0, 'labels': 0}
+_labels = {}
+
+
+@app.post('/shipments')
+async def create_shipment(request: Request):
+    stats['requests'] += 1
+    stats['in_flight'] += 1
+    stats['peak_in_flight'] = max(stats['peak_in_flight'], stats['in_flight'])
+    try:
+        payload = await request.json()
+        await asyncio.sleep(LATENCY_MS / 1000)
+        if UNAVAILABLE_EVERY and stats['requests'] % UNAVAILABLE_EVERY == 0:
+            return JSONResponse({'detail': 'Service indisponible'}, status_code=503, headers={'Retry-After': '0'})
+        if str(payload.get('reference') or '').startswith('BROKEN'):
+            return HTMLResponse('<html><body>Internal Server Error</body></html>', status_code=500)
+        if (payload.get('weight') or 0) > MAX_WEIGHT:
+            return JSONResponse({'detail': f'Poids supérieur à {MAX_WEIGHT:g} kg'}, status_code=422)
+        key = request.headers.get('idempotency-key')
+        if key in _labels:
+            return _labels[key]
+        number = f'FK{next(_numbers)}FR'
+        stats['labels'] += 1
+        label = {'tracking_number': number, 'label_url': f'http://carrier.test/labels/{number}.pdf'}
+        if key:
+            _labels[key] = label
+        return label
+    finally:
+        stats['in_flight'] -= 1
+
+
+@app.get('/_stats')
+async def get_stats():
+    return stats
@@ -0,0 +1,94 @@
+"""
+Faux serveur Shopify pour tester la synchronisation en local
+- GET /admin/api/{version}/orders.json : since_id, updated_at_min, limit, order, page_info + en-tête Link
+- POST /_touch?count=N : modifie N commandes (pour tester l'incrémental)
+- Renvoie un 429 toutes les FAKE_SHOPIFY_429_EVERY requêtes (0 = jamais)
+
+Usage :
+    FAKE_SHOPIFY_ORDERS=50000 uvicorn benchmarks.fake_shopify:app --port 8010
+    # puis configurer l'intégration avec store_url=http://localhost:8010
+"""
+
+import base64
+import json
+import os
+import random
+from datetime import datetime, timedelta, timezone
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+ORDER_COUNT = int(os.environ.get('FAKE_SHOPIFY_ORDERS', '50000'))
+RATE_LIMIT_EVERY = int(os.environ.get('FAKE_SHOPIFY_429_EVERY', '0'))
+ACCESS_TOKEN = os.environ.get('FAKE_SHOPIFY_TOKEN')
+
+app = FastAPI(title='Fake Shopify')
+
+_base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+ORDERS = [
+    {
+        'id': 1000 + i,
+        'contact_email': f'client{i}@example.com',
+        'created_at': (_base + timedelta(seconds=i)).isoformat(),
+        'updated_at': (_base + timedelta(seconds=i)).isoformat(),
+        'shipping_address': {
+            'first_name': 'Client', 'last_name': str(i),
+            'address1': f'{i} rue de la Paix', 'city': 'Paris', 'zip': '75002', 'country': 'France'
+        },
+    }
+    for i in range(ORDER_COUNT)
+]
+_requests = 0
+
+
+def _encode(state):
+    return base64.urlsafe_b64encode(json.dumps(state).encode()).decode()
+
+
+def _decode(page_info):
+    return json.loads(base64.urlsafe_b64decode(page_info))
+
+
+@app.post('/_touch')
+async def touch(count: int = 100):
+    now = datetime.now(timezone.utc)
+    for order in random.sample(ORDERS, min(count, len(ORDERS))):
+        order['updated_at'] = now.isoformat()
+        order['contact_email'] = f"modifie-{order['id']}@example.com"
+    return {'touched': count}
+
+
+@app.get('/admin/api/{version}/orders.json')
+async def orders(version: str, request: Request):
+    global _requests
+    _requests += 1
+    if ACCESS_TOKEN and request.headers.get('X-Shopify-Access-Token') != ACCESS_TOKEN:
+        return JSONResponse({'errors': 'Unauthorized'}, status_code=401)
+    if RATE_LIMIT_EVERY and _requests % RATE_LIMIT_EVERY == 0:
+        return JSONResponse({'errors': 'Too Many Requests'}, status_code=429, headers={'Retry-After': '1'})
+
+    params = request.query_params
+    if 'page_info' in params:
+        state = _decode(params['page_info'])
+    else:
+        state = {
+            'since_id': int(params.get('since_id', 0)),
+            'updated_at_min': params.get('updated_at_min'),
+            'order': params.get('order', 'id asc'),
+            'offset': 0,
+        }
+    limit = min(int(params.get('limit', 50)), 250)
+
+    rows = [o for o in ORDERS if o['id'] > state['since_id']]
+    if state['updated_at_min']:
+        rows = [o for o in rows if o['updated_at'] >= state['updated_at_min']]
+    key = 'updated_at' if state['order'].startswith('updated_at') else 'id'
+    rows.sort(key=lambda o: (o[key], o['id']))
+
+    page = rows[state['offset']:state['offset'] + limit]
+    headers = {}
+    if state['offset'] + limit < len(rows):
+        next_info = _encode({**state, 'offset': state['offset'] + limit})
+        url = request.url.remove_query_params(list(params.keys())).include_query_params(limit=limit, page_info=next_info)
+        headers['Link'] = f'<{url}>; rel="next"'
+    return JSONResponse({'orders': page}, headers=headers)
@@ -0,0 +1,78 @@
+"""
+Replica set MongoDB local à un nœud, pour le flux temps réel (les change streams exigent un replica set)
+- Lance mongod (binaire MONGOD, par défaut celui du PATH) sur REPLSET_PORT avec --replSet rs0
+  dans un répertoire de données temporaire, puis initialise le replica set
+- Affiche le MONGO_URL à utiliser et reste au premier plan ; Ctrl+C arrête et nettoie
+
+Usage :
+    python benchmarks/replset.py &
+    REPLSET_MONGO_URL=mongodb://127.0.0.1:27018/?replicaSet=rs0 python -m pytest tests/test_change_feed.py
+    MONGO_URL=mongodb://127.0.0.1:27018/?replicaSet=rs0 uvicorn server:app --port 8001
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from pymongo import MongoClient
+from pymongo.errors import OperationFailure, PyMongoError
+
+MONGOD = os.environ.get('MONGOD', 'mongod')
+PORT = int(os.environ.get('REPLSET_PORT', '27018'))
+REPLSET = 'rs0'
+
+
+def wait_for(client, timeout=30):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return client.admin.command('ping')
+        except PyMongoError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.2)
+
+
+def initiate(client):
+    try:
+        client.admin.command('replSetInitiate', {'_id': REPLSET, 'members': [{'_id': 0, 'host': f'127.0.0.1:{PORT}'}]})
+    except OperationFailure as e:
+        # Déjà initialisé
+        if e.code != 23:
+            raise
+    deadline = time.monotonic() + 30
+    while not client.admin.command('hello').get('isWritablePrimary'):
+        if time.monotonic() > deadline:
+            raise SystemExit('❌ Le nœud n\'est pas devenu primaire')
+        time.sleep(0.2)
+
+
+def main():
+    if not shutil.which(MONGOD):
+        print(f"❌ {MONGOD} introuvable (définir MONGOD=/chemin/vers/mongod)")
+        return 1
+    data_dir = tempfile.mkdtemp(prefix='wms-replset-')
+    process = subprocess.Popen([
+        MONGOD, '--replSet', REPLSET, '--port', str(PORT), '--bind_ip', '127.0.0.1',
+        '--dbpath', data_dir, '--quiet', '--logpath', os.path.join(data_dir, 'mongod.log'),
+    ])
+    try:
+        client = MongoClient(f'mongodb://127.0.0.1:{PORT}/?directConnection=true', serverSelectionTimeoutMS=1000)
+        wait_for(client)
+        initiate(client)
+        print(f"✅ Replica set prêt : MONGO_URL=mongodb://127.0.0.1:{PORT}/?replicaSet={REPLSET}", flush=True)
+        process.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+        shutil.rmtree(data_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
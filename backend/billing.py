@@ -0,0 +1,231 @@
+"""
+Invoicing: pricing of the monthly activity and the month-end billing run.
+
+run_billing invoices every active, non-demo client for one period. Clients
+are walked in _id order by batches: per batch, one aggregation (orders
+$unionWith receipts, grouped by client) counts the activity, one reserve()
+hands out the invoice numbers and lines then invoices go out with
+insert_many.
+
+A run is identified by its period. Its progress (last client invoiced) is
+kept in billing_runs, so an interrupted run resumes after the last finished
+batch, and invoices carry billing_run_id under a unique index: running the
+same period again never bills a client twice. Lines are written before
+their invoice, so an invoice is never visible without its lines; lines
+left behind by a crash are cleared when the run resumes.
+"""
+
+import calendar
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+import sequences
+
+ORDER_PRICE = 2.50
+RECEIPT_PRICE = 5.00
+STORAGE_FEE = 150.00
+TAX_RATE = 20
+PAYMENT_TERMS_DAYS = 30
+BATCH_SIZE = 500
+RUN_LEASE_SECONDS = 300
+
+
+class BillingRunBusy(Exception):
+    """Another worker holds the lease of this billing run."""
+
+
+def month_bounds(month):
+    """'2026-09' -> (2026-09-01 00:00, 2026-09-30 23:59:59.999999), bounds included."""
+    start = datetime.strptime(month, '%Y-%m')
+    last_day = calendar.monthrange(start.year, start.month)[1]
+    return start, start.replace(day=last_day) + timedelta(days=1, microseconds=-1)
+
+
+def run_id(start, end):
+    return f'{start:%Y%m%d}-{end:%Y%m%d}'
+
+
+def invoice_lines(orders_count, receipts_count):
+    return [
+        {'description': f'Préparation commandes ({orders_count})', 'quantity': orders_count, 'unit_price': ORDER_PRICE, 'total': orders_count * ORDER_PRICE},
+        {'description': f'Réceptions ({receipts_count})', 'quantity': receipts_count, 'unit_price': RECEIPT_PRICE, 'total': receipts_count * RECEIPT_PRICE},
+        {'description': 'Frais de stockage mensuel', 'quantity': 1, 'unit_price': STORAGE_FEE, 'total': STORAGE_FEE},
+    ]
+
+
+def invoice_totals(lines):
+    """(subtotal, tax_amount, total) of a list of invoice lines"""
+    subtotal = sum(line['total'] for line in lines)
+    tax_amount = subtotal * TAX_RATE / 100
+    return subtotal, tax_amount, subtotal + tax_amount
+
+
+async def activity_counts(db, client_ids, start, end):
+    """{str(client_id): {'orders': n, 'receipts': n}} for the period, in one aggregation."""
+    ids = list(client_ids)
+    # client_id is stored as a string or an ObjectId
+    match = {'$match': {
+        'client_id': {'$in': ids + [str(i) for i in ids]},
+        'created_at': {'$gte': start, '$lte': end},
+    }}
+    rows = await db.orders.aggregate([
+        match,
+        {'$group': {'_id': '$client_id', 'orders': {'$sum': 1}, 'receipts': {'$sum': 0}}},
+        {'$unionWith': {'coll': 'receipts', 'pipeline': [
+            match,
+            {'$group': {'_id': '$client_id', 'orders': {'$sum': 0}, 'receipts': {'$sum': 1}}},
+        ]}},
+        {'$group': {'_id': {'$toString': '$_id'}, 'orders': {'$sum': '$orders'}, 'receipts': {'$sum': '$receipts'}}},
+    ]).to_list(length=None)
+    return {row['_id']: {'orders': row['orders'], 'receipts': row['receipts']} for row in rows}
+
+
+def build_invoice(client_id, number, start, end, counts, issued_at, created_by=None, billing_run_id=None):
+    """(invoice, lines) documents for one client; lines already point at the invoice _id."""
+    invoice_id = ObjectId()
+    lines = invoice_lines(counts.get('orders', 0), counts.get('receipts', 0))
+    subtotal, tax_amount, total = invoice_totals(lines)
+    invoice = {
+        '_id': invoice_id,
+        'invoice_number': sequences.invoice_number(number, issued_at),
+        'client_id': client_id,
+        'billing_period_start': start,
+        'billing_period_end': end,
+        'issue_date': issued_at,
+        'due_date': issued_at + timedelta(days=PAYMENT_TERMS_DAYS),
+        'subtotal': subtotal,
+        'tax_rate': TAX_RATE,
+        'tax_amount': tax_amount,
+        'total': total,
+        'status': 'draft',
+        'created_by': ObjectId(created_by) if created_by else None,
+        'created_at': issued_at,
+    }
+    for line in lines:
+        line['invoice_id'] = invoice_id
+    if billing_run_id:
+        invoice['billing_run_id'] = billing_run_id
+        for line in lines:
+            line['billing_run_id'] = billing_run_id
+            line['client_id'] = client_id
+    return invoice, lines
+
+
+async def _claim_run(db, rid, start, end, now):
+    """Take the lease of a run, creating it on first call. None if it already completed."""
+    try:
+        return await db.billing_runs.find_one_and_update(
+            {'_id': rid, 'status': {'$ne': 'completed'}, '$or': [
+                {'lease_until': {'$exists': False}},
+                {'lease_until': {'$lt': now}},
+            ]},
+            {
+                '$set': {'status': 'running', 'lease_until': now + timedelta(seconds=RUN_LEASE_SECONDS)},
+                '$inc': {'attempts': 1},
+                '$setOnInsert': {
+                    'period_start': start,
+                    'period_end': end,
+                    'started_at': now,
+                    'last_client_id': None,
+                    'invoices_created': 0,
+                    'clients_skipped': 0,
+                },
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # The run exists but did not match: completed, or leased by another worker
+        existing = await db.billing_runs.find_one({'_id': rid}, {'status': 1})
+        if existing and existing['status'] == 'completed':
+            return None
+        raise BillingRunBusy(f'Facturation {rid} déjà en cours')
+
+
+async def _insert_batch(db, invoices, lines):
+    """Insert lines then invoices. Returns the number of invoices written."""
+    if lines:
+        await db.invoice_lines.insert_many(lines, ordered=False)
+    try:
+        await db.invoices.insert_many(invoices, ordered=False)
+    except BulkWriteError as e:
+        duplicates = [err['index'] for err in e.details['writeErrors'] if err['code'] == 11000]
+        if len(duplicates) != len(e.details['writeErrors']):
+            raise
+        # Invoiced concurrently (lease expired mid-batch): drop our copy of the lines
+        await db.invoice_lines.delete_many({'invoice_id': {'$in': [invoices[i]['_id'] for i in duplicates]}})
+        return len(invoices) - len(duplicates)
+    return len(invoices)
+
+
+async def run_billing(db, start, end, created_by=None, batch_size=BATCH_SIZE):
+    """Invoice every active non-demo client for [start, end]. Safe to call again after a crash."""
+    rid = run_id(start, end)
+    now = datetime.now(timezone.utc)
+    run = await _claim_run(db, rid, start, end, now)
+    if run is None:
+        return {**await billing_run_status(db, rid), 'already_completed': True}
+
+    cursor = run['last_client_id']
+    resumed = run['attempts'] > 1
+    while True:
+        query = {'active': {'$ne': False}, 'is_demo': {'$ne': True}}
+        if cursor is not None:
+            query['_id'] = {'$gt': cursor}
+        batch = [c['_id'] for c in await db.clients.find(query, {'_id': 1}).sort('_id', 1).limit(batch_size).to_list(length=None)]
+        if not batch:
+            break
+        invoiced = set(await db.invoices.distinct('client_id', {'billing_run_id': rid, 'client_id': {'$in': batch}}))
+        pending = [c for c in batch if c not in invoiced]
+        created = 0
+        if pending:
+            if resumed:
+                # Lines of a batch interrupted between its two inserts
+                await db.invoice_lines.delete_many({'billing_run_id': rid, 'client_id': {'$in': pending}})
+                resumed = False
+            counts = await activity_counts(db, pending, start, end)
+            first = await sequences.reserve(db, 'invoices', len(pending))
+            issued_at = datetime.now(timezone.utc)
+            invoices, lines = [], []
+            for offset, client_id in enumerate(pending):
+                invoice, invoice_line_docs = build_invoice(
+                    client_id, first + offset, start, end, counts.get(str(client_id), {}),
+                    issued_at, created_by, billing_run_id=rid
+                )
+                invoices.append(invoice)
+                lines += invoice_line_docs
+            created = await _insert_batch(db, invoices, lines)
+        cursor = batch[-1]
+        await db.billing_runs.update_one({'_id': rid}, {
+            '$set': {
+                'last_client_id': cursor,
+                'lease_until': datetime.now(timezone.utc) + timedelta(seconds=RUN_LEASE_SECONDS),
+            },
+            '$inc': {'invoices_created': created, 'clients_skipped': len(batch) - len(pending)},
+        })
+
+    await db.billing_runs.update_one({'_id': rid}, {
+        '$set': {'status': 'completed', 'finished_at': datetime.now(timezone.utc)},
+        '$unset': {'lease_until': ''},
+    })
+    return {**await billing_run_status(db, rid), 'already_completed': False}
+
+
+async def billing_run_status(db, rid):
+    run = await db.billing_runs.find_one({'_id': rid})
+    if not run:
+        return None
+    return {
+        'run_id': run['_id'],
+        'status': run['status'],
+        'period_start': run['period_start'],
+        'period_end': run['period_end'],
+        'invoices_created': run['invoices_created'],
+        'clients_skipped': run['clients_skipped'],
+        'attempts': run['attempts'],
+        'started_at': run['started_at'],
+        'finished_at': run.get('finished_at'),
+    }
@@ -0,0 +1,51 @@
+"""
+Facturation de fin de mois pour NEWSTAQ WMS
+- Facture tous les clients actifs (hors démo) pour un mois en une seule passe
+- Relancer la même période reprend une facturation interrompue, sans double facture
+
+Usage :
+    python billing_run.py 2026-09
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from billing import BillingRunBusy, month_bounds, run_billing
+from indexes import ensure_indexes
+
+# Configuration
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+DB_NAME = os.environ.get('DB_NAME', 'wms_database')
+
+
+async def main(month):
+    client = AsyncIOMotorClient(MONGO_URL)
+    db = client[DB_NAME]
+    start, end = month_bounds(month)
+    # The unique (billing_run_id, client_id) index is what makes retries safe
+    await ensure_indexes(db)
+    print(f"🚀 Facturation {month}...")
+    started = time.perf_counter()
+    try:
+        result = await run_billing(db, start, end)
+    except BillingRunBusy as e:
+        print(f"❌ {e}")
+        return 1
+    finally:
+        client.close()
+    if result['already_completed']:
+        print(f"✅ Déjà facturé : {result['invoices_created']} factures (rien à faire)")
+    else:
+        print(f"✅ {result['invoices_created']} factures créées, {result['clients_skipped']} clients déjà facturés "
+              f"en {time.perf_counter() - started:.1f} s")
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Facturation de fin de mois')
+    parser.add_argument('month', help='Mois à facturer (AAAA-MM)')
+    raise SystemExit(asyncio.run(main(parser.parse_args().month)))
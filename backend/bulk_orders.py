@@ -0,0 +1,48 @@
+"""
+Write path of the bulk order import.
+
+Orders and their lines live in two collections and MongoDB gives no
+transaction here, so both are inserted with one unordered insert_many each
+and the write errors are mapped back to the orders they belong to. An order
+whose lines could not all be written is deleted again, with the lines that
+did get through: the import never leaves an order without its lines, and
+every order gets its own result.
+"""
+
+from pymongo.errors import BulkWriteError
+
+
+def _write_errors(error):
+    """{index in the batch: message} of a BulkWriteError."""
+    return {e['index']: e.get('errmsg', "Erreur d'écriture") for e in error.details.get('writeErrors', [])}
+
+
+async def insert_orders(db, orders, lines):
+    """Insert `orders` then `lines` (one list of line documents per order).
+
+    Returns {position in `orders`: error} for the orders not imported.
+    """
+    failed = {}
+    try:
+        await db.orders.insert_many(orders, ordered=False)
+    except BulkWriteError as e:
+        failed.update(_write_errors(e))
+
+    line_docs, owners = [], []
+    for position, order_lines in enumerate(lines):
+        if position not in failed:
+            line_docs += order_lines
+            owners += [position] * len(order_lines)
+    if not line_docs:
+        return failed
+    try:
+        await db.order_lines.insert_many(line_docs, ordered=False)
+    except BulkWriteError as e:
+        broken = {}
+        for index, message in _write_errors(e).items():
+            broken.setdefault(owners[index], message)
+        order_ids = [orders[position]['_id'] for position in broken]
+        await db.orders.delete_many({'_id': {'$in': order_ids}})
+        await db.order_lines.delete_many({'order_id': {'$in': [str(i) for i in order_ids]}})
+        failed.update({position: f'Lignes non écrites : {message}' for position, message in broken.items()})
+    return failed
@@ -0,0 +1,134 @@
+"""
+In-process caches shared by the API handlers.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries expire after `ttl` seconds.
+
+    Lives in one worker process only: explicit invalidation does not reach
+    other workers, so the TTL bounds how stale an entry can get there.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key):
+        self._data.pop(key, None)
+
+    def invalidate_where(self, predicate):
+        """Drop every entry whose value matches `predicate`."""
+        for key in [k for k, (_, value) in self._data.items() if predicate(value)]:
+            del self._data[key]
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'ttl_seconds': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class SnapshotCache:
+    """Per-key computed snapshots with stale-while-revalidate.
+
+    Fresh for `ttl` seconds. Up to `stale_ttl` the stale value is served at
+    once while one background task recomputes it. Concurrent misses on the
+    same key share a single computation.
+    """
+
+    def __init__(self, ttl=5.0, stale_ttl=60.0, maxsize=1024):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._refreshing = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    async def _compute(self, key, compute):
+        try:
+            value = await compute()
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            return value
+        finally:
+            self._refreshing.pop(key, None)
+
+    def _start(self, key, compute):
+        task = self._refreshing.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._compute(key, compute))
+            self._refreshing[key] = task
+        return task
+
+    async def get(self, key, compute):
+        entry = self._data.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry[0]
+            if age < self.ttl:
+                self.hits += 1
+                return entry[1]
+            if age < self.stale_ttl:
+                self.stale_hits += 1
+                task = self._start(key, compute)
+                # A failed background refresh keeps serving the stale value
+                task.add_done_callback(lambda t: t.cancelled() or t.exception())
+                return entry[1]
+        self.misses += 1
+        return await asyncio.shield(self._start(key, compute))
+
+    def invalidate(self, key):
+        self._data.pop(key, None)
+
+    def stats(self):
+        return {
+            'size': len(self._data),
+            'ttl_seconds': self.ttl,
+            'stale_ttl_seconds': self.stale_ttl,
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'refreshing': len(self._refreshing),
+        }
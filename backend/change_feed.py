@@ -0,0 +1,222 @@
+"""
+Live change feed for the dashboard and the client portal.
+
+Each worker tails ONE MongoDB change stream covering orders, inventory and
+receipts, whatever the number of connected browsers. Every change becomes a
+small delta event (id, operation, changed allow-listed fields) routed to the
+subscribers of its tenant and, for non-demo tenants, to the admin
+all-tenants scope. Subscribers are in-memory queues drained by the SSE or
+WebSocket handlers: an idle connection costs a queue and a suspended
+coroutine, no database work.
+
+A subscriber that falls behind (full queue) gets a single 'reset' event
+telling it to refetch, instead of an unbounded backlog. Deletes carry no
+client_id without pre-images and are not routed; the collections followed
+here are not deleted from by the API.
+
+Change streams need a replica set (a single-node one is enough, see
+benchmarks/replset.py). On a standalone server the feed reports itself
+unavailable and the endpoints answer 503: clients keep polling. Connections
+accepted before the first stream failed get a final 'unavailable' event and
+are closed by their handler.
+"""
+
+import asyncio
+import itertools
+import logging
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+# Fields a delta may carry, per watched collection
+WATCHED = {
+    'orders': ('order_number', 'status', 'priority', 'customer_name', 'tracking_number', 'order_date',
+               'due_date', 'preparation_date', 'pickup_date', 'created_at'),
+    'inventory': ('product_id', 'location_id', 'quantity', 'lot_number', 'last_updated'),
+    'receipts': ('receipt_number', 'status', 'supplier_name', 'expected_date', 'created_at'),
+}
+ALL_TENANTS = '*'
+# Not a replica set / change streams not supported: do not retry
+_UNSUPPORTED_CODES = (40573, 40324, 136)
+
+logger = logging.getLogger(__name__)
+
+
+class FeedUnavailable(Exception):
+    """Change streams are not available on this MongoDB deployment."""
+
+
+def _allowed(collection, fields):
+    allowed = WATCHED[collection]
+    return {k: v for k, v in fields.items() if k.split('.', 1)[0] in allowed}
+
+
+def delta_event(change):
+    """Small payload of one change stream event, None when there is nothing to send."""
+    collection = change['ns']['coll']
+    operation = change['operationType']
+    event = {'collection': collection, 'op': operation, 'id': change['documentKey']['_id']}
+    if operation in ('insert', 'replace'):
+        event['changes'] = _allowed(collection, change.get('fullDocument') or {})
+    elif operation == 'update':
+        description = change.get('updateDescription') or {}
+        event['changes'] = _allowed(collection, description.get('updatedFields') or {})
+        removed = [f for f in description.get('removedFields') or [] if f.split('.', 1)[0] in WATCHED[collection]]
+        if removed:
+            event['removed'] = removed
+        if not event['changes'] and not removed:
+            # Only internal fields changed (e.g. sync bookkeeping)
+            return None
+    return event
+
+
+class Subscription:
+    __slots__ = ('scope', 'collections', 'queue')
+
+    def __init__(self, scope, collections, queue_size):
+        self.scope = scope
+        self.collections = frozenset(collections)
+        self.queue = asyncio.Queue(queue_size)
+
+    def push(self, event):
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            # Too far behind: drop the backlog, ask for a refetch
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({'type': 'reset'})
+            return False
+
+    def close(self, event):
+        """Replace whatever is queued by a last `event`; the handler ends the connection on it."""
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def next(self, timeout):
+        """Next event, or None after `timeout` seconds of silence (time for a keepalive)."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class ChangeFeed:
+    """One change stream per worker, fanned out to per-tenant subscribers."""
+
+    def __init__(self, db, is_demo, queue_size=256, retry_delay=2.0):
+        self.db = db
+        self.is_demo = is_demo
+        self.queue_size = queue_size
+        self.retry_delay = retry_delay
+        # None until the first stream opened (or failed)
+        self.available = None
+        self._resume_token = None
+        self._subscribers = {}
+        self._sequence = itertools.count(1)
+        self._task = None
+        self._events = 0
+        self._delivered = 0
+        self._resets = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def subscribe(self, scope, collections=None):
+        if self.available is False:
+            raise FeedUnavailable('Flux temps réel indisponible (MongoDB sans replica set)')
+        subscription = Subscription(scope, collections or WATCHED, self.queue_size)
+        self._subscribers.setdefault(scope, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscribers = self._subscribers.get(subscription.scope)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.scope]
+
+    async def _loop(self):
+        pipeline = [{'$match': {
+            'ns.coll': {'$in': list(WATCHED)},
+            'operationType': {'$in': ['insert', 'update', 'replace']},
+        }}]
+        while True:
+            try:
+                # updateLookup: updates carry no client_id, one lookup per
+                # event (not per subscriber) gives the tenant to route to
+                async with self.db.watch(pipeline, full_document='updateLookup', resume_after=self._resume_token) as stream:
+                    self.available = True
+                    async for change in stream:
+                        self._resume_token = stream.resume_token
+                        await self.dispatch(change)
+            except OperationFailure as e:
+                if e.code in _UNSUPPORTED_CODES:
+                    self.available = False
+                    logger.warning('Flux temps réel désactivé: %s', e)
+                    self._close_all()
+                    return
+                if e.code == 286:
+                    # Resume point no longer in the oplog: start from now
+                    self._resume_token = None
+                    self._reset_all()
+                logger.warning('Erreur flux temps réel: %s', e)
+            except PyMongoError as e:
+                logger.warning('Erreur flux temps réel: %s', e)
+            await asyncio.sleep(self.retry_delay)
+
+    def _reset_all(self):
+        for subscribers in self._subscribers.values():
+            for subscription in subscribers:
+                subscription.push({'type': 'reset'})
+
+    def _close_all(self):
+        """Tell every connection the feed is gone: subscribe() refuses new ones from now on."""
+        for subscribers in self._subscribers.values():
+            for subscription in subscribers:
+                subscription.close({'type': 'unavailable'})
+        self._subscribers.clear()
+
+    async def dispatch(self, change):
+        """Route one change stream event to its tenant's and the admin's subscribers."""
+        document = change.get('fullDocument')
+        if not document or document.get('client_id') is None:
+            return
+        event = delta_event(change)
+        if event is None:
+            return
+        self._events += 1
+        event = {'type': 'change', 'seq': next(self._sequence), **event}
+        client_id = document['client_id']
+        scopes = [str(client_id)]
+        demo = document.get('is_demo_tenant')
+        if demo is None:
+            # receipts carry no is_demo_tenant flag
+            demo = await self.is_demo(client_id)
+        if not demo:
+            scopes.append(ALL_TENANTS)
+        for scope in scopes:
+            for subscription in list(self._subscribers.get(scope, ())):
+                if event['collection'] in subscription.collections:
+                    if subscription.push(event):
+                        self._delivered += 1
+                    else:
+                        self._resets += 1
+
+    def stats(self):
+        return {
+            'available': self.available,
+            'connections': sum(len(s) for s in self._subscribers.values()),
+            'scopes': len(self._subscribers),
+            'events': self._events,
+            'delivered': self._delivered,
+            'resets': self._resets,
+        }
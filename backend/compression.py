@@ -0,0 +1,200 @@
+"""
+Response compression middleware: brotli when the client accepts it and the
+brotli package is installed, gzip otherwise.
+
+The codec is picked from the Accept-Encoding q-values: a coding with q=0
+(explicitly, or through `*;q=0`) is never used, and between brotli and gzip
+the higher q wins, brotli on a tie.
+
+Bodies under `minimum_size` go out as-is. Responses that already carry a
+Content-Encoding, 304s and event streams are never touched. Streaming
+responses are compressed chunk by chunk, each chunk sync-flushed: the client
+can decode every chunk as it arrives, nothing waits in the compressor.
+"""
+
+import gzip
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+SKIP_MEDIA_TYPES = ('text/event-stream', 'application/gzip', 'application/zip', 'image/', 'video/')
+
+
+class _Gzip:
+    name = 'gzip'
+
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+    @staticmethod
+    def whole(data, level):
+        return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+class _Brotli:
+    name = 'br'
+
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+    @staticmethod
+    def whole(data, level):
+        return brotli.compress(data, quality=level)
+
+
+def _accepted(headers):
+    """{coding: q} of the Accept-Encoding header; a q that does not parse counts as 0."""
+    for name, value in headers:
+        if name == b'accept-encoding':
+            codings = {}
+            for part in value.decode('latin-1').lower().split(','):
+                coding, *params = [p.strip() for p in part.split(';')]
+                q = 1.0
+                for param in params:
+                    if param.startswith('q='):
+                        try:
+                            q = float(param[2:])
+                        except ValueError:
+                            q = 0.0
+                if coding:
+                    codings[coding] = q
+            return codings
+    return {}
+
+
+def _quality(accepted, coding):
+    return accepted.get(coding, accepted.get('*', 0.0))
+
+
+class CompressionStats:
+    """Counters shared with the admin endpoint (the middleware instance is built by Starlette)."""
+
+    def __init__(self):
+        self.minimum_size = None
+        self.responses = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def as_dict(self):
+        return {
+            'brotli_available': brotli is not None,
+            'minimum_size': self.minimum_size,
+            'responses_compressed': self.responses,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'ratio': round(self.bytes_out / self.bytes_in, 3) if self.bytes_in else None,
+        }
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size=1024, gzip_level=6, brotli_quality=4, stats=None):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.stats = stats or CompressionStats()
+        self.stats.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        accepted = _accepted(scope['headers'])
+        br = _quality(accepted, 'br') if brotli is not None else 0.0
+        gz = _quality(accepted, 'gzip')
+        if br > 0 and br >= gz:
+            codec, level = _Brotli, self.brotli_quality
+        elif gz > 0:
+            codec, level = _Gzip, self.gzip_level
+        else:
+            await self.app(scope, receive, send)
+            return
+        await _Responder(self, codec, level, send).run(scope, receive)
+
+
+class _Responder:
+    def __init__(self, middleware, codec, level, send):
+        self.middleware = middleware
+        self.codec = codec
+        self.level = level
+        self.send = send
+        self.start = None
+        self.compressor = None
+        self.passthrough = False
+
+    async def run(self, scope, receive):
+        await self.middleware.app(scope, receive, self.on_send)
+
+    def _skip(self, message):
+        if message['status'] < 200 or message['status'] in (204, 304):
+            return True
+        for name, value in message['headers']:
+            if name == b'content-encoding':
+                return True
+            if name == b'content-type' and value.decode('latin-1').startswith(SKIP_MEDIA_TYPES):
+                return True
+        return False
+
+    def _headers(self, length=None):
+        headers = [(k, v) for k, v in self.start['headers'] if k not in (b'content-length', b'vary')]
+        vary = [v for k, v in self.start['headers'] if k == b'vary']
+        headers.append((b'vary', b', '.join(vary + [b'Accept-Encoding'])))
+        headers.append((b'content-encoding', self.codec.name.encode()))
+        if length is not None:
+            headers.append((b'content-length', str(length).encode()))
+        return {**self.start, 'headers': headers}
+
+    async def on_send(self, message):
+        if message['type'] == 'http.response.start':
+            self.start = message
+            self.passthrough = self._skip(message)
+            if self.passthrough:
+                await self.send(message)
+            return
+        if message['type'] != 'http.response.body' or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get('body', b'')
+        more = message.get('more_body', False)
+        stats = self.middleware.stats
+        if self.compressor is None and not more:
+            # Whole body known: compress in one go, or not at all if small
+            if len(body) < self.middleware.minimum_size:
+                await self.send(self.start)
+                await self.send(message)
+                return
+            compressed = self.codec.whole(body, self.level)
+            stats.responses += 1
+            stats.bytes_in += len(body)
+            stats.bytes_out += len(compressed)
+            await self.send(self._headers(len(compressed)))
+            await self.send({'type': 'http.response.body', 'body': compressed})
+            return
+
+        if self.compressor is None:
+            # Streaming: length unknown, compress and flush every chunk
+            self.compressor = self.codec(self.level)
+            stats.responses += 1
+            await self.send(self._headers())
+        data = self.compressor.compress(body)
+        if not more:
+            data += self.compressor.finish()
+        stats.bytes_in += len(body)
+        stats.bytes_out += len(data)
+        await self.send({'type': 'http.response.body', 'body': data, 'more_body': more})
@@ -5,9 +5,12 @@ Script pour créer des données de démo pour le compte TechStore
 
 from pymongo import MongoClient
 from datetime import datetime, timedelta
+import asyncio
 import random
 import os
 
+from rebuild_product_stock import resync
+
 # Configuration
 MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
 DB_NAME = os.environ.get('DB_NAME', 'wms_database')
@@ -48,6 +51,8 @@ else:
     print(f"✅ Client TechStore trouvé : {techstore['_id']}")
 
 client_id = str(techstore['_id'])
+# Même drapeau que les routes de l'API : les vues admin excluent les clients démo
+is_demo = techstore.get('is_demo') is True
 
 # 2. CRÉER DES PRODUITS RÉALISTES
 print("\n📦 Création des produits...")
@@ -98,6 +103,7 @@ for prod in products_data:
             "weight": prod["weight"],
             "min_stock_level": prod["min_stock"],
             "client_id": client_id,
+            "is_demo_tenant": is_demo,
             "active": True,
             "total_stock": random.randint(prod["min_stock"] + 5, prod["min_stock"] + 50)
         })
@@ -128,6 +134,7 @@ for i in range(15):
     order = {
         "order_number": order_number,
         "client_id": client_id,
+        "is_demo_tenant": is_demo,
         "customer_name": random.choice([
             "Sophie Dubois", "Marc Leroy", "Julie Bernard", "Pierre Moreau",
             "Emma Petit", "Lucas Simon", "Chloé Laurent", "Hugo Roux"
@@ -251,6 +258,11 @@ for i in range(6):
 
 print(f"\n✅ {invoice_count} factures créées")
 
+# 6. RECALCULER LE STOCK ET INVALIDER LES CACHES
+print("\n🔄 Recalcul de product_stock et des versions...")
+asyncio.run(resync([client_id]))
+print("✅ product_stock et versions à jour")
+
 # RÉSUMÉ
 print("\n" + "="*60)
 print("🎉 DONNÉES DE DÉMO CRÉÉES AVEC SUCCÈS !")
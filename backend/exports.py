@@ -0,0 +1,115 @@
+"""
+Streaming CSV / NDJSON exports.
+
+Rows are read from a Mongo cursor in batches and written out in chunks of
+`chunk_rows`, optionally gzip-compressed. Memory use stays flat whatever
+the export size: nothing is materialized besides the current batch.
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+
+from bson import ObjectId
+
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_COLUMNS = {
+    'products': ['id', 'sku', 'name', 'description', 'barcode', 'category', 'unit_weight',
+                 'min_stock_level', 'on_hand', 'active', 'client_id', 'created_at'],
+    'orders': ['id', 'order_number', 'client_id', 'customer_name', 'customer_email', 'shipping_address',
+               'status', 'priority', 'tracking_number', 'external_platform', 'external_order_id',
+               'order_date', 'created_at'],
+    'receipts': ['id', 'receipt_number', 'client_id', 'supplier_name', 'expected_date', 'status', 'created_at'],
+    'inventory': ['id', 'product_id', 'product_sku', 'product_name', 'location_id', 'location_code',
+                  'quantity', 'last_updated', 'client_id'],
+}
+
+MEDIA_TYPES = {'csv': 'text/csv; charset=utf-8', 'ndjson': 'application/x-ndjson'}
+
+
+def _project(columns, computed=None):
+    projection = {c: 1 for c in columns if c != 'id'}
+    projection.update(computed or {})
+    return {'$project': projection}
+
+
+def export_pipeline(resource, query):
+    """Aggregation pipeline of one export; joins run per streamed row."""
+    columns = EXPORT_COLUMNS[resource]
+    if resource == 'inventory':
+        return [
+            {'$match': query},
+            {'$sort': {'_id': 1}},
+            {'$lookup': {'from': 'products', 'localField': 'product_id', 'foreignField': '_id', 'as': 'product'}},
+            {'$lookup': {'from': 'locations', 'localField': 'location_id', 'foreignField': '_id', 'as': 'location'}},
+            _project(columns, {
+                'product_sku': {'$arrayElemAt': ['$product.sku', 0]},
+                'product_name': {'$arrayElemAt': ['$product.name', 0]},
+                'location_code': {'$arrayElemAt': ['$location.code', 0]},
+            }),
+        ]
+    stages = [{'$match': query}, {'$sort': {'created_at': 1, '_id': 1}}]
+    if resource == 'products':
+        stages.append({'$lookup': {'from': 'product_stock', 'localField': '_id', 'foreignField': '_id', 'as': 'stock'}})
+        return stages + [_project(columns, {'on_hand': {'$ifNull': [{'$arrayElemAt': ['$stock.on_hand', 0]}, 0]}})]
+    return stages + [_project(columns)]
+
+
+def _json_value(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    return _json_value(value)
+
+
+def _rows(docs, columns, fmt):
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for doc in docs:
+            writer.writerow([_csv_value(doc.get('_id') if c == 'id' else doc.get(c)) for c in columns])
+        return buffer.getvalue()
+    return ''.join(
+        json.dumps({c: _json_value(doc.get('_id') if c == 'id' else doc.get(c)) for c in columns},
+                   ensure_ascii=False, separators=(',', ':')) + '\n'
+        for doc in docs
+    )
+
+
+async def stream_export(cursor, columns, fmt='csv', compress=False, chunk_rows=EXPORT_BATCH_SIZE):
+    """Yield the export as bytes chunks from an async iterator of documents."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+    def encode(text):
+        data = text.encode('utf-8')
+        return compressor.compress(data) if compressor else data
+
+    if fmt == 'csv':
+        header = io.StringIO()
+        csv.writer(header).writerow(columns)
+        yield encode(header.getvalue())
+
+    batch = []
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= chunk_rows:
+            chunk = encode(_rows(batch, columns, fmt))
+            batch = []
+            if chunk:
+                yield chunk
+    if batch:
+        chunk = encode(_rows(batch, columns, fmt))
+        if chunk:
+            yield chunk
+    if compressor:
+        yield compressor.flush()
@@ -0,0 +1,109 @@
+"""
+Shared outbound HTTP clients, one per upstream (Shopify, carriers, ...).
+
+Each upstream gets a single application-lifetime httpx.AsyncClient. Its
+connections stay open between calls, so TCP and TLS setup is paid once
+instead of on every request. Connect and read timeouts are separate. HTTP/2
+is used when the h2 package is installed. Close the clients at shutdown with
+aclose().
+"""
+
+import time
+
+import httpx
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class _MeteredTransport(httpx.AsyncBaseTransport):
+    """Counts requests, errors and time spent around the real transport."""
+
+    def __init__(self, transport):
+        self._transport = transport
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.total_ms = 0.0
+
+    async def handle_async_request(self, request):
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        started = time.perf_counter()
+        try:
+            return await self._transport.handle_async_request(request)
+        except httpx.HTTPError:
+            self.errors += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self.requests += 1
+            self.total_ms += (time.perf_counter() - started) * 1000
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+    def connections(self):
+        # httpcore keeps the pool on a private attribute: best effort only
+        pool = getattr(self._transport, '_pool', None)
+        connections = list(getattr(pool, 'connections', []))
+        return {
+            'open': len(connections),
+            'idle': sum(1 for c in connections if c.is_idle()),
+            'http2': sum(1 for c in connections if 'HTTP/2' in repr(c)),
+        }
+
+
+class HttpClients:
+    """Lazily created AsyncClient per upstream name."""
+
+    def __init__(self, connect_timeout=5.0, read_timeout=30.0, max_connections=100,
+                 max_keepalive=20, keepalive_expiry=30.0, http2=True):
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout, pool=connect_timeout)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self._clients = {}
+        self._transports = {}
+
+    def get(self, upstream):
+        client = self._clients.get(upstream)
+        if client is None:
+            transport = _MeteredTransport(httpx.AsyncHTTPTransport(limits=self.limits, http2=self.http2))
+            client = httpx.AsyncClient(transport=transport, timeout=self.timeout)
+            self._clients[upstream] = client
+            self._transports[upstream] = transport
+        return client
+
+    async def aclose(self):
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
+        self._transports.clear()
+
+    def stats(self):
+        upstreams = {}
+        for name, transport in self._transports.items():
+            upstreams[name] = {
+                'requests': transport.requests,
+                'errors': transport.errors,
+                'in_flight': transport.in_flight,
+                'peak_in_flight': transport.peak_in_flight,
+                'avg_ms': round(transport.total_ms / transport.requests, 1) if transport.requests else 0.0,
+                'connections': transport.connections(),
+            }
+        return {
+            'http2': self.http2,
+            'max_connections': self.limits.max_connections,
+            'max_keepalive_connections': self.limits.max_keepalive_connections,
+            'connect_timeout_seconds': self.timeout.connect,
+            'read_timeout_seconds': self.timeout.read,
+            'upstreams': upstreams,
+        }
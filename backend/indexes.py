@@ -0,0 +1,155 @@
+"""
+Declarative index registry.
+
+Every index the API relies on is declared here and reconciled at each
+startup. create_indexes is a no-op for indexes that already exist, so
+existing deployments pick up new entries on their next restart.
+Undeclared indexes are reported, never dropped: removing one is a manual
+decision.
+"""
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+
+def _keyset(*prefix):
+    """Tenant filter + (created_at, _id) order used by keyset pagination"""
+    return [(field, ASCENDING) for field in prefix] + [('created_at', DESCENDING), ('_id', DESCENDING)]
+
+
+INDEXES = {
+    'users': [
+        IndexModel('username', unique=True),
+        IndexModel('email'),
+        IndexModel('client_id'),
+    ],
+    'clients': [
+        IndexModel('code', unique=True),
+    ],
+    'products': [
+        IndexModel([('client_id', ASCENDING), ('sku', ASCENDING)], unique=True),
+        IndexModel(_keyset('client_id')),
+        # Admin "all clients" views filter on is_demo_tenant instead of a $in of client ids
+        IndexModel(_keyset('is_demo_tenant')),
+    ],
+    'product_stock': [
+        IndexModel([('client_id', ASCENDING), ('below_min', ASCENDING)]),
+    ],
+    'inventory': [
+        IndexModel('product_id'),
+        IndexModel('location_id'),
+        # Tenant filter + _id keyset order of /api/inventory; product and
+        # location filters stay on the tenant's slice
+        IndexModel([('client_id', ASCENDING), ('_id', ASCENDING)]),
+        IndexModel([('client_id', ASCENDING), ('product_id', ASCENDING)]),
+        IndexModel([('client_id', ASCENDING), ('location_id', ASCENDING)]),
+        IndexModel([('is_demo_tenant', ASCENDING), ('_id', ASCENDING)]),
+    ],
+    'stock_movements': [
+        IndexModel(_keyset('client_id')),
+        IndexModel(_keyset('is_demo_tenant')),
+        IndexModel([('product_id', ASCENDING), ('location_id', ASCENDING), ('created_at', ASCENDING)]),
+        # Compaction window and as-of tail
+        IndexModel('created_at'),
+    ],
+    'stock_snapshots': [
+        # One compaction's rows (as_of equality), by tenant or by product
+        IndexModel([('as_of', ASCENDING), ('client_id', ASCENDING), ('product_id', ASCENDING)]),
+        IndexModel([('as_of', ASCENDING), ('product_id', ASCENDING), ('location_id', ASCENDING)]),
+    ],
+    'stock_snapshot_runs': [
+        # One compaction at a time
+        IndexModel('status', unique=True, partialFilterExpression={'status': 'running'}),
+        IndexModel([('status', ASCENDING), ('as_of', DESCENDING)]),
+    ],
+    'locations': [
+        IndexModel('code'),
+    ],
+    'orders': [
+        IndexModel('order_number', unique=True),
+        IndexModel(_keyset('client_id')),
+        IndexModel(_keyset('client_id', 'status')),
+        IndexModel(_keyset('is_demo_tenant')),
+        # Imported orders are unique per tenant and platform: Shopify upserts and bulk imports dedupe on it.
+        # Two clients may import the same external id. Different key order from the former
+        # non-unique (external_order_id, external_platform), so the two do not clash
+        IndexModel([('client_id', ASCENDING), ('external_platform', ASCENDING), ('external_order_id', ASCENDING)],
+                   unique=True, partialFilterExpression={'external_order_id': {'$exists': True}}),
+    ],
+    'order_lines': [
+        IndexModel('order_id'),
+    ],
+    'receipts': [
+        IndexModel('receipt_number', unique=True),
+        IndexModel(_keyset('client_id')),
+    ],
+    'receipt_lines': [
+        IndexModel('receipt_id'),
+    ],
+    'invoices': [
+        IndexModel('invoice_number', unique=True),
+        IndexModel(_keyset('client_id')),
+        # One invoice per client per billing run, whatever the number of retries
+        IndexModel([('billing_run_id', ASCENDING), ('client_id', ASCENDING)], unique=True,
+                   partialFilterExpression={'billing_run_id': {'$exists': True}}),
+    ],
+    'invoice_lines': [
+        IndexModel('invoice_id'),
+        IndexModel([('billing_run_id', ASCENDING), ('client_id', ASCENDING)],
+                   partialFilterExpression={'billing_run_id': {'$exists': True}}),
+    ],
+    'carriers': [
+        IndexModel('code', unique=True),
+    ],
+    'integrations': [
+        IndexModel('sync_status.next_run_at'),
+    ],
+    'email_notifications': [
+        IndexModel([('created_at', DESCENDING)]),
+    ],
+    'password_reset_tokens': [
+        IndexModel('token'),
+        IndexModel('email'),
+        # Expired tokens are removed by MongoDB itself
+        IndexModel('expires_at', expireAfterSeconds=0),
+    ],
+}
+
+
+def declared_names():
+    return {name: {model.document['name'] for model in models} for name, models in INDEXES.items()}
+
+
+async def ensure_indexes(db):
+    """Create every declared index. Returns the errors as {collection.index: message}."""
+    errors = {}
+    for name, models in INDEXES.items():
+        for model in models:
+            try:
+                await db[name].create_indexes([model])
+            except OperationFailure as e:
+                # Same keys with other options (e.g. not unique): needs a manual migration
+                errors[f"{name}.{model.document['name']}"] = str(e)
+                print(f"Erreur index {name}.{model.document['name']}: {e}")
+    return errors
+
+
+async def index_report(db):
+    """Declared indexes missing from the database and existing ones not declared."""
+    declared = declared_names()
+    existing = {}
+    for name in set(declared) | set(await db.list_collection_names()):
+        if name.startswith('system.'):
+            continue
+        existing[name] = {index['name'] async for index in db[name].list_indexes()}
+    missing = {
+        name: sorted(names - existing.get(name, set()))
+        for name, names in declared.items()
+        if names - existing.get(name, set())
+    }
+    extra = {
+        name: sorted(names - declared.get(name, set()) - {'_id_'})
+        for name, names in existing.items()
+        if names - declared.get(name, set()) - {'_id_'}
+    }
+    return {'missing': missing, 'extra': extra}
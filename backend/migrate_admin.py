@@ -6,9 +6,13 @@ Script de migration pour NEWSTAQ WMS
 """
 
 from pymongo import MongoClient
+import asyncio
 import bcrypt
 import os
 
+from rebuild_product_stock import resync
+from tenants import _both_forms
+
 # Configuration
 MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
 DB_NAME = os.environ.get('DB_NAME', 'wms_database')
@@ -64,12 +68,15 @@ if response.lower() in ['oui', 'yes', 'y', 'o']:
     demo_client_ids = [str(c['_id']) for c in demo_clients]
     
     if demo_client_ids:
+        # client_id est stocké en chaîne ou en ObjectId selon le chemin d'écriture (inventaire : ObjectId)
+        client_match = {"$in": _both_forms(c['_id'] for c in demo_clients)}
         # Supprimer les données liées
-        db.products.delete_many({"client_id": {"$in": demo_client_ids}})
-        db.orders.delete_many({"client_id": {"$in": demo_client_ids}})
-        db.receipts.delete_many({"client_id": {"$in": demo_client_ids}})
-        db.invoices.delete_many({"client_id": {"$in": demo_client_ids}})
-        db.users.delete_many({"client_id": {"$in": demo_client_ids}})
+        db.products.delete_many({"client_id": client_match})
+        db.inventory.delete_many({"client_id": client_match})
+        db.orders.delete_many({"client_id": client_match})
+        db.receipts.delete_many({"client_id": client_match})
+        db.invoices.delete_many({"client_id": client_match})
+        db.users.delete_many({"client_id": client_match})
         
         # Supprimer les clients
         db.clients.delete_many({})
@@ -80,8 +87,14 @@ if response.lower() in ['oui', 'yes', 'y', 'o']:
 else:
     print("   ℹ️  Données de démo conservées")
 
-# 4. VÉRIFICATIONS
-print("\n4️⃣ Vérifications...")
+# 4. RECALCULER LE STOCK ET INVALIDER LES CACHES
+print("\n4️⃣ Recalcul de product_stock et des versions...")
+# Poids modifiés, clients supprimés : même remise à jour que les routes de l'API
+asyncio.run(resync())
+print("   ✅ product_stock et versions à jour")
+
+# 5. VÉRIFICATIONS
+print("\n5️⃣ Vérifications...")
 
 admin_count = db.users.count_documents({"role": "admin"})
 client_count = db.clients.count_documents({})
@@ -0,0 +1,159 @@
+"""
+Keyset (cursor) pagination and field selection for the list endpoints.
+
+Pages are ordered on (sort field, _id) and the cursor carries the last row's
+values, so fetching page N costs the same as page 1 whatever the collection
+size. Cursors are opaque base64 blobs; callers must not build them.
+
+`fields=` narrows the returned documents to an allow-listed subset. The
+$project goes right after the page is cut, and joins nobody asked for are
+skipped.
+"""
+
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+MAX_PAGE_SIZE = 500
+
+
+class InvalidPageRequest(ValueError):
+    """Bad sort field, filter or cursor in a list request."""
+
+
+def _dump_value(value):
+    if isinstance(value, datetime):
+        return {'$date': value.isoformat()}
+    if isinstance(value, ObjectId):
+        return {'$oid': str(value)}
+    return value
+
+
+def _load_value(value):
+    if isinstance(value, dict):
+        if '$date' in value:
+            return datetime.fromisoformat(value['$date'])
+        if '$oid' in value:
+            return ObjectId(value['$oid'])
+        raise InvalidPageRequest('Curseur invalide')
+    return value
+
+
+def parse_sort(sort, allowed):
+    """'-created_at' -> ('created_at', -1); the field must be in `allowed`."""
+    direction = -1 if sort.startswith('-') else 1
+    field = sort.lstrip('-+')
+    if field not in allowed:
+        raise InvalidPageRequest(f"Tri non autorisé : {field} (valeurs possibles : {', '.join(allowed)})")
+    return field, direction
+
+
+def parse_fields(fields, allowed):
+    """'sku,name' -> ['sku', 'name']; None when every field is wanted."""
+    if not fields:
+        return None
+    requested = list(dict.fromkeys(f.strip() for f in fields.split(',') if f.strip()))
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise InvalidPageRequest(f"Champs non autorisés : {', '.join(unknown)} (valeurs possibles : {', '.join(allowed)})")
+    return requested or None
+
+
+def wants(fields, *names):
+    """True when one of `names` is requested (or no selection was made)."""
+    return fields is None or any(name in fields for name in names)
+
+
+def project_stage(fields, keep=()):
+    """Inclusion $project of the requested fields plus `keep` (sort field, join keys).
+
+    Computed fields may be listed: projecting a missing field is a no-op.
+    """
+    return {'$project': {f: 1 for f in [*fields, *keep] if f != 'id'}}
+
+
+def trim_fields(docs, fields):
+    """Drop what was only kept for sorting or joining. Dotted names select sub-fields."""
+    if fields is None:
+        return docs
+    tree = {}
+    for field in fields:
+        node = tree
+        for part in field.split('.'):
+            node = node.setdefault(part, {})
+
+    def trim(doc, node):
+        kept = {'_id': doc['_id']} if '_id' in doc else {}
+        for key, child in node.items():
+            if key == 'id' or key not in doc:
+                continue
+            value = doc[key]
+            kept[key] = trim(value, child) if child and isinstance(value, dict) else value
+        return kept
+
+    return [trim(doc, tree) for doc in docs]
+
+
+def encode_cursor(field, direction, doc):
+    payload = {'s': field, 'd': direction, 'id': str(doc['_id'])}
+    if field != '_id':
+        payload['v'] = _dump_value(doc.get(field))
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, field, direction):
+    """Return (value, _id) of the last row of the previous page."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        last_id = ObjectId(payload['id'])
+        value = _load_value(payload.get('v'))
+    except (binascii.Error, ValueError, KeyError, TypeError, InvalidId):
+        raise InvalidPageRequest('Curseur invalide')
+    if payload.get('s') != field or payload.get('d') != direction:
+        raise InvalidPageRequest('Curseur incompatible avec le tri demandé')
+    return value, last_id
+
+
+def _after(field, direction, value, last_id):
+    """Match rows strictly after (value, last_id) in (field, _id) order.
+
+    Null/missing values sort first ascending and last descending.
+    """
+    op = '$lt' if direction < 0 else '$gt'
+    if field == '_id':
+        return {'_id': {op: last_id}}
+    if value is None:
+        if direction < 0:
+            return {field: None, '_id': {op: last_id}}
+        return {'$or': [{field: None, '_id': {op: last_id}}, {field: {'$ne': None}}]}
+    branches = [{field: {op: value}}, {field: value, '_id': {op: last_id}}]
+    if direction < 0:
+        branches.append({field: None})
+    return {'$or': branches}
+
+
+def page_stages(query, field, direction, cursor, limit):
+    """$match / $sort / $limit stages to put before any $lookup.
+
+    Fetches one extra row so split_page can tell whether a next page exists.
+    """
+    match = dict(query)
+    if cursor:
+        value, last_id = decode_cursor(cursor, field, direction)
+        match = {'$and': [match, _after(field, direction, value, last_id)]} if match else _after(field, direction, value, last_id)
+    sort = {'_id': direction} if field == '_id' else {field: direction, '_id': direction}
+    return [{'$match': match}, {'$sort': sort}, {'$limit': limit + 1}]
+
+
+def split_page(docs, field, direction, limit):
+    """Trim the look-ahead row and return (page, next_cursor or None)."""
+    if len(docs) <= limit:
+        return docs, None
+    page = docs[:limit]
+    return page, encode_cursor(field, direction, page[-1])
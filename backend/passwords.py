@@ -0,0 +1,91 @@
+"""
+Password hashing on a dedicated, bounded worker pool.
+
+bcrypt costs ~250 ms of CPU per call. Running it inline on the event loop
+(or on the shared request threadpool) lets a login storm starve every other
+request, so hashing goes through a small pool of its own with a cap on how
+many calls may wait.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+
+class PasswordPoolBusy(Exception):
+    """Raised when the hashing queue is full."""
+
+
+class PasswordHasher:
+    """Runs bcrypt on `workers` threads (bcrypt releases the GIL) with at
+    most `max_queue` calls waiting behind them."""
+
+    def __init__(self, workers=2, max_queue=256):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        self._lock = threading.Lock()
+        # _pending is only touched from the event loop, _running from workers
+        self._pending = 0
+        self._running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.peak_queue_depth = 0
+        self._wait_seconds = 0.0
+        self._run_seconds = 0.0
+
+    @property
+    def queue_depth(self):
+        return max(0, self._pending - self._running)
+
+    async def _submit(self, fn, *args):
+        if self._pending >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise PasswordPoolBusy()
+        self._pending += 1
+        self.peak_queue_depth = max(self.peak_queue_depth, self.queue_depth)
+        submitted = time.perf_counter()
+
+        def job():
+            started = time.perf_counter()
+            with self._lock:
+                self._running += 1
+                self._wait_seconds += started - submitted
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._run_seconds += time.perf_counter() - started
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, job)
+        finally:
+            self._pending -= 1
+            self.completed += 1
+
+    async def hash(self, password):
+        hashed = await self._submit(bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt())
+        return hashed.decode('utf-8')
+
+    async def verify(self, password, hashed):
+        return await self._submit(bcrypt.checkpw, password.encode('utf-8'), hashed.encode('utf-8'))
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'max_queue': self.max_queue,
+            'in_flight': self._running,
+            'queue_depth': self.queue_depth,
+            'peak_queue_depth': self.peak_queue_depth,
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'avg_wait_ms': round(self._wait_seconds / self.completed * 1000, 2) if self.completed else 0.0,
+            'avg_run_ms': round(self._run_seconds / self.completed * 1000, 2) if self.completed else 0.0,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,176 @@
+"""
+Pick-path routing over the location grid.
+
+Location codes follow `Z{zone}-{aisle}{rack:02d}-{level}` (e.g. Z2-B04-3).
+The warehouse is modelled as a ladder: within a zone the aisles (A, B, C...)
+run side by side, racks are numbered from the front cross-aisle towards the
+back one, and zones follow each other left to right with `zone_gap` metres
+of walking in between. Levels are vertical, so they cost no walking: every
+level of one rack is the same point on the floor.
+
+Walking between two racks of the same aisle is the distance along it;
+between aisles the picker goes round through the front or the back
+cross-aisle, whichever is shorter. Routes start and end at the depot, in
+front of the first aisle of the first zone.
+
+plan_route() starts from the serpentine (S-shape) order - visited aisles
+walked alternately up and down - and improves it with 2-opt over the
+distance matrix: every candidate reversal is scored in one numpy pass and
+the best one applied, until none shortens the route. A route is never
+longer than the code-sorted order. Codes that do not follow the grid
+are never dropped: they are appended after the route, in code order.
+"""
+
+import re
+from collections import namedtuple
+
+import numpy as np
+
+LOCATION_CODE = re.compile(r'^Z(\d+)-([A-Z]+)(\d+)-(\d+)$')
+MAX_MOVES = 1000
+
+Slot = namedtuple('Slot', ['zone', 'aisle', 'rack', 'level'])
+Route = namedtuple('Route', ['stops', 'distance', 'unrouted'])
+
+
+def parse_location(code):
+    """Slot of a grid location code, None for codes outside the grid."""
+    match = LOCATION_CODE.match(code or '')
+    if not match:
+        return None
+    zone, letters, rack, level = match.groups()
+    aisle = 0
+    for letter in letters:
+        aisle = aisle * 26 + ord(letter) - ord('A') + 1
+    return Slot(int(zone), aisle - 1, int(rack), int(level))
+
+
+class Layout:
+    """Floor coordinates of the grid, sized from the warehouse's location codes."""
+
+    def __init__(self, codes, aisle_pitch=3.0, rack_pitch=1.0, zone_gap=6.0):
+        slots = [s for s in map(parse_location, codes) if s]
+        aisles = {}
+        for slot in slots:
+            aisles[slot.zone] = max(aisles.get(slot.zone, 0), slot.aisle + 1)
+        self.aisle_pitch = aisle_pitch
+        self.rack_pitch = rack_pitch
+        # x of the first aisle of each zone
+        self.zone_x = {}
+        x = 0.0
+        for zone in sorted(aisles):
+            self.zone_x[zone] = x
+            x += aisles[zone] * aisle_pitch + zone_gap
+        self.zone_end = x
+        # Back cross-aisle, one rack pitch behind the deepest rack
+        self.depth = (max((s.rack for s in slots), default=0) + 1) * rack_pitch
+
+    def point(self, slot):
+        # Zones unknown to the layout are placed after the last one
+        return self.zone_x.get(slot.zone, self.zone_end) + slot.aisle * self.aisle_pitch, slot.rack * self.rack_pitch
+
+    def distances(self, points):
+        """Walking distance matrix between (x, y) floor points."""
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        x, y = points[:, 0], points[:, 1]
+        across = np.abs(x[:, None] - x[None, :])
+        along = np.abs(y[:, None] - y[None, :])
+        depth = max(self.depth, y.max() + self.rack_pitch)
+        around = np.minimum(y[:, None] + y[None, :], 2 * depth - y[:, None] - y[None, :])
+        return np.where(across < 1e-9, along, across + around)
+
+
+def _serpentine(points):
+    """Indexes of points in S-shape order: visited aisles alternately walked up and down."""
+    order = []
+    upwards = True
+    xs = sorted({x for x, _ in points})
+    for x in xs:
+        in_aisle = sorted((i for i, p in enumerate(points) if p[0] == x), key=lambda i: points[i][1], reverse=not upwards)
+        order += in_aisle
+        upwards = not upwards
+    return order
+
+
+def _tour_length(matrix, tour):
+    return float(matrix[tour[:-1], tour[1:]].sum())
+
+
+def _two_opt(matrix, tour):
+    """Improve a closed tour (depot at both ends) by segment reversals, best one first, until none helps."""
+    tour = np.array(tour)
+    n = len(tour) - 2
+    later = np.triu(np.ones((n, n), dtype=bool), 1)
+    for _ in range(MAX_MOVES):
+        before, stops, after = tour[:-2], tour[1:-1], tour[2:]
+        # Reversing stops[i..j] swaps edges (before[i], stops[i]) + (stops[j], after[j])
+        # for (before[i], stops[j]) + (stops[i], after[j])
+        delta = (matrix[np.ix_(before, stops)] + matrix[np.ix_(stops, after)]
+                 - matrix[before, stops][:, None] - matrix[stops, after][None, :])
+        delta[~later] = 0.0
+        i, j = divmod(int(np.argmin(delta)), n)
+        if delta[i, j] > -1e-9:
+            break
+        tour[i + 1:j + 2] = tour[i + 1:j + 2][::-1]
+    return tour.tolist()
+
+
+def route_length(layout, codes):
+    """Walking distance from the depot through grid `codes` in the given order and back."""
+    points = [(0.0, 0.0)] + [layout.point(s) for s in map(parse_location, codes) if s]
+    matrix = layout.distances(points)
+    return _tour_length(matrix, list(range(len(points))) + [0])
+
+
+def naive_order(codes):
+    """Distinct codes sorted by code, the order pickers get without routing."""
+    return sorted(set(codes))
+
+
+def plan_route(layout, codes):
+    """Route through the distinct `codes`: grid stops in walking order, distance, unrouted codes."""
+    slots = {}
+    unrouted = []
+    for code in sorted(set(codes)):
+        slot = parse_location(code)
+        if slot is None:
+            unrouted.append(code)
+        else:
+            slots[code] = slot
+    # One floor point per rack: its levels are picked in one stop, bottom up
+    by_point = {}
+    for code, slot in slots.items():
+        by_point.setdefault(layout.point(slot), []).append(code)
+    points = list(by_point)
+    if not points:
+        return Route([], 0.0, unrouted)
+
+    matrix = layout.distances([(0.0, 0.0)] + points)
+    tour = _two_opt(matrix, [0] + [i + 1 for i in _serpentine(points)] + [0])
+    naive = [0] + list(range(1, len(points) + 1)) + [0]
+    if _tour_length(matrix, naive) < _tour_length(matrix, tour):
+        tour = naive
+    length = _tour_length(matrix, tour)
+    stops = []
+    for index in tour[1:-1]:
+        stops += sorted(by_point[points[index - 1]], key=lambda code: slots[code].level)
+    return Route(stops, round(length, 2), unrouted)
+
+
+def assign_locations(demand, stock):
+    """Location code to pick each product from.
+
+    demand: {product_id: quantity}; stock: {product_id: [(code, quantity on hand)]}.
+    A location holding the whole quantity wins, then one the route already
+    visits, then the fullest; products with a single location are placed first.
+    """
+    chosen = {}
+    used = set()
+    for product_id in sorted(demand, key=lambda p: (len(stock.get(p, [])), str(p))):
+        candidates = [c for c in stock.get(product_id, []) if c[1] > 0]
+        if not candidates:
+            continue
+        code, _ = max(candidates, key=lambda c: (c[1] >= demand[product_id], c[0] in used, c[1], c[0]))
+        chosen[product_id] = code
+        used.add(code)
+    return chosen
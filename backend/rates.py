@@ -0,0 +1,239 @@
+"""
+Table-driven carrier rate engine.
+
+Each carrier document may hold `rate_cards`, one per service:
+
+    {
+        'service': 'Standard',
+        'estimated_days': '2-3 jours',
+        'tracking': True,
+        'currency': 'EUR',
+        'weight_breaks': [0.5, 1, 2, 5, 10, 30],         # upper bounds, kg
+        'zones': {'FR': [], 'DOM': ['971', '972']},      # zip prefixes, [] = default zone
+        'prices': {'FR': [5.2, 5.5, ...], 'DOM': [...]}, # one price per weight break
+        'extra_kg': None,                                # price per started kg above the last break
+        'per_kg': 0,                                     # continuous price per kg, on top of the break price
+        'surcharges': [
+            {'name': 'Signature', 'type': 'fixed', 'amount': 1.5},
+            {'name': 'Corse', 'type': 'zip_prefix', 'prefixes': ['20'], 'amount': 12.0},
+            {'name': 'Lourd', 'type': 'weight_over', 'threshold': 20, 'amount': 8.0},
+            {'name': 'Carburant', 'type': 'percent', 'rate': 12.5},
+        ],
+    }
+
+Carriers without rate_cards fall back to DEFAULT_RATE_CARDS, which quote
+exactly what the former hardcoded formulas did (any zip, any weight). Cards are
+compiled once into numpy arrays: a batch of parcels is quoted for every
+service in one vectorized pass. The zone x weight-break price matrix is the
+lookup table (identical lookups are array gathers, never recomputed) and
+the zip -> zone resolution is memoized per card, so a wave only resolves
+each distinct zip once. NaN marks a parcel a service does not carry (no
+zone for the zip, or heavier than the last break without extra_kg).
+"""
+
+import time
+
+import numpy as np
+
+SURCHARGE_TYPES = ('fixed', 'percent', 'zip_prefix', 'weight_over')
+
+
+class InvalidRateCard(ValueError):
+    """A rate card that cannot be compiled."""
+
+
+def _linear_card(service, estimated_days, base, per_kg, surcharges=()):
+    """Default card: the historical base + per-kg formula, for every zip and weight.
+
+    One break priced at `base`; per_kg carries the weight, continuously, and
+    extra_kg=0 keeps heavier parcels on the same formula instead of refusing them.
+    """
+    return {
+        'service': service,
+        'estimated_days': estimated_days,
+        'tracking': True,
+        'currency': 'EUR',
+        'weight_breaks': [30],
+        'zones': {'FR': []},
+        'prices': {'FR': [base]},
+        'extra_kg': 0,
+        'per_kg': per_kg,
+        'surcharges': list(surcharges),
+    }
+
+
+DEFAULT_RATE_CARDS = {
+    'COLISSIMO': [
+        _linear_card('Standard', '2-3 jours', 4.95, 0.5),
+        _linear_card('Signature', '2-3 jours', 4.95, 0.5, surcharges=[
+            {'name': 'Signature', 'type': 'fixed', 'amount': 1.5},
+        ]),
+    ],
+    'CHRONOPOST': [
+        _linear_card('Chrono 13', '1 jour (avant 13h)', 9.90, 1.2),
+        _linear_card('Chrono 18', '1 jour (avant 18h)', 9.90, 1.2, surcharges=[
+            {'name': 'Chrono 18', 'type': 'percent', 'rate': -15},
+        ]),
+    ],
+}
+
+
+class RateCard:
+    """One carrier service, compiled for vectorized quoting."""
+
+    def __init__(self, carrier_code, carrier_name, card):
+        self.carrier_code = carrier_code
+        self.carrier_name = carrier_name
+        self.service = card.get('service') or 'Standard'
+        self.estimated_days = card.get('estimated_days')
+        self.tracking = card.get('tracking', True)
+        self.currency = card.get('currency', 'EUR')
+        where = f'{carrier_code} / {self.service}'
+
+        breaks = [float(b) for b in card.get('weight_breaks') or []]
+        if not breaks or any(b <= a for a, b in zip(breaks, breaks[1:])) or breaks[0] <= 0:
+            raise InvalidRateCard(f'{where} : paliers de poids vides ou non croissants')
+        self.breaks = np.array(breaks)
+
+        zones = card.get('zones') or {}
+        prices = card.get('prices') or {}
+        if not zones or set(zones) != set(prices):
+            raise InvalidRateCard(f'{where} : chaque zone doit avoir sa grille de prix')
+        self.zone_names = list(zones)
+        for name in self.zone_names:
+            if len(prices[name]) != len(breaks):
+                raise InvalidRateCard(f'{where} : zone {name}, {len(prices[name])} prix pour {len(breaks)} paliers')
+        # Extra column for parcels above the last break: priced from extra_kg below
+        self.matrix = np.full((len(self.zone_names), len(breaks) + 1), np.nan)
+        self.matrix[:, :-1] = [[float(p) for p in prices[name]] for name in self.zone_names]
+        self.extra_kg = card.get('extra_kg')
+        self.per_kg = float(card.get('per_kg') or 0)
+
+        self.default_zone = -1
+        self.prefixes = {}
+        for index, name in enumerate(self.zone_names):
+            if not zones[name]:
+                self.default_zone = index
+            for prefix in zones[name]:
+                self.prefixes[str(prefix)] = index
+        self.prefix_lengths = sorted({len(p) for p in self.prefixes}, reverse=True)
+
+        self.fixed = 0.0
+        self.percent = 0.0
+        self.zip_surcharges = []
+        self.weight_surcharges = []
+        for surcharge in card.get('surcharges') or []:
+            kind = surcharge.get('type')
+            if kind == 'fixed':
+                self.fixed += float(surcharge['amount'])
+            elif kind == 'percent':
+                self.percent += float(surcharge['rate'])
+            elif kind == 'zip_prefix':
+                self.zip_surcharges.append((tuple(str(p) for p in surcharge['prefixes']), float(surcharge['amount'])))
+            elif kind == 'weight_over':
+                self.weight_surcharges.append((float(surcharge['threshold']), float(surcharge['amount'])))
+            else:
+                raise InvalidRateCard(f"{where} : type de supplément inconnu {kind} (valeurs possibles : {', '.join(SURCHARGE_TYPES)})")
+        self._zip_memo = {}
+
+    def describe(self):
+        return {
+            'carrier': self.carrier_name,
+            'carrierCode': self.carrier_code,
+            'service': self.service,
+            'currency': self.currency,
+            'estimatedDays': self.estimated_days,
+            'tracking': self.tracking,
+        }
+
+    def _resolve_zip(self, zip_code):
+        """(zone index, zip surcharge) of one zip, longest prefix first; memoized."""
+        resolved = self._zip_memo.get(zip_code)
+        if resolved is None:
+            zone = self.default_zone
+            for length in self.prefix_lengths:
+                if zip_code[:length] in self.prefixes:
+                    zone = self.prefixes[zip_code[:length]]
+                    break
+            extra = sum(amount for prefixes, amount in self.zip_surcharges if zip_code.startswith(prefixes))
+            resolved = self._zip_memo[zip_code] = (zone, extra)
+        return resolved
+
+    def quote(self, unique_zips, zip_inverse, weights):
+        """Prices of every parcel (NaN when not carried), as a float array."""
+        resolved = [self._resolve_zip(z) for z in unique_zips]
+        zone_of_zip = np.array([r[0] for r in resolved], dtype=np.int64)
+        zones = zone_of_zip[zip_inverse]
+        break_index = np.searchsorted(self.breaks, weights, side='left')
+        prices = self.matrix[np.maximum(zones, 0), break_index]
+        above = break_index == len(self.breaks)
+        if self.extra_kg is not None and above.any():
+            last = self.matrix[np.maximum(zones[above], 0), len(self.breaks) - 1]
+            prices[above] = last + np.ceil(weights[above] - self.breaks[-1]) * float(self.extra_kg)
+        if self.per_kg:
+            prices += weights * self.per_kg
+        prices[zones < 0] = np.nan
+
+        if self.zip_surcharges:
+            prices += np.array([r[1] for r in resolved])[zip_inverse]
+        for threshold, amount in self.weight_surcharges:
+            prices += np.where(weights > threshold, amount, 0.0)
+        prices += self.fixed
+        if self.percent:
+            prices *= 1 + self.percent / 100
+        return _round_cents(prices)
+
+
+def _round_cents(prices):
+    """np.round to cents, with half-cent ties settled like round(): np.round scales by 100
+    first, which flips values such as 6.325 (stored a hair above) down to 6.32."""
+    rounded = np.round(prices, 2)
+    scaled = prices * 100
+    ties = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if ties.any():
+        rounded[ties] = [round(p, 2) for p in prices[ties].tolist()]
+    return rounded
+
+
+def compile_cards(carriers):
+    """RateCards of the given carrier documents, DEFAULT_RATE_CARDS where a carrier has none."""
+    compiled = []
+    for carrier in carriers:
+        cards = carrier.get('rate_cards') or DEFAULT_RATE_CARDS.get(carrier['code'], [])
+        compiled += [RateCard(carrier['code'], carrier.get('name', carrier['code']), card) for card in cards]
+    return compiled
+
+
+def quote_batch(cards, zips, weights):
+    """Prices of N parcels for every card: an (N, len(cards)) array, NaN = not carried."""
+    weights = np.asarray(weights, dtype=float)
+    # Each distinct zip is resolved once per card
+    positions = {}
+    zip_inverse = np.fromiter((positions.setdefault(str(z).strip(), len(positions)) for z in zips), dtype=np.int64, count=len(zips))
+    unique_zips = list(positions)
+    prices = np.empty((len(weights), len(cards)))
+    for column, card in enumerate(cards):
+        prices[:, column] = card.quote(unique_zips, zip_inverse, weights)
+    return prices
+
+
+class RateEngine:
+    """Compiled cards of the active carriers, reloaded every `ttl` seconds or after invalidate()."""
+
+    def __init__(self, db, ttl=60.0):
+        self._db = db
+        self.ttl = ttl
+        self._cards = None
+        self._loaded_at = 0.0
+
+    async def cards(self, carrier_codes=None):
+        if self._cards is None or time.monotonic() - self._loaded_at > self.ttl:
+            carriers = await self._db.carriers.find({'active': True}, {'code': 1, 'name': 1, 'rate_cards': 1}).to_list(length=None)
+            self._cards = compile_cards(carriers)
+            self._loaded_at = time.monotonic()
+        if carrier_codes:
+            return [c for c in self._cards if c.carrier_code in carrier_codes]
+        return self._cards
+
+    def invalidate(self):
+        self._cards = None
@@ -0,0 +1,50 @@
+"""
+Script de réparation pour NEWSTAQ WMS
+- Recalcule la collection product_stock (stock par produit) depuis l'inventaire
+- Invalide les versions (ETag) des listes et le cache des clients démo
+- À lancer si les totaux de stock affichés divergent de l'inventaire réel
+
+Les scripts qui écrivent directement en base (create_techstore_demo_data,
+migrate_admin) appellent resync() à la fin, comme les routes de l'API.
+"""
+
+import asyncio
+import os
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import versions
+from stock import rebuild_product_stock
+from tenants import TenantRegistry
+
+# Configuration
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+DB_NAME = os.environ.get('DB_NAME', 'wms_database')
+
+
+async def resync(client_ids=None):
+    """Rebuild product_stock, reload the demo tenant sets and bump the list versions.
+
+    Versions are bumped for `client_ids`, or for every client when None.
+    """
+    client = AsyncIOMotorClient(MONGO_URL)
+    db = client[DB_NAME]
+    try:
+        count = await rebuild_product_stock(db)
+        await TenantRegistry(db).bump()
+        if client_ids is None:
+            client_ids = await db.clients.distinct('_id')
+        await versions.bump(db, versions.VERSIONED, client_ids)
+    finally:
+        client.close()
+    return count
+
+
+async def main():
+    print("🚀 Recalcul de product_stock...")
+    count = await resync()
+    print(f"✅ {count} produits recalculés")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
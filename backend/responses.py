@@ -0,0 +1,45 @@
+"""
+orjson-backed JSON responses for Mongo documents.
+
+MongoJSONResponse serializes raw documents as they come out of Motor in one
+native pass: ObjectIds become strings, datetimes ISO 8601 strings and `_id`
+keys `id`, the same output as serialize_doc. Endpoints return it directly so
+FastAPI's jsonable_encoder is skipped too.
+"""
+
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+
+import orjson
+
+_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f'Type non sérialisable : {type(value).__name__}')
+
+
+def dumps(content):
+    data = orjson.dumps(content, default=_default, option=_OPTIONS)
+    # Inside a JSON string every quote is escaped, so '"_id":' can only be a
+    # key: renaming at the byte level covers every nesting depth
+    return data.replace(b'"_id":', b'"id":')
+
+
+class MongoJSONResponse(JSONResponse):
+    def render(self, content):
+        return dumps(content)
+
+
+def page_response(docs, next_cursor, etag=None):
+    """One page of a keyset-paginated list, next cursor in X-Next-Cursor."""
+    headers = {}
+    if next_cursor:
+        headers['X-Next-Cursor'] = next_cursor
+    if etag:
+        # Always revalidate: a 304 costs one version lookup
+        headers['ETag'] = etag
+        headers['Cache-Control'] = 'private, no-cache'
+    return MongoJSONResponse(docs, headers=headers or None)
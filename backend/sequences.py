@@ -0,0 +1,87 @@
+"""
+Atomic document-number sequences.
+
+One counter document per sequence in the counters collection, advanced with
+find_one_and_update($inc): no collection count per insert and no two
+writers can get the same number. reserve() hands out a whole block in one
+round-trip for bulk imports.
+"""
+
+import re
+
+from pymongo import ReturnDocument
+
+# Sequence names and where their numbers are stored: collection, field, and
+# one pattern per prefix the sequence issues numbers under (trailing digits)
+SEQUENCES = {
+    'orders': ('orders', 'order_number', [r'^CMD-\d+$', r'^SHOP-\d+$']),
+    'receipts': ('receipts', 'receipt_number', [r'^REC-\d+$']),
+    'invoices': ('invoices', 'invoice_number', [r'^FACT-\d{6}-\d+$']),
+    'clients': ('clients', 'code', [r'^CLI\d+$']),
+}
+# Digit runs compare as numbers: CLI1000 sorts after CLI999
+NUMERIC_ORDER = {'locale': 'en', 'numericOrdering': True}
+
+
+async def reserve(db, name, count=1):
+    """Reserve `count` consecutive numbers and return the first one."""
+    if count < 1:
+        raise ValueError('count must be >= 1')
+    counter = await db.counters.find_one_and_update(
+        {'_id': name},
+        {'$inc': {'value': count}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return counter['value'] - count + 1
+
+
+async def next_number(db, name):
+    return await reserve(db, name, 1)
+
+
+async def ensure_floor(db, name, floor):
+    """Never hand out a number <= floor (numbers issued before the counter existed)."""
+    await db.counters.update_one({'_id': name}, {'$max': {'value': floor}}, upsert=True)
+
+
+async def highest_number(db, collection, field, pattern):
+    """Largest trailing number among the `field` values matching `pattern`, 0 if none.
+
+    Runs once per missing counter: the numeric collation has no index to use.
+    """
+    cursor = db[collection].find({field: {'$regex': pattern}}, {field: 1}).sort(field, -1).limit(1)
+    docs = await cursor.collation(NUMERIC_ORDER).to_list(length=1)
+    return int(re.search(r'(\d+)$', docs[0][field]).group(1)) if docs else 0
+
+
+async def init_sequences(db):
+    """Create missing counters above the highest number issued before sequences existed.
+
+    A count of the documents is not a floor: after deletions it falls below
+    numbers still in use. Existing counters are left alone.
+    """
+    existing = set(await db.counters.distinct('_id', {'_id': {'$in': list(SEQUENCES)}}))
+    for name, (collection, field, patterns) in SEQUENCES.items():
+        if name in existing:
+            continue
+        floor = 0
+        for pattern in patterns:
+            floor = max(floor, await highest_number(db, collection, field, pattern))
+        await ensure_floor(db, name, floor)
+
+
+def order_number(n, prefix='CMD'):
+    return f'{prefix}-{str(n).zfill(6)}'
+
+
+def receipt_number(n):
+    return f'REC-{str(n).zfill(6)}'
+
+
+def invoice_number(n, issued_at):
+    return f'FACT-{issued_at.strftime("%Y%m")}-{str(n).zfill(4)}'
+
+
+def client_code(n):
+    return f'CLI{str(n).zfill(3)}'
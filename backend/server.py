@@ -1,14 +1,43 @@
 import os
+import re
+import asyncio
 import bcrypt
 import jwt
 from datetime import datetime, timedelta, timezone
 from bson import ObjectId
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, ValidationError
 from typing import Optional, List
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
+from starlette.concurrency import run_in_threadpool
 import httpx
+import numpy as np
+from cache import SnapshotCache, TTLCache
+from passwords import PasswordHasher, PasswordPoolBusy
+from pagination import (
+    MAX_PAGE_SIZE, InvalidPageRequest, page_stages, parse_fields, parse_sort, project_stage, split_page, trim_fields, wants
+)
+from stock import backfill_inventory_tenants, rebuild_product_stock, refresh_product_stock
+from tenants import TenantRegistry, backfill_demo_flags, sync_demo_flags
+import billing
+import bulk_orders
+import change_feed
+import pick_route
+import sequences
+import shipping
+import shopify_sync
+import stock_ledger
+import versions
+from compression import CompressionMiddleware, CompressionStats
+from sync_scheduler import SyncScheduler
+from http_clients import HttpClients
+from alerts import check_low_stock
+from indexes import ensure_indexes, index_report
+from responses import MongoJSONResponse, dumps, page_response
+from rates import InvalidRateCard, RateEngine, compile_cards, quote_batch
+from exports import EXPORT_BATCH_SIZE, EXPORT_COLUMNS, MEDIA_TYPES, export_pipeline, stream_export
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -32,6 +61,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
+)
+
+# gzip / brotli above COMPRESSION_MIN_SIZE bytes
+compression_stats = CompressionStats()
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.environ.get('COMPRESSION_MIN_SIZE', '1024')),
+    stats=compression_stats
 )
 
 # Configuration
@@ -40,14 +78,68 @@ if not JWT_SECRET:
     JWT_SECRET = 'dev-only-secret-key-not-for-production'
 MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
 DB_NAME = os.environ.get('DB_NAME', 'wms_database')
-
-# MongoDB connection
-client = MongoClient(MONGO_URL)
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', '2048'))
+USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL', '60'))
+DASHBOARD_SNAPSHOT_TTL = float(os.environ.get('DASHBOARD_SNAPSHOT_TTL', '5'))
+DASHBOARD_STALE_TTL = float(os.environ.get('DASHBOARD_STALE_TTL', '60'))
+BCRYPT_WORKERS = int(os.environ.get('BCRYPT_WORKERS', str(max(1, (os.cpu_count() or 2) // 2))))
+BCRYPT_MAX_QUEUE = int(os.environ.get('BCRYPT_MAX_QUEUE', '256'))
+SYNC_SCHEDULER_ENABLED = os.environ.get('SYNC_SCHEDULER_ENABLED', 'true').lower() == 'true'
+SYNC_INTERVAL_SECONDS = float(os.environ.get('SYNC_INTERVAL_SECONDS', '300'))
+SYNC_MAX_CONCURRENCY = int(os.environ.get('SYNC_MAX_CONCURRENCY', '20'))
+SYNC_PER_STORE = int(os.environ.get('SYNC_PER_STORE', '1'))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', '5'))
+HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', '30'))
+HTTP_MAX_CONNECTIONS = int(os.environ.get('HTTP_MAX_CONNECTIONS', '100'))
+HTTP_MAX_KEEPALIVE = int(os.environ.get('HTTP_MAX_KEEPALIVE', '20'))
+HTTP2_ENABLED = os.environ.get('HTTP2_ENABLED', 'true').lower() == 'true'
+CHANGE_FEED_ENABLED = os.environ.get('CHANGE_FEED_ENABLED', 'true').lower() == 'true'
+CHANGE_FEED_KEEPALIVE_SECONDS = float(os.environ.get('CHANGE_FEED_KEEPALIVE_SECONDS', '20'))
+CHANGE_FEED_QUEUE_SIZE = int(os.environ.get('CHANGE_FEED_QUEUE_SIZE', '256'))
+CARRIER_CONCURRENCY = int(os.environ.get('CARRIER_CONCURRENCY', '10'))
+MAX_WAVE_ORDERS = int(os.environ.get('MAX_WAVE_ORDERS', '1000'))
+MAX_ROUTE_ORDERS = int(os.environ.get('MAX_ROUTE_ORDERS', '200'))
+RATE_CARDS_TTL = float(os.environ.get('RATE_CARDS_TTL', '60'))
+MAX_RATE_PARCELS = int(os.environ.get('MAX_RATE_PARCELS', '20000'))
+STOCK_SNAPSHOT_INTERVAL_SECONDS = float(os.environ.get('STOCK_SNAPSHOT_INTERVAL_SECONDS', '3600'))
+
+# MongoDB connection (async driver: every query is awaited so a slow
+# aggregation never blocks the event loop for other requests)
+client = AsyncIOMotorClient(MONGO_URL)
 db = client[DB_NAME]
 
 # Collections
 reset_tokens = db['password_reset_tokens']
 
+# Authenticated users (serialized, without password) keyed by user id
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+# Dashboard statistics per tenant, a few seconds old at most
+dashboard_snapshots = SnapshotCache(ttl=DASHBOARD_SNAPSHOT_TTL, stale_ttl=DASHBOARD_STALE_TTL)
+
+# Demo / non-demo client ids, reloaded when a client changes
+tenant_registry = TenantRegistry(db)
+
+# bcrypt runs on its own bounded pool, never on the request workers
+password_hasher = PasswordHasher(workers=BCRYPT_WORKERS, max_queue=BCRYPT_MAX_QUEUE)
+
+# One pooled outbound client per upstream, closed at shutdown
+http_clients = HttpClients(
+    connect_timeout=HTTP_CONNECT_TIMEOUT,
+    read_timeout=HTTP_READ_TIMEOUT,
+    max_connections=HTTP_MAX_CONNECTIONS,
+    max_keepalive=HTTP_MAX_KEEPALIVE,
+    http2=HTTP2_ENABLED
+)
+
+@app.exception_handler(PasswordPoolBusy)
+async def password_pool_busy_handler(request: Request, exc: PasswordPoolBusy):
+    return JSONResponse(
+        status_code=503,
+        content={'detail': 'Serveur surchargé, veuillez réessayer dans quelques secondes'},
+        headers={'Retry-After': '2'}
+    )
+
 # Helper to convert ObjectId to string
 def serialize_doc(doc):
     if doc is None:
@@ -72,6 +164,46 @@ def serialize_doc(doc):
         return result
     return doc
 
+@app.exception_handler(InvalidPageRequest)
+async def invalid_page_request_handler(request: Request, exc: InvalidPageRequest):
+    return JSONResponse(status_code=400, content={'detail': str(exc)})
+
+# Tenant filters
+def client_id_match(client_id):
+    """client_id is stored as a string or an ObjectId depending on the write path: match both"""
+    if ObjectId.is_valid(client_id):
+        return {'$in': [client_id, ObjectId(client_id)]}
+    return client_id
+
+async def tenant_query(user, client_id=None, flagged=False):
+    """client_id filter for list endpoints: own tenant for clients, chosen or all non-demo tenants for admins
+
+    flagged: the collection carries is_demo_tenant (products, orders, inventory, product_stock)
+    """
+    if user['role'] == 'client':
+        return {'client_id': client_id_match(user['client_id'])}
+    if client_id:
+        return {'client_id': client_id_match(client_id)}
+    if flagged:
+        return {'is_demo_tenant': False}
+    ids = await tenant_registry.non_demo_client_ids()
+    return {'client_id': {'$in': ids}} if ids else {'client_id': None}
+
+async def list_etag(request, user, collection, client_id=None):
+    """Weak ETag of a list response: tenant change version + query string"""
+    if user['role'] == 'client':
+        scope = user['client_id']
+    else:
+        scope = client_id or versions.ALL_TENANTS
+    version = await versions.current(db, collection, scope)
+    return versions.make_etag(collection, scope, version, f"{user['role']}|{scope}|{request.url.query}")
+
+def not_modified(request, etag):
+    """304 when the client already holds this version, None otherwise"""
+    if versions.etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers={'ETag': etag, 'Cache-Control': 'private, no-cache'})
+    return None
+
 # JWT helpers
 def create_token(user):
     return jwt.encode({
@@ -82,36 +214,53 @@ def create_token(user):
         'exp': datetime.now(timezone.utc) + timedelta(days=7)
     }, JWT_SECRET, algorithm='HS256')
 
-def get_current_user(request: Request):
+async def load_user_record(user_id):
+    """Load an active user with its client name, in the shape cached by get_current_user"""
+    user = await db.users.find_one(
+        {'_id': ObjectId(user_id), 'active': {'$ne': False}},
+        {'password': 0}
+    )
+    if not user:
+        return None
+    client_name = None
+    if user.get('client_id'):
+        client_doc = await db.clients.find_one({'_id': ObjectId(user['client_id'])}, {'name': 1})
+        client_name = client_doc['name'] if client_doc else None
+    record = serialize_doc(user)
+    record['client_name'] = client_name
+    return record
+
+async def get_current_user(request: Request):
     auth_header = request.headers.get('Authorization')
     if not auth_header or not auth_header.startswith('Bearer '):
         raise HTTPException(status_code=401, detail='Token requis')
+    return await user_from_token(auth_header[7:])
+
+async def user_from_token(token: str):
+    """User of a JWT; also used where browsers cannot send headers (EventSource, WebSocket)"""
     try:
-        payload = jwt.decode(auth_header[7:], JWT_SECRET, algorithms=['HS256'])
-        user = db.users.find_one({'_id': ObjectId(payload['id'])})
-        if not user:
-            raise HTTPException(status_code=401, detail='Utilisateur non trouvé')
-        return serialize_doc(user)
+        payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
+        user = user_cache.get(payload['id'])
+        if user is None:
+            user = await load_user_record(payload['id'])
+            if not user:
+                raise HTTPException(status_code=401, detail='Utilisateur non trouvé')
+            user_cache.set(payload['id'], user)
+        # Handlers may add keys to the user dict: never hand out the cached one
+        return dict(user)
+    except HTTPException:
+        raise
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail='Token expiré')
     except:
         raise HTTPException(status_code=401, detail='Token invalide')
 
 # Initialize database with seed data
-def init_db():
+async def init_db():
     # Check if already initialized
-    if db.users.count_documents({}) > 0:
+    if await db.users.count_documents({}) > 0:
         return
     
-    # Create indexes
-    db.users.create_index('username', unique=True)
-    db.clients.create_index('code', unique=True)
-    db.products.create_index([('client_id', 1), ('sku', 1)], unique=True)
-    db.orders.create_index('order_number', unique=True)
-    db.receipts.create_index('receipt_number', unique=True)
-    db.invoices.create_index('invoice_number', unique=True)
-    db.carriers.create_index('code', unique=True)
-    
     # Seed carriers
     carriers = [
         {'code': 'COLISSIMO', 'name': 'Colissimo', 'type': 'postal', 'tracking_url_template': 'https://www.laposte.fr/outils/suivre-vos-envois?code={tracking}', 'active': True},
@@ -123,7 +272,7 @@ def init_db():
         {'code': 'MONDIAL_RELAY', 'name': 'Mondial Relay', 'type': 'relay', 'tracking_url_template': 'https://www.mondialrelay.fr/suivi-de-colis/?numeroExpedition={tracking}', 'active': True},
         {'code': 'RELAIS_COLIS', 'name': 'Relais Colis', 'type': 'relay', 'tracking_url_template': 'https://www.relaiscolis.com/suivi-de-colis/?code={tracking}', 'active': True},
     ]
-    db.carriers.insert_many(carriers)
+    await db.carriers.insert_many(carriers)
     
     # Seed warehouse zones
     zones = [
@@ -132,7 +281,7 @@ def init_db():
         {'code': 'ZONE-C', 'name': 'Zone C - Préparation', 'description': 'Zone de préparation commandes', 'active': True},
         {'code': 'ZONE-D', 'name': 'Zone D - Expédition', 'description': 'Zone d\'expédition', 'active': True},
     ]
-    zone_results = db.warehouse_zones.insert_many(zones)
+    zone_results = await db.warehouse_zones.insert_many(zones)
     zone_ids = zone_results.inserted_ids
     
     # Seed locations
@@ -150,7 +299,7 @@ def init_db():
                         'capacity': 100.0,
                         'active': True
                     })
-    db.locations.insert_many(locations)
+    await db.locations.insert_many(locations)
     
     # Seed clients
     clients_data = [
@@ -159,13 +308,13 @@ def init_db():
         {'code': 'FASHION003', 'name': 'FashionPlus', 'email': 'hello@fashionplus.fr', 'phone': '+33 1 11 22 33 44', 'address': '78 Boulevard Mode, 13001 Marseille', 'active': True},
         {'code': 'TEST004', 'name': 'Client Test Demo', 'email': 'demo@newstaq.fr', 'phone': '+33 1 00 00 00 00', 'address': '1 Rue Test, 75000 Paris', 'active': True},
     ]
-    client_results = db.clients.insert_many(clients_data)
+    client_results = await db.clients.insert_many(clients_data)
     client_ids = client_results.inserted_ids
     
     # Seed users
-    admin_password = bcrypt.hashpw('admin123'.encode(), bcrypt.gensalt()).decode()
-    client_password = bcrypt.hashpw('client123'.encode(), bcrypt.gensalt()).decode()
-    test_password = bcrypt.hashpw('test'.encode(), bcrypt.gensalt()).decode()
+    admin_password = await password_hasher.hash('admin123')
+    client_password = await password_hasher.hash('client123')
+    test_password = await password_hasher.hash('test')
     
     users = [
         {'username': 'admin', 'password': admin_password, 'name': 'Administrateur', 'role': 'admin', 'client_id': None, 'active': True},
@@ -174,11 +323,11 @@ def init_db():
         {'username': 'fashionplus', 'password': client_password, 'name': 'User FashionPlus', 'role': 'client', 'client_id': client_ids[2], 'active': True},
         {'username': 'test', 'password': test_password, 'name': 'Utilisateur Test', 'role': 'client', 'client_id': client_ids[3], 'active': True},
     ]
-    db.users.insert_many(users)
+    await db.users.insert_many(users)
     
     # Seed products for each client
     categories = ['Électronique', 'Vêtements', 'Accessoires', 'Maison', 'Sport', 'Beauté', 'Alimentation']
-    location_docs = list(db.locations.find({'active': True}))
+    location_docs = await db.locations.find({'active': True}).to_list(length=None)
     
     for idx, client_id in enumerate(client_ids):
         products = []
@@ -193,9 +342,10 @@ def init_db():
                 'unit_weight': round(0.1 + (i * 0.15), 2),
                 'min_stock_level': 10,
                 'active': True,
+                'is_demo_tenant': False,
                 'created_at': datetime.now(timezone.utc)
             })
-        product_results = db.products.insert_many(products)
+        product_results = await db.products.insert_many(products)
         product_ids = product_results.inserted_ids
         
         # Seed inventory for products
@@ -205,14 +355,17 @@ def init_db():
             inventory_items.append({
                 'product_id': product_id,
                 'location_id': loc['_id'],
+                'client_id': client_id,
                 'quantity': 50 + (j * 5),
                 'lot_number': f'LOT-{datetime.now().strftime("%Y%m")}-{j+1:03d}',
+                'is_demo_tenant': False,
                 'last_updated': datetime.now(timezone.utc)
             })
-        db.inventory.insert_many(inventory_items)
+        await db.inventory.insert_many(inventory_items)
+        await refresh_product_stock(db, product_ids)
     
     # Seed orders for test client (client_ids[3])
-    test_products = list(db.products.find({'client_id': client_ids[3]}))
+    test_products = await db.products.find({'client_id': client_ids[3]}).to_list(length=None)
     order_statuses = ['pending', 'picking', 'packed', 'shipped']
     
     for i in range(10):
@@ -226,9 +379,10 @@ def init_db():
             'status': order_statuses[i % len(order_statuses)],
             'priority': 'medium' if i % 3 == 0 else 'high' if i % 3 == 1 else 'low',
             'tracking_number': f'6A{100000000 + i}FR' if order_statuses[i % len(order_statuses)] == 'shipped' else None,
+            'is_demo_tenant': False,
             'created_at': datetime.now(timezone.utc)
         }
-        db.orders.insert_one(order)
+        await db.orders.insert_one(order)
     
     # Seed receipts for test client
     receipt_statuses = ['planned', 'in_progress', 'completed']
@@ -241,7 +395,7 @@ def init_db():
             'status': receipt_statuses[i % len(receipt_statuses)],
             'created_at': datetime.now(timezone.utc)
         }
-        db.receipts.insert_one(receipt)
+        await db.receipts.insert_one(receipt)
     
     # Seed invoices for test client
     invoice_statuses = ['draft', 'sent', 'paid', 'overdue']
@@ -260,7 +414,7 @@ def init_db():
             'status': invoice_statuses[i % len(invoice_statuses)],
             'created_at': datetime.now(timezone.utc)
         }
-        db.invoices.insert_one(invoice)
+        await db.invoices.insert_one(invoice)
     
     # Seed integrations
     platforms = [
@@ -272,7 +426,7 @@ def init_db():
     ]
     for client_id in client_ids[:3]:
         for p in platforms[:3]:
-            db.integrations.insert_one({
+            await db.integrations.insert_one({
                 'client_id': client_id,
                 'platform': p['platform'],
                 'platform_type': p['type'],
@@ -286,11 +440,35 @@ def init_db():
 # Initialize on startup
 @app.on_event("startup")
 async def startup_event():
-    init_db()
+    # Reconciled on every start, not only on a fresh database
+    await ensure_indexes(db)
+    await init_db()
+    # Deployments created before product_stock existed: build it once
+    if await db.product_stock.estimated_document_count() == 0 and await db.products.estimated_document_count() > 0:
+        await rebuild_product_stock(db)
+    await backfill_demo_flags(db, tenant_registry)
+    await backfill_inventory_tenants(db)
+    await stock_ledger.open_ledger(db)
+    await sequences.init_sequences(db)
+    if SYNC_SCHEDULER_ENABLED:
+        sync_scheduler.start()
+    if STOCK_SNAPSHOT_INTERVAL_SECONDS > 0:
+        snapshot_compactor.start()
+    if CHANGE_FEED_ENABLED:
+        live_changes.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await sync_scheduler.stop()
+    await snapshot_compactor.stop()
+    await live_changes.stop()
+    await http_clients.aclose()
+    client.close()
+    password_hasher.shutdown()
 
 # Health check
 @app.get('/api/health')
-def health_check():
+async def health_check():
     return {'status': 'healthy', 'database': 'mongodb'}
 
 # ==================== AUTH ====================
@@ -306,9 +484,9 @@ class ContactForm(BaseModel):
     message: str
 
 @app.post('/api/auth/login')
-def login(data: LoginRequest):
-    user = db.users.find_one({'username': data.username, 'active': True})
-    if not user or not bcrypt.checkpw(data.password.encode(), user['password'].encode()):
+async def login(data: LoginRequest):
+    user = await db.users.find_one({'username': data.username, 'active': True})
+    if not user or not await password_hasher.verify(data.password, user['password']):
         raise HTTPException(status_code=401, detail='Identifiants incorrects')
     
     client_name = None
@@ -317,7 +495,7 @@ def login(data: LoginRequest):
         try:
             from bson import ObjectId
             client_id_obj = ObjectId(user['client_id']) if isinstance(user['client_id'], str) else user['client_id']
-            client = db.clients.find_one({'_id': client_id_obj})
+            client = await db.clients.find_one({'_id': client_id_obj})
             client_name = client['name'] if client else None
         except:
             client_name = None
@@ -412,159 +590,108 @@ def send_contact_email(data: ContactForm):
         raise HTTPException(status_code=500, detail='Erreur lors de l\'envoi de l\'email')
 
 @app.get('/api/auth/me')
-def get_me(request: Request):
-    user = get_current_user(request)
-    client_name = None
-    if user.get('client_id'):
-        client = db.clients.find_one({'_id': ObjectId(user['client_id'])})
-        client_name = client['name'] if client else None
-    user['client_name'] = client_name
-    return user
+async def get_me(request: Request):
+    # client_name is resolved once per cached user record
+    return await get_current_user(request)
 
 # ==================== DASHBOARD ====================
-@app.get('/api/dashboard/stats')
-def get_dashboard_stats(request: Request, client_id: Optional[str] = None):
-    user = get_current_user(request)
-    
-    # Build client filter
-    if user['role'] == 'client':
-        client_filter = {'client_id': user['client_id']}
-    elif client_id:
-        client_filter = {'client_id': client_id}
-    else:
-        client_filter = {}
-    
-    # Products and stock stats
-    if client_filter:
-        products_count = db.products.count_documents({**client_filter, 'active': True})
-        
-        # Calculate total stock
-        pipeline = [
-            {'$match': client_filter},
-            {'$lookup': {'from': 'inventory', 'localField': '_id', 'foreignField': 'product_id', 'as': 'inv'}},
-            {'$group': {'_id': None, 'total': {'$sum': {'$sum': '$inv.quantity'}}}}
-        ]
-        stock_result = list(db.products.aggregate(pipeline))
-        total_stock = stock_result[0]['total'] if stock_result else 0
-    else:
-        # Admin viewing all: exclude demo clients
-        non_demo_clients = list(db.clients.find(
-            {'$or': [{'is_demo': {'$ne': True}}, {'is_demo': {'$exists': False}}]},
-            {'_id': 1}
-        ))
-        non_demo_client_ids = [str(c['_id']) for c in non_demo_clients]
-        
-        products_count = db.products.count_documents({
-            'active': True,
-            'client_id': {'$in': non_demo_client_ids}
-        })
-        
-        total_stock_result = list(db.inventory.aggregate([
-            {'$lookup': {'from': 'products', 'localField': 'product_id', 'foreignField': '_id', 'as': 'product'}},
-            {'$unwind': '$product'},
-            {'$match': {'product.client_id': {'$in': non_demo_client_ids}}},
-            {'$group': {'_id': None, 'total': {'$sum': '$quantity'}}}
-        ]))
-        total_stock = total_stock_result[0]['total'] if total_stock_result else 0
-    
-    # Orders stats
-    if client_filter:
-        orders_total = db.orders.count_documents(client_filter)
-        orders_pending = db.orders.count_documents({**client_filter, 'status': 'pending'})
-    else:
-        # Admin: exclude demos
-        orders_total = db.orders.count_documents({'client_id': {'$in': non_demo_client_ids}})
-        orders_pending = db.orders.count_documents({'client_id': {'$in': non_demo_client_ids}, 'status': 'pending'})
-    
-    # Receipts stats
-    if client_filter:
-        receipts_pending = db.receipts.count_documents({**client_filter, 'status': {'$in': ['planned', 'in_progress']}})
-    else:
-        # Admin: exclude demos
-        receipts_pending = db.receipts.count_documents({'client_id': {'$in': non_demo_client_ids}, 'status': {'$in': ['planned', 'in_progress']}})
-    
-    # Low stock products
-    if client_filter:
-        low_stock_pipeline = [
-            {'$match': {**client_filter, 'active': True}},
-            {'$lookup': {'from': 'inventory', 'localField': '_id', 'foreignField': 'product_id', 'as': 'inventory'}},
-            {'$addFields': {'current_stock': {'$sum': '$inventory.quantity'}}},
-            {'$match': {'$expr': {'$lt': ['$current_stock', '$min_stock_level']}}},
-            {'$project': {'_id': 0, 'id': {'$toString': '$_id'}, 'sku': 1, 'name': 1, 'current_stock': 1, 'min_stock_level': 1}},
-            {'$limit': 20}
-        ]
-    else:
-        low_stock_pipeline = [
-            {'$match': {'active': True}},
-            {'$lookup': {'from': 'inventory', 'localField': '_id', 'foreignField': 'product_id', 'as': 'inventory'}},
-            {'$addFields': {'current_stock': {'$sum': '$inventory.quantity'}}},
-            {'$match': {'$expr': {'$lt': ['$current_stock', '$min_stock_level']}}},
-            {'$project': {'_id': 0, 'id': {'$toString': '$_id'}, 'sku': 1, 'name': 1, 'current_stock': 1, 'min_stock_level': 1}},
-            {'$limit': 20}
-        ]
-    
-    low_stock_products = list(db.products.aggregate(low_stock_pipeline))
-     # Invoice stats
-    if client_filter:
-        invoices_total = db.invoices.count_documents(client_filter)
-        paid_invoices = db.invoices.count_documents({**client_filter, 'status': 'paid'})
-        
-        # Calculate totals
-        invoice_pipeline = [
-            {'$match': client_filter},
+async def _first(cursor):
+    result = await cursor.to_list(length=1)
+    return result[0] if result else {}
+
+async def compute_dashboard_stats(user, client_id):
+    """One aggregation per collection, all run concurrently"""
+    stock_query = await tenant_query(user, client_id, flagged=True)
+    orders_query = await tenant_query(user, client_id, flagged=True)
+    # receipts and invoices carry no is_demo_tenant flag
+    other_query = await tenant_query(user, client_id)
+    
+    products, orders, receipts, invoices = await asyncio.gather(
+        _first(db.product_stock.aggregate([
+            {'$match': stock_query},
+            {'$facet': {
+                'totals': [{'$group': {
+                    '_id': None,
+                    'product_count': {'$sum': {'$cond': [{'$eq': ['$active', True]}, 1, 0]}},
+                    'total_stock': {'$sum': '$on_hand'}
+                }}],
+                # below_min is maintained on product_stock
+                'low_stock': [
+                    {'$match': {'active': True, 'below_min': True}},
+                    {'$limit': 20},
+                    {'$project': {'_id': 0, 'id': {'$toString': '$_id'}, 'sku': 1, 'name': 1, 'current_stock': '$on_hand', 'min_stock_level': 1}}
+                ]
+            }}
+        ])),
+        _first(db.orders.aggregate([
+            {'$match': orders_query},
+            {'$group': {
+                '_id': None,
+                'total': {'$sum': 1},
+                'pending': {'$sum': {'$cond': [{'$eq': ['$status', 'pending']}, 1, 0]}}
+            }}
+        ])),
+        _first(db.receipts.aggregate([
+            {'$match': {**other_query, 'status': {'$in': ['planned', 'in_progress']}}},
+            {'$count': 'planned'}
+        ])),
+        _first(db.invoices.aggregate([
+            {'$match': other_query},
             {'$group': {
                 '_id': None,
+                'total': {'$sum': 1},
+                'paid': {'$sum': {'$cond': [{'$eq': ['$status', 'paid']}, 1, 0]}},
                 'total_billed': {'$sum': '$total'},
-                'outstanding': {'$sum': {
-                    '$cond': [
-                        {'$ne': ['$status', 'paid']},
-                        '$total',
-                        0
-                    ]
-                }}
+                'outstanding': {'$sum': {'$cond': [{'$ne': ['$status', 'paid']}, '$total', 0]}}
             }}
-        ]
-        invoice_stats = list(db.invoices.aggregate(invoice_pipeline))
-        total_billed = invoice_stats[0]['total_billed'] if invoice_stats else 0
-        outstanding_amount = invoice_stats[0]['outstanding'] if invoice_stats else 0
-    else:
-        # Admin: exclude demos
-        invoices_total = db.invoices.count_documents({'client_id': {'$in': non_demo_client_ids}})
-        paid_invoices = db.invoices.count_documents({'client_id': {'$in': non_demo_client_ids}, 'status': 'paid'})
-        total_billed = 0
-        outstanding_amount = 0
+        ]))
+    )
+    
+    product_totals = products.get('totals') or [{}]
+    receipts_pending = receipts.get('planned', 0)
     
     return {
         'products': {
-            'product_count': products_count,
-            'total_stock': total_stock
+            'product_count': product_totals[0].get('product_count', 0),
+            'total_stock': product_totals[0].get('total_stock', 0)
         },
         'orders': {
-            'total_orders': orders_total,
-            'pending': orders_pending
+            'total_orders': orders.get('total', 0),
+            'pending': orders.get('pending', 0)
         },
         'receipts': {
             'total_receipts': receipts_pending,  # For consistency
             'planned': receipts_pending
         },
         'invoices': {
-            'total_invoices': invoices_total,
-            'outstanding_amount': outstanding_amount,
-            'total_billed': total_billed,
-            'paid': paid_invoices
+            'total_invoices': invoices.get('total', 0),
+            'outstanding_amount': invoices.get('outstanding', 0),
+            'total_billed': invoices.get('total_billed', 0),
+            'paid': invoices.get('paid', 0)
         },
-        'low_stock_products': low_stock_products,
+        'low_stock_products': products.get('low_stock', []),
         'recent_orders': []
     }
 
+@app.get('/api/dashboard/stats')
+async def get_dashboard_stats(request: Request, client_id: Optional[str] = None):
+    user = await get_current_user(request)
+    
+    # Snapshot per tenant (or per admin scope), served stale while refreshing
+    if user['role'] == 'client':
+        scope = ('client', user['client_id'])
+    else:
+        scope = ('admin', client_id or '*')
+    return await dashboard_snapshots.get(scope, lambda: compute_dashboard_stats(user, client_id))
+
 # ==================== CLIENTS ====================
 @app.get('/api/clients')
-def get_clients(request: Request):
-    user = get_current_user(request)
+async def get_clients(request: Request):
+    user = await get_current_user(request)
     if user['role'] != 'admin':
         raise HTTPException(status_code=403, detail='Accès non autorisé')
-    clients = list(db.clients.find({'active': True}))
-    return serialize_doc(clients)
+    clients = await db.clients.find({'active': True}).to_list(length=None)
+    return MongoJSONResponse(clients)
 
 class ClientCreateSimple(BaseModel):
     code: str
@@ -574,15 +701,15 @@ class ClientCreateSimple(BaseModel):
     address: Optional[str] = None
 
 @app.post('/api/clients')
-def create_client(data: ClientCreateSimple, request: Request):
-    user = get_current_user(request)
+async def create_client(data: ClientCreateSimple, request: Request):
+    user = await get_current_user(request)
     if user['role'] != 'admin':
         raise HTTPException(status_code=403, detail='Accès non autorisé')
     
-    if db.clients.find_one({'code': data.code}):
+    if await db.clients.find_one({'code': data.code}):
         raise HTTPException(status_code=400, detail='Code client déjà utilisé')
     
-    result = db.clients.insert_one({
+    result = await db.clients.insert_one({
         'code': data.code,
         'name': data.name,
         'email': data.email,
@@ -591,45 +718,59 @@ def create_client(data: ClientCreateSimple, request: Request):
         'active': True,
         'created_at': datetime.now(timezone.utc)
     })
+    await tenant_registry.bump()
     return {'id': str(result.inserted_id), 'message': 'Client créé'}
 
 # ==================== PRODUCTS ====================
+PRODUCT_SORT_FIELDS = ['created_at', 'sku', 'name']
+PRODUCT_FIELDS = ['id', 'client_id', 'sku', 'name', 'description', 'barcode', 'category', 'unit_weight',
+                  'min_stock_level', 'active', 'created_at', 'client_name', 'total_stock']
+
 @app.get('/api/products')
-def get_products(request: Request, client_id: Optional[str] = None):
-    user = get_current_user(request)
-    
-    query = {'active': True}
-    if user['role'] == 'client':
-        query['client_id'] = user['client_id']
-    elif client_id:
-        query['client_id'] = client_id
-    else:
-        # Admin without client_id: exclude demos
-        non_demo_clients = list(db.clients.find(
-            {'$or': [{'is_demo': {'$ne': True}}, {'is_demo': {'$exists': False}}]},
-            {'_id': 1}
-        ))
-        non_demo_client_ids = [str(c['_id']) for c in non_demo_clients]
-        if non_demo_client_ids:
-            query['client_id'] = {'$in': non_demo_client_ids}
-        else:
-            query['client_id'] = None  # Return empty
-    
-    pipeline = [
-        {'$match': query},
-        {'$lookup': {'from': 'clients', 'localField': 'client_id', 'foreignField': '_id', 'as': 'client'}},
-        {'$lookup': {'from': 'inventory', 'localField': '_id', 'foreignField': 'product_id', 'as': 'inventory'}},
-        {'$addFields': {
-            'client_name': {'$arrayElemAt': ['$client.name', 0]},
-            'total_stock': {'$sum': '$inventory.quantity'}
-        }},
-        {'$project': {'client': 0, 'inventory': 0}},
-        {'$sort': {'created_at': -1}},
-        {'$limit': 200}
-    ]
+async def get_products(
+    request: Request,
+    client_id: Optional[str] = None,
+    category: Optional[str] = None,
+    sku: Optional[str] = None,
+    sort: str = '-created_at',
+    cursor: Optional[str] = None,
+    limit: int = Query(200, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None
+):
+    user = await get_current_user(request)
+    etag = await list_etag(request, user, 'products', client_id)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    
+    # Admin without client_id: all non-demo clients
+    query = {'active': True, **await tenant_query(user, client_id, flagged=True)}
+    if category:
+        query['category'] = category
+    if sku:
+        query['sku'] = sku
+    
+    # Page first, then join only the returned rows (and only the joins asked for)
+    sort_field, direction = parse_sort(sort, PRODUCT_SORT_FIELDS)
+    fields = parse_fields(fields, PRODUCT_FIELDS)
+    pipeline = page_stages(query, sort_field, direction, cursor, limit)
+    if fields:
+        pipeline.append(project_stage(fields, keep=[sort_field, 'client_id']))
+    if wants(fields, 'client_name'):
+        pipeline += [
+            {'$lookup': {'from': 'clients', 'localField': 'client_id', 'foreignField': '_id', 'as': 'client'}},
+            {'$addFields': {'client_name': {'$arrayElemAt': ['$client.name', 0]}}}
+        ]
+    if wants(fields, 'total_stock'):
+        pipeline += [
+            {'$lookup': {'from': 'product_stock', 'localField': '_id', 'foreignField': '_id', 'as': 'stock'}},
+            {'$addFields': {'total_stock': {'$ifNull': [{'$arrayElemAt': ['$stock.on_hand', 0]}, 0]}}}
+        ]
+    pipeline.append({'$project': {'client': 0, 'stock': 0}})
     
-    products = list(db.products.aggregate(pipeline))
-    return serialize_doc(products)
+    products = await db.products.aggregate(pipeline).to_list(length=None)
+    products, next_cursor = split_page(products, sort_field, direction, limit)
+    return page_response(trim_fields(products, fields), next_cursor, etag)
 
 class ProductCreate(BaseModel):
     client_id: str
@@ -642,13 +783,13 @@ class ProductCreate(BaseModel):
     min_stock_level: Optional[int] = 0
 
 @app.post('/api/products')
-def create_product(data: ProductCreate, request: Request):
-    user = get_current_user(request)
+async def create_product(data: ProductCreate, request: Request):
+    user = await get_current_user(request)
     
-    if db.products.find_one({'client_id': ObjectId(data.client_id), 'sku': data.sku}):
+    if await db.products.find_one({'client_id': ObjectId(data.client_id), 'sku': data.sku}):
         raise HTTPException(status_code=400, detail='SKU déjà utilisé pour ce client')
     
-    result = db.products.insert_one({
+    result = await db.products.insert_one({
         'client_id': ObjectId(data.client_id),
         'sku': data.sku,
         'name': data.name,
@@ -658,101 +799,240 @@ def create_product(data: ProductCreate, request: Request):
         'unit_weight': data.unit_weight,
         'min_stock_level': data.min_stock_level or 0,
         'active': True,
+        'is_demo_tenant': await tenant_registry.is_demo(data.client_id),
         'created_at': datetime.now(timezone.utc)
     })
+    await refresh_product_stock(db, [result.inserted_id])
+    await versions.bump(db, ['products'], [data.client_id])
     return {'id': str(result.inserted_id), 'message': 'Produit créé'}
 
 # ==================== INVENTORY ====================
+INVENTORY_SORT_FIELDS = ['_id']
+INVENTORY_FIELDS = ['id', 'product_id', 'location_id', 'quantity', 'last_updated', 'client_id',
+                    'product_name', 'product_sku', 'location_code', 'client_name']
+
 @app.get('/api/inventory')
-def get_inventory(request: Request, client_id: Optional[str] = None):
-    user = get_current_user(request)
-    
-    # Build base pipeline
-    pipeline = [
-        {'$lookup': {'from': 'products', 'localField': 'product_id', 'foreignField': '_id', 'as': 'product'}},
-        {'$unwind': '$product'},
-    ]
-    
-    # Add client filter based on user role
-    if user['role'] == 'client':
-        pipeline.append({'$match': {'product.client_id': user['client_id']}})
-    elif client_id:
-        pipeline.append({'$match': {'product.client_id': client_id}})
-    else:
-        # Admin without client_id: exclude demos via lookup
-        # Convert client_id string to ObjectId for lookup
-         pipeline.extend([
+async def get_inventory(
+    request: Request,
+    client_id: Optional[str] = None,
+    product_id: Optional[str] = None,
+    location_id: Optional[str] = None,
+    sku: Optional[str] = None,
+    zone_id: Optional[str] = None,
+    location_code: Optional[str] = None,
+    sort: str = '_id',
+    cursor: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None
+):
+    user = await get_current_user(request)
+    etag = await list_etag(request, user, 'inventory', client_id)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    
+    # Inventory rows carry client_id / is_demo_tenant: the tenant filter and
+    # the page cut run on (client_id, _id) before any $lookup
+    query = await tenant_query(user, client_id, flagged=True)
+    product_filter = []
+    if product_id:
+        if not ObjectId.is_valid(product_id):
+            return page_response([], None, etag)
+        product_filter.append(ObjectId(product_id))
+    if sku:
+        # (client_id, sku) index on products; a handful of ids at most
+        product_filter.append({'$in': await db.products.distinct('_id', {**query, 'sku': sku})})
+    location_filter = []
+    if location_id:
+        if not ObjectId.is_valid(location_id):
+            return page_response([], None, etag)
+        location_filter.append(ObjectId(location_id))
+    if zone_id:
+        if not ObjectId.is_valid(zone_id):
+            return page_response([], None, etag)
+        location_filter.append({'$in': await db.locations.distinct('_id', {'zone_id': ObjectId(zone_id)})})
+    if location_code:
+        # Prefix match ('Z1-A' = zone 1 aisle A): anchored, so it stays on the code index
+        location_filter.append({'$in': await db.locations.distinct('_id', {'code': {'$regex': f'^{re.escape(location_code)}'}})})
+    for field, conditions in (('product_id', product_filter), ('location_id', location_filter)):
+        if len(conditions) == 1:
+            query[field] = conditions[0]
+        elif conditions:
+            query['$and'] = query.get('$and', []) + [{field: c} for c in conditions]
+    
+    sort_field, direction = parse_sort(sort, INVENTORY_SORT_FIELDS)
+    fields = parse_fields(fields, INVENTORY_FIELDS)
+    pipeline = page_stages(query, sort_field, direction, cursor, limit)
+    if fields:
+        pipeline.append(project_stage(fields, keep=[sort_field, 'product_id', 'location_id', 'client_id']))
+    # The joins run after the page cut: an unmatched row must stay in the
+    # page, or split_page sees a short page and drops the next cursor
+    if wants(fields, 'product_name', 'product_sku'):
+        pipeline += [
+            {'$lookup': {'from': 'products', 'localField': 'product_id', 'foreignField': '_id', 'as': 'product'}},
+            {'$unwind': {'path': '$product', 'preserveNullAndEmptyArrays': True}},
             {'$addFields': {
-                'product_client_id_obj': {'$toObjectId': '$product.client_id'}
-            }},
-            {'$lookup': {
-                'from': 'clients',
-                'localField': 'product_client_id_obj',
-                'foreignField': '_id',
-                'as': 'client_info'
-            }},
-            {'$match': {
-                '$or': [
-                    {'client_info.is_demo': {'$ne': True}},
-                    {'client_info.is_demo': {'$exists': False}}
-                ]
+                'product_name': '$product.name',
+                'product_sku': '$product.sku'
             }}
-        ])
-    
-    # Continue pipeline
-    pipeline.extend([
-        {'$lookup': {'from': 'locations', 'localField': 'location_id', 'foreignField': '_id', 'as': 'location'}},
-        {'$unwind': '$location'},
-        {'$lookup': {'from': 'clients', 'localField': 'product.client_id', 'foreignField': '_id', 'as': 'client'}},
-        {'$addFields': {
-            'product_name': '$product.name',
-            'product_sku': '$product.sku',
-            'location_code': '$location.code',
-            'client_name': {'$arrayElemAt': ['$client.name', 0]},
-            'client_id': '$product.client_id'
-        }},
-        {'$project': {'product': 0, 'location': 0, 'client': 0, 'client_info': 0}},
-        {'$limit': 500}
-    ])
-    
-    inventory = list(db.inventory.aggregate(pipeline))
-    return serialize_doc(inventory)
+        ]
+    if wants(fields, 'location_code'):
+        pipeline += [
+            {'$lookup': {'from': 'locations', 'localField': 'location_id', 'foreignField': '_id', 'as': 'location'}},
+            {'$unwind': {'path': '$location', 'preserveNullAndEmptyArrays': True}},
+            {'$addFields': {'location_code': '$location.code'}}
+        ]
+    if wants(fields, 'client_name'):
+        pipeline += [
+            {'$lookup': {'from': 'clients', 'localField': 'client_id', 'foreignField': '_id', 'as': 'client'}},
+            {'$addFields': {'client_name': {'$arrayElemAt': ['$client.name', 0]}}}
+        ]
+    pipeline.append({'$project': {'product': 0, 'location': 0, 'client': 0}})
+    
+    inventory = await db.inventory.aggregate(pipeline).to_list(length=None)
+    inventory, next_cursor = split_page(inventory, sort_field, direction, limit)
+    return page_response(trim_fields(inventory, fields), next_cursor, etag)
+
+# ==================== STOCK MOVEMENTS ====================
+MOVEMENT_SORT_FIELDS = ['created_at']
+
+snapshot_compactor = stock_ledger.SnapshotCompactor(db, STOCK_SNAPSHOT_INTERVAL_SECONDS)
+
+class StockMovementCreate(BaseModel):
+    type: str  # receipt, pick, adjustment, transfer
+    product_id: str
+    location_id: str
+    quantity: int  # signed for adjustments, positive otherwise
+    to_location_id: Optional[str] = None
+    lot_number: Optional[str] = None
+    reference: Optional[str] = None
+    reason: Optional[str] = None
+
+@app.post('/api/stock-movements')
+async def create_stock_movement(data: StockMovementCreate, request: Request):
+    """Mouvement de stock (réception, prélèvement, ajustement, transfert), appliqué à l'inventaire et journalisé"""
+    user = await get_current_user(request)
+    if user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail='Accès non autorisé')
+    ids = [data.product_id, data.location_id] + ([data.to_location_id] if data.to_location_id else [])
+    if not all(ObjectId.is_valid(i) for i in ids):
+        raise HTTPException(status_code=400, detail='Identifiant invalide')
+    product = await db.products.find_one({'_id': ObjectId(data.product_id)}, {'client_id': 1, 'is_demo_tenant': 1})
+    if not product:
+        raise HTTPException(status_code=404, detail='Produit non trouvé')
+    location_ids = [ObjectId(i) for i in ids[1:]]
+    if await db.locations.count_documents({'_id': {'$in': location_ids}}) != len(set(location_ids)):
+        raise HTTPException(status_code=404, detail='Emplacement non trouvé')
+    
+    try:
+        movements = await stock_ledger.record_movement(
+            db, product, data.type, data.quantity, location_ids[0],
+            to_location_id=location_ids[1] if len(location_ids) > 1 else None,
+            lot_number=data.lot_number, reference=data.reference, reason=data.reason, created_by=user['id']
+        )
+    except stock_ledger.InsufficientStock as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await refresh_product_stock(db, [product['_id']])
+    await versions.bump(db, ['inventory', 'products'], [product['client_id']])
+    return MongoJSONResponse({'movements': movements, 'message': 'Mouvement enregistré'})
+
+@app.get('/api/stock-movements')
+async def get_stock_movements(
+    request: Request,
+    client_id: Optional[str] = None,
+    product_id: Optional[str] = None,
+    location_id: Optional[str] = None,
+    type: Optional[str] = None,
+    sort: str = '-created_at',
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE)
+):
+    user = await get_current_user(request)
+    query = await tenant_query(user, client_id, flagged=True)
+    for field, value in (('product_id', product_id), ('location_id', location_id)):
+        if value:
+            if not ObjectId.is_valid(value):
+                return page_response([], None)
+            query[field] = ObjectId(value)
+    if type:
+        query['type'] = type
+    
+    sort_field, direction = parse_sort(sort, MOVEMENT_SORT_FIELDS)
+    movements = await db.stock_movements.aggregate(page_stages(query, sort_field, direction, cursor, limit)).to_list(length=None)
+    movements, next_cursor = split_page(movements, sort_field, direction, limit)
+    return page_response(movements, next_cursor)
+
+@app.get('/api/stock/as-of')
+async def get_stock_as_of(
+    request: Request,
+    at: str,
+    client_id: Optional[str] = None,
+    product_id: Optional[str] = None,
+    location_id: Optional[str] = None
+):
+    """Stock par produit et emplacement à une date donnée (dernier instantané + mouvements suivants)"""
+    user = await get_current_user(request)
+    try:
+        at_date = datetime.fromisoformat(at)
+    except ValueError:
+        raise HTTPException(status_code=400, detail='Date invalide')
+    query = await tenant_query(user, client_id, flagged=True)
+    for field, value in (('product_id', product_id), ('location_id', location_id)):
+        if value:
+            if not ObjectId.is_valid(value):
+                raise HTTPException(status_code=400, detail='Identifiant invalide')
+            query[field] = ObjectId(value)
+    return MongoJSONResponse(await stock_ledger.stock_as_of(db, query, at_date))
 
 # ==================== ORDERS ====================
+ORDER_SORT_FIELDS = ['created_at', 'order_number']
+ORDER_FIELDS = ['id', 'order_number', 'client_id', 'customer_name', 'customer_email', 'shipping_address', 'order_date',
+                'due_date', 'status', 'priority', 'tracking_number', 'notes', 'external_order_id', 'external_platform',
+                'preparation_date', 'pickup_date', 'created_at', 'client_name']
+
 @app.get('/api/orders')
-def get_orders(request: Request, client_id: Optional[str] = None, status: Optional[str] = None):
-    user = get_current_user(request)
+async def get_orders(
+    request: Request,
+    client_id: Optional[str] = None,
+    status: Optional[str] = None,
+    priority: Optional[str] = None,
+    platform: Optional[str] = None,
+    sort: str = '-created_at',
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None
+):
+    user = await get_current_user(request)
+    etag = await list_etag(request, user, 'orders', client_id)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
     
-    query = {}
-    if user['role'] == 'client':
-        query['client_id'] = user['client_id']
-    elif client_id:
-        query['client_id'] = client_id
-    else:
-        # Admin without client_id: exclude demos
-        non_demo_clients = list(db.clients.find(
-            {'$or': [{'is_demo': {'$ne': True}}, {'is_demo': {'$exists': False}}]},
-            {'_id': 1}
-        ))
-        non_demo_client_ids = [str(c['_id']) for c in non_demo_clients]
-        if non_demo_client_ids:
-            query['client_id'] = {'$in': non_demo_client_ids}
-        else:
-            query['client_id'] = None
+    query = await tenant_query(user, client_id, flagged=True)
     if status:
         query['status'] = status
+    if priority:
+        query['priority'] = priority
+    if platform:
+        query['external_platform'] = platform
+    
+    sort_field, direction = parse_sort(sort, ORDER_SORT_FIELDS)
+    fields = parse_fields(fields, ORDER_FIELDS)
+    pipeline = page_stages(query, sort_field, direction, cursor, limit)
+    if fields:
+        pipeline.append(project_stage(fields, keep=[sort_field, 'client_id']))
+    if wants(fields, 'client_name'):
+        pipeline += [
+            {'$lookup': {'from': 'clients', 'localField': 'client_id', 'foreignField': '_id', 'as': 'client'}},
+            {'$addFields': {'client_name': {'$arrayElemAt': ['$client.name', 0]}}},
+            {'$project': {'client': 0}}
+        ]
     
-    pipeline = [
-        {'$match': query},
-        {'$lookup': {'from': 'clients', 'localField': 'client_id', 'foreignField': '_id', 'as': 'client'}},
-        {'$addFields': {'client_name': {'$arrayElemAt': ['$client.name', 0]}}},
-        {'$project': {'client': 0}},
-        {'$sort': {'created_at': -1}},
-        {'$limit': 100}
-    ]
-    
-    orders = list(db.orders.aggregate(pipeline))
-    return serialize_doc(orders)
+    orders = await db.orders.aggregate(pipeline).to_list(length=None)
+    orders, next_cursor = split_page(orders, sort_field, direction, limit)
+    return page_response(trim_fields(orders, fields), next_cursor, etag)
 
 class OrderCreate(BaseModel):
     client_id: str
@@ -762,13 +1042,12 @@ class OrderCreate(BaseModel):
     priority: Optional[str] = 'medium'
 
 @app.post('/api/orders')
-def create_order(data: OrderCreate, request: Request):
-    user = get_current_user(request)
+async def create_order(data: OrderCreate, request: Request):
+    user = await get_current_user(request)
     
-    count = db.orders.count_documents({})
-    order_number = f'CMD-{str(count + 1).zfill(6)}'
+    order_number = sequences.order_number(await sequences.next_number(db, 'orders'))
     
-    result = db.orders.insert_one({
+    result = await db.orders.insert_one({
         'order_number': order_number,
         'client_id': ObjectId(data.client_id),
         'customer_name': data.customer_name,
@@ -777,46 +1056,41 @@ def create_order(data: OrderCreate, request: Request):
         'order_date': datetime.now(timezone.utc),
         'status': 'pending',
         'priority': data.priority or 'medium',
+        'is_demo_tenant': await tenant_registry.is_demo(data.client_id),
         'created_by': ObjectId(user['id']),
         'created_at': datetime.now(timezone.utc)
     })
+    await versions.bump(db, ['orders'], [data.client_id])
     return {'id': str(result.inserted_id), 'order_number': order_number}
 
 # ==================== RECEIPTS ====================
+RECEIPT_SORT_FIELDS = ['created_at', 'receipt_number']
+
 @app.get('/api/receipts')
-def get_receipts(request: Request, client_id: Optional[str] = None, status: Optional[str] = None):
-    user = get_current_user(request)
+async def get_receipts(
+    request: Request,
+    client_id: Optional[str] = None,
+    status: Optional[str] = None,
+    sort: str = '-created_at',
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE)
+):
+    user = await get_current_user(request)
     
-    query = {}
-    if user['role'] == 'client':
-        query['client_id'] = user['client_id']
-    elif client_id:
-        query['client_id'] = client_id
-    else:
-        # Admin without client_id: exclude demos
-        non_demo_clients = list(db.clients.find(
-            {'$or': [{'is_demo': {'$ne': True}}, {'is_demo': {'$exists': False}}]},
-            {'_id': 1}
-        ))
-        non_demo_client_ids = [str(c['_id']) for c in non_demo_clients]
-        if non_demo_client_ids:
-            query['client_id'] = {'$in': non_demo_client_ids}
-        else:
-            query['client_id'] = None
+    query = await tenant_query(user, client_id)
     if status:
         query['status'] = status
     
-    pipeline = [
-        {'$match': query},
+    sort_field, direction = parse_sort(sort, RECEIPT_SORT_FIELDS)
+    pipeline = page_stages(query, sort_field, direction, cursor, limit) + [
         {'$lookup': {'from': 'clients', 'localField': 'client_id', 'foreignField': '_id', 'as': 'client'}},
         {'$addFields': {'client_name': {'$arrayElemAt': ['$client.name', 0]}}},
-        {'$project': {'client': 0}},
-        {'$sort': {'created_at': -1}},
-        {'$limit': 100}
+        {'$project': {'client': 0}}
     ]
     
-    receipts = list(db.receipts.aggregate(pipeline))
-    return serialize_doc(receipts)
+    receipts = await db.receipts.aggregate(pipeline).to_list(length=None)
+    receipts, next_cursor = split_page(receipts, sort_field, direction, limit)
+    return page_response(receipts, next_cursor)
 
 class ReceiptCreate(BaseModel):
     client_id: str
@@ -825,13 +1099,12 @@ class ReceiptCreate(BaseModel):
     notes: Optional[str] = None
 
 @app.post('/api/receipts')
-def create_receipt(data: ReceiptCreate, request: Request):
-    user = get_current_user(request)
+async def create_receipt(data: ReceiptCreate, request: Request):
+    user = await get_current_user(request)
     
-    count = db.receipts.count_documents({})
-    receipt_number = f'REC-{str(count + 1).zfill(6)}'
+    receipt_number = sequences.receipt_number(await sequences.next_number(db, 'receipts'))
     
-    result = db.receipts.insert_one({
+    result = await db.receipts.insert_one({
         'receipt_number': receipt_number,
         'client_id': ObjectId(data.client_id),
         'supplier_name': data.supplier_name,
@@ -845,8 +1118,8 @@ def create_receipt(data: ReceiptCreate, request: Request):
 
 # ==================== INVENTORY COUNTS ====================
 @app.get('/api/inventory-counts')
-def get_inventory_counts(request: Request, client_id: Optional[str] = None):
-    user = get_current_user(request)
+async def get_inventory_counts(request: Request, client_id: Optional[str] = None):
+    user = await get_current_user(request)
     
     query = {}
     if user['role'] == 'client':
@@ -854,42 +1127,37 @@ def get_inventory_counts(request: Request, client_id: Optional[str] = None):
     elif client_id:
         query['client_id'] = client_id
     
-    counts = list(db.inventory_counts.find(query).sort('created_at', -1).limit(50))
-    return serialize_doc(counts)
+    counts = await db.inventory_counts.find(query).sort('created_at', -1).limit(50).to_list(length=None)
+    return MongoJSONResponse(counts)
 
 # ==================== BILLING / INVOICES ====================
+INVOICE_SORT_FIELDS = ['created_at', 'invoice_number', 'due_date']
+
 @app.get('/api/billing/invoices')
-def get_invoices(request: Request, client_id: Optional[str] = None):
-    user = get_current_user(request)
+async def get_invoices(
+    request: Request,
+    client_id: Optional[str] = None,
+    status: Optional[str] = None,
+    sort: str = '-created_at',
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE)
+):
+    user = await get_current_user(request)
     
-    query = {}
-    if user['role'] == 'client':
-        query['client_id'] = user['client_id']
-    elif client_id:
-        query['client_id'] = client_id
-    else:
-        # Admin without client_id: exclude demos
-        non_demo_clients = list(db.clients.find(
-            {'$or': [{'is_demo': {'$ne': True}}, {'is_demo': {'$exists': False}}]},
-            {'_id': 1}
-        ))
-        non_demo_client_ids = [str(c['_id']) for c in non_demo_clients]
-        if non_demo_client_ids:
-            query['client_id'] = {'$in': non_demo_client_ids}
-        else:
-            query['client_id'] = None
+    query = await tenant_query(user, client_id)
+    if status:
+        query['status'] = status
     
-    pipeline = [
-        {'$match': query},
+    sort_field, direction = parse_sort(sort, INVOICE_SORT_FIELDS)
+    pipeline = page_stages(query, sort_field, direction, cursor, limit) + [
         {'$lookup': {'from': 'clients', 'localField': 'client_id', 'foreignField': '_id', 'as': 'client'}},
         {'$addFields': {'client_name': {'$arrayElemAt': ['$client.name', 0]}}},
-        {'$project': {'client': 0}},
-        {'$sort': {'created_at': -1}},
-        {'$limit': 50}
+        {'$project': {'client': 0}}
     ]
     
-    invoices = list(db.invoices.aggregate(pipeline))
-    return serialize_doc(invoices)
+    invoices = await db.invoices.aggregate(pipeline).to_list(length=None)
+    invoices, next_cursor = split_page(invoices, sort_field, direction, limit)
+    return page_response(invoices, next_cursor)
 
 class InvoiceGenerate(BaseModel):
     client_id: str
@@ -897,75 +1165,71 @@ class InvoiceGenerate(BaseModel):
     end_date: str
 
 @app.post('/api/billing/invoices/generate')
-def generate_invoice(data: InvoiceGenerate, request: Request):
-    user = get_current_user(request)
+async def generate_invoice(data: InvoiceGenerate, request: Request):
+    user = await get_current_user(request)
     if user['role'] != 'admin':
         raise HTTPException(status_code=403, detail='Accès non autorisé')
     
-    client = db.clients.find_one({'_id': ObjectId(data.client_id)})
+    client = await db.clients.find_one({'_id': ObjectId(data.client_id)})
     if not client:
         raise HTTPException(status_code=404, detail='Client non trouvé')
     
     start = datetime.fromisoformat(data.start_date)
     end = datetime.fromisoformat(data.end_date)
-    
-    # Count activity
-    orders_count = db.orders.count_documents({
-        'client_id': ObjectId(data.client_id),
-        'created_at': {'$gte': start, '$lte': end}
-    })
-    receipts_count = db.receipts.count_documents({
-        'client_id': ObjectId(data.client_id),
-        'created_at': {'$gte': start, '$lte': end}
-    })
-    
-    # Calculate
-    order_price = 2.50
-    receipt_price = 5.00
-    storage_fee = 150.00
-    
-    subtotal = (orders_count * order_price) + (receipts_count * receipt_price) + storage_fee
-    tax_amount = subtotal * 0.2
-    total = subtotal + tax_amount
-    
-    count = db.invoices.count_documents({})
-    invoice_number = f'FACT-{datetime.now().strftime("%Y%m")}-{str(count + 1).zfill(4)}'
-    
-    result = db.invoices.insert_one({
-        'invoice_number': invoice_number,
-        'client_id': ObjectId(data.client_id),
-        'billing_period_start': start,
-        'billing_period_end': end,
-        'issue_date': datetime.now(timezone.utc),
-        'due_date': datetime.now(timezone.utc) + timedelta(days=30),
-        'subtotal': subtotal,
-        'tax_rate': 20,
-        'tax_amount': tax_amount,
-        'total': total,
-        'status': 'draft',
-        'created_by': ObjectId(user['id']),
-        'created_at': datetime.now(timezone.utc)
-    })
-    
-    # Insert invoice lines
-    lines = [
-        {'invoice_id': result.inserted_id, 'description': f'Préparation commandes ({orders_count})', 'quantity': orders_count, 'unit_price': order_price, 'total': orders_count * order_price},
-        {'invoice_id': result.inserted_id, 'description': f'Réceptions ({receipts_count})', 'quantity': receipts_count, 'unit_price': receipt_price, 'total': receipts_count * receipt_price},
-        {'invoice_id': result.inserted_id, 'description': 'Frais de stockage mensuel', 'quantity': 1, 'unit_price': storage_fee, 'total': storage_fee},
-    ]
-    db.invoice_lines.insert_many(lines)
+    counts = await billing.activity_counts(db, [client['_id']], start, end)
+    invoice, lines = billing.build_invoice(
+        client['_id'], await sequences.next_number(db, 'invoices'), start, end,
+        counts.get(str(client['_id']), {}), datetime.now(timezone.utc), user['id']
+    )
+    await db.invoice_lines.insert_many(lines)
+    await db.invoices.insert_one(invoice)
     
     return {
-        'id': str(result.inserted_id),
-        'invoice_number': invoice_number,
-        'total': total,
+        'id': str(invoice['_id']),
+        'invoice_number': invoice['invoice_number'],
+        'total': invoice['total'],
         'message': 'Facture générée'
     }
 
+class BillingRunRequest(BaseModel):
+    month: Optional[str] = None  # 'YYYY-MM'
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+
+@app.post('/api/billing/runs')
+async def create_billing_run(data: BillingRunRequest, request: Request):
+    """Facturation de fin de mois de tous les clients actifs. Relancer la même période reprend ou ne fait rien"""
+    user = await get_current_user(request)
+    if user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail='Accès non autorisé')
+    try:
+        if data.month:
+            start, end = billing.month_bounds(data.month)
+        elif data.start_date and data.end_date:
+            start, end = datetime.fromisoformat(data.start_date), datetime.fromisoformat(data.end_date)
+        else:
+            raise HTTPException(status_code=400, detail='Indiquer month ou start_date et end_date')
+    except ValueError:
+        raise HTTPException(status_code=400, detail='Période invalide')
+    try:
+        return MongoJSONResponse(await billing.run_billing(db, start, end, created_by=user['id']))
+    except billing.BillingRunBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.get('/api/billing/runs/{run_id}')
+async def get_billing_run(run_id: str, request: Request):
+    user = await get_current_user(request)
+    if user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail='Accès non autorisé')
+    run = await billing.billing_run_status(db, run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail='Facturation non trouvée')
+    return MongoJSONResponse(run)
+
 # ==================== INTEGRATIONS ====================
 @app.get('/api/integrations')
-def get_integrations(request: Request, client_id: Optional[str] = None):
-    user = get_current_user(request)
+async def get_integrations(request: Request, client_id: Optional[str] = None):
+    user = await get_current_user(request)
     
     query = {}
     if user['role'] == 'client':
@@ -980,12 +1244,12 @@ def get_integrations(request: Request, client_id: Optional[str] = None):
         {'$project': {'client': 0}}
     ]
     
-    integrations = list(db.integrations.aggregate(pipeline))
-    return serialize_doc(integrations)
+    integrations = await db.integrations.aggregate(pipeline).to_list(length=None)
+    return MongoJSONResponse(integrations)
 
 @app.get('/api/integrations/available')
-def get_available_platforms(request: Request):
-    get_current_user(request)
+async def get_available_platforms(request: Request):
+    await get_current_user(request)
     return {
         'cms': [
             {'id': 'shopify', 'name': 'Shopify'},
@@ -1021,17 +1285,17 @@ def get_available_platforms(request: Request):
     }
 
 @app.delete('/api/integrations/{integration_id}')
-def delete_integration(integration_id: str, request: Request):
-    user = get_current_user(request)
-    db.integrations.delete_one({'_id': ObjectId(integration_id)})
+async def delete_integration(integration_id: str, request: Request):
+    user = await get_current_user(request)
+    await db.integrations.delete_one({'_id': ObjectId(integration_id)})
     return {'message': 'Intégration supprimée'}
 
 # ==================== CARRIERS ====================
 @app.get('/api/carriers')
-def get_carriers(request: Request):
-    get_current_user(request)
-    carriers = list(db.carriers.find({'active': True}))
-    return serialize_doc(carriers)
+async def get_carriers(request: Request):
+    await get_current_user(request)
+    carriers = await db.carriers.find({'active': True}).to_list(length=None)
+    return MongoJSONResponse(carriers)
 
 # ==================== SHOPIFY INTEGRATION ====================
 class ShopifyCredentials(BaseModel):
@@ -1045,9 +1309,9 @@ class ShopifyOrderSync(BaseModel):
     integration_id: str
 
 @app.post('/api/shopify/configure')
-def configure_shopify(data: ShopifyCredentials, request: Request):
-    get_current_user(request)
-    db.integrations.update_one(
+async def configure_shopify(data: ShopifyCredentials, request: Request):
+    await get_current_user(request)
+    await db.integrations.update_one(
         {'_id': ObjectId(data.integration_id)},
         {'$set': {
             'api_key': data.api_key,
@@ -1060,80 +1324,66 @@ def configure_shopify(data: ShopifyCredentials, request: Request):
     return {'success': True, 'message': 'Configuration Shopify enregistrée'}
 
 @app.post('/api/shopify/sync-orders')
-def sync_shopify_orders(data: ShopifyOrderSync, request: Request):
-    user = get_current_user(request)
+async def sync_shopify_orders(data: ShopifyOrderSync, request: Request):
+    user = await get_current_user(request)
     
-    integration = db.integrations.find_one({'_id': ObjectId(data.integration_id)})
+    integration = await db.integrations.find_one({'_id': ObjectId(data.integration_id)})
     if not integration:
         raise HTTPException(status_code=404, detail='Intégration non trouvée')
     
     if not integration.get('access_token') or not integration.get('store_url'):
         raise HTTPException(status_code=400, detail='Configuration Shopify incomplète. Veuillez configurer les identifiants API.')
     
+    # Same lease as the scheduler: never two syncs of one integration at once
+    if not await sync_scheduler.claim(integration['_id']):
+        raise HTTPException(status_code=409, detail='Synchronisation déjà en cours pour cette intégration')
     try:
-        store_url = integration['store_url'].replace('https://', '').replace('http://', '').rstrip('/')
-        api_version = '2024-01'
-        
-        headers = {
-            'X-Shopify-Access-Token': integration['access_token'],
-            'Content-Type': 'application/json'
-        }
-        
-        with httpx.Client(timeout=30.0) as client:
-            response = client.get(
-                f"https://{store_url}/admin/api/{api_version}/orders.json?status=any&limit=50",
-                headers=headers
-            )
-            
-            if response.status_code == 401:
-                raise HTTPException(status_code=401, detail='Authentification Shopify échouée')
-            
-            response.raise_for_status()
-            orders_data = response.json().get('orders', [])
-        
-        imported_count = 0
-        for shop_order in orders_data:
-            existing = db.orders.find_one({
-                'external_order_id': str(shop_order['id']),
-                'external_platform': 'shopify'
-            })
-            
-            if not existing:
-                count = db.orders.count_documents({})
-                order_number = f"SHOP-{str(count + 1).zfill(6)}"
-                
-                shipping = shop_order.get('shipping_address', {})
-                shipping_address = f"{shipping.get('address1', '')}, {shipping.get('city', '')} {shipping.get('zip', '')}, {shipping.get('country', '')}"
-                
-                db.orders.insert_one({
-                    'order_number': order_number,
-                    'client_id': integration['client_id'],
-                    'customer_name': f"{shipping.get('first_name', '')} {shipping.get('last_name', '')}".strip() or 'Client Shopify',
-                    'customer_email': shop_order.get('contact_email', ''),
-                    'shipping_address': shipping_address,
-                    'status': 'pending',
-                    'priority': 'medium',
-                    'external_order_id': str(shop_order['id']),
-                    'external_platform': 'shopify',
-                    'created_by': ObjectId(user['id']),
-                    'created_at': datetime.now(timezone.utc)
-                })
-                imported_count += 1
-        
-        db.integrations.update_one(
-            {'_id': ObjectId(data.integration_id)},
-            {'$set': {'last_sync': datetime.now(timezone.utc)}}
+        stats = await shopify_sync.sync_orders(
+            db, integration, http_clients.get('shopify'),
+            created_by=user['id'],
+            is_demo=await tenant_registry.is_demo(integration['client_id']),
+            on_page=lambda: sync_scheduler.renew(integration['_id'])
         )
-        
-        return {
-            'success': True,
-            'ordersImported': imported_count,
-            'totalOrdersFetched': len(orders_data),
-            'message': f'{imported_count} nouvelles commandes importées de Shopify'
-        }
-        
-    except httpx.HTTPError as e:
+    except shopify_sync.ShopifyAuthError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+    except shopify_sync.ShopifyRateLimited as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={'Retry-After': str(int(e.retry_after))})
+    except (shopify_sync.ShopifyError, httpx.HTTPError) as e:
         raise HTTPException(status_code=500, detail=f'Erreur API Shopify: {str(e)}')
+    finally:
+        await sync_scheduler.release(integration['_id'])
+    
+    return {
+        'success': True,
+        'ordersImported': stats['imported'],
+        'ordersUpdated': stats['updated'],
+        'totalOrdersFetched': stats['fetched'],
+        'pages': stats['pages'],
+        'message': f"{stats['imported']} nouvelles commandes importées de Shopify"
+    }
+
+async def _shopify_orders_job(integration):
+    return await shopify_sync.sync_orders(
+        db, integration, http_clients.get('shopify'),
+        is_demo=await tenant_registry.is_demo(integration['client_id']),
+        on_page=lambda: sync_scheduler.renew(integration['_id'])
+    )
+
+# Pas encore d'envoi de stock vers les plateformes : seules les commandes sont planifiées
+sync_scheduler = SyncScheduler(
+    db,
+    {('shopify', 'orders'): _shopify_orders_job},
+    interval=SYNC_INTERVAL_SECONDS,
+    max_concurrency=SYNC_MAX_CONCURRENCY,
+    per_store=SYNC_PER_STORE
+)
+
+@app.post('/api/integrations/{integration_id}/sync-now')
+async def schedule_integration_sync(integration_id: str, request: Request):
+    """Planifier la synchronisation d'une intégration au prochain passage du planificateur"""
+    await get_current_user(request)
+    await sync_scheduler.run_now(ObjectId(integration_id))
+    return {'success': True, 'message': 'Synchronisation planifiée'}
 
 # ==================== CARRIER SHIPMENT ====================
 class ShipmentCreate(BaseModel):
@@ -1148,87 +1398,297 @@ class CarrierCredentials(BaseModel):
     account_number: str
     api_key: str
     api_secret: Optional[str] = None
+    api_base_url: Optional[str] = None  # live carrier API; demo mode without it
 
 @app.post('/api/carriers/configure')
-def configure_carrier(data: CarrierCredentials, request: Request):
-    get_current_user(request)
+async def configure_carrier(data: CarrierCredentials, request: Request):
+    await get_current_user(request)
     
-    carrier = db.carriers.find_one({'code': data.carrier.upper()})
+    carrier = await db.carriers.find_one({'code': data.carrier.upper()})
     if not carrier:
         raise HTTPException(status_code=404, detail='Transporteur non trouvé')
     
-    db.carriers.update_one(
+    await db.carriers.update_one(
         {'code': data.carrier.upper()},
-        {'$set': {'api_key': data.api_key, 'api_secret': data.api_secret}}
+        {'$set': {'api_key': data.api_key, 'api_secret': data.api_secret, 'api_base_url': data.api_base_url}}
     )
     
     return {'success': True, 'message': f'Configuration {data.carrier} enregistrée'}
 
 @app.post('/api/carriers/create-shipment')
-def create_carrier_shipment(data: ShipmentCreate, request: Request):
-    user = get_current_user(request)
+async def create_carrier_shipment(data: ShipmentCreate, request: Request):
+    user = await get_current_user(request)
     
-    order = db.orders.find_one({'_id': ObjectId(data.order_id)})
+    order = await db.orders.find_one({'_id': ObjectId(data.order_id)})
     if not order:
         raise HTTPException(status_code=404, detail='Commande non trouvée')
     
-    carrier = db.carriers.find_one({'code': data.carrier.upper()})
+    carrier = await db.carriers.find_one({'code': data.carrier.upper()})
     if not carrier:
         raise HTTPException(status_code=404, detail='Transporteur non trouvé')
     
-    # Demo mode - generate mock tracking number
-    import random
-    prefix_map = {'COLISSIMO': '6A', 'CHRONOPOST': 'XY'}
-    prefix = prefix_map.get(data.carrier.upper(), 'TK')
-    tracking_number = f"{prefix}{random.randint(100000000, 999999999)}FR"
+    if not shipping.valid_weight(data.weight):
+        raise HTTPException(status_code=400, detail='Poids manquant ou invalide')
+    adapter = shipping.adapter_for(carrier, http_clients.get('carriers'))
+    try:
+        label = await adapter.create_shipment(order, data.weight, data.service_type)
+    except shipping.CarrierError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    tracking_number = label['tracking_number']
     
-    db.orders.update_one(
+    await db.orders.update_one(
         {'_id': ObjectId(data.order_id)},
-        {'$set': {'tracking_number': tracking_number, 'status': 'shipped'}}
+        {'$set': {'tracking_number': tracking_number, 'status': 'shipped', 'carrier_code': carrier['code'], 'shipped_at': datetime.now(timezone.utc)}}
     )
+    await versions.bump(db, ['orders'], [order['client_id']])
     
-    tracking_url = carrier.get('tracking_url_template', '').replace('{tracking}', tracking_number) if carrier.get('tracking_url_template') else None
-    
+    demo = adapter.mode == 'demo'
     return {
         'success': True,
-        'mode': 'demo',
+        'mode': adapter.mode,
         'trackingNumber': tracking_number,
-        'trackingUrl': tracking_url,
-        'message': f'[MODE DEMO] Numéro de suivi généré: {tracking_number}'
+        'trackingUrl': shipping.tracking_url(carrier, tracking_number),
+        'message': f'[MODE DEMO] Numéro de suivi généré: {tracking_number}' if demo else f'Expédition créée: {tracking_number}'
     }
 
+class WaveShipmentCreate(BaseModel):
+    order_ids: List[str]
+    carrier: str
+    service_type: Optional[str] = 'standard'
+    weight: float = 1.0  # kg, for orders missing from `weights`
+    weights: Optional[dict] = None  # {order_id: kg}
+
+@app.post('/api/carriers/shipments/batch')
+async def create_wave_shipments(data: WaveShipmentCreate, request: Request):
+    """Expédier une vague de commandes : appels transporteur en parallèle (bornés), une seule écriture"""
+    user = await get_current_user(request)
+    if len(data.order_ids) > MAX_WAVE_ORDERS:
+        raise HTTPException(status_code=400, detail=f'Maximum {MAX_WAVE_ORDERS} commandes par vague')
+    invalid = [i for i in data.order_ids if not ObjectId.is_valid(i)]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Identifiants invalides : {', '.join(invalid[:10])}")
+    carrier = await db.carriers.find_one({'code': data.carrier.upper()})
+    if not carrier:
+        raise HTTPException(status_code=404, detail='Transporteur non trouvé')
+    
+    order_ids = list(dict.fromkeys(ObjectId(i) for i in data.order_ids))
+    # Clients ship their own orders only; admins any tenant's
+    tenant = {'client_id': client_id_match(user['client_id'])} if user['role'] == 'client' else {}
+    results, client_ids = await shipping.ship_wave(
+        db, carrier, shipping.adapter_for(carrier, http_clients.get('carriers')), order_ids, tenant,
+        weights=data.weights or {}, default_weight=data.weight, service_type=data.service_type,
+        concurrency=CARRIER_CONCURRENCY
+    )
+    if client_ids:
+        await versions.bump(db, ['orders'], list(client_ids))
+    shipped = sum(1 for r in results if r['success'])
+    return {'shipped': shipped, 'failed': len(results) - shipped, 'results': results}
+
+rate_engine = RateEngine(db, ttl=RATE_CARDS_TTL)
+
+def _quote_rows(cards, prices):
+    """Quotes of one parcel, cheapest first, services that do not carry it left out"""
+    rates = [{**card.describe(), 'price': price} for card, price in zip(cards, prices.tolist()) if price == price]
+    return sorted(rates, key=lambda r: r['price'])
+
 @app.get('/api/carriers/rates')
-def get_shipping_rates(request: Request, from_zip: str = '75001', to_zip: str = '69001', weight: float = 1.0, carrier: Optional[str] = None):
-    get_current_user(request)
-    
-    rates = []
-    if not carrier or carrier.upper() == 'COLISSIMO':
-        base_colissimo = 4.95 + (weight * 0.5)
-        rates.extend([
-            {'carrier': 'Colissimo', 'service': 'Standard', 'price': round(base_colissimo, 2), 'currency': 'EUR', 'estimatedDays': '2-3 jours', 'tracking': True},
-            {'carrier': 'Colissimo', 'service': 'Signature', 'price': round(base_colissimo + 1.50, 2), 'currency': 'EUR', 'estimatedDays': '2-3 jours', 'tracking': True}
-        ])
-    
-    if not carrier or carrier.upper() == 'CHRONOPOST':
-        base_chrono = 9.90 + (weight * 1.2)
-        rates.extend([
-            {'carrier': 'Chronopost', 'service': 'Chrono 13', 'price': round(base_chrono, 2), 'currency': 'EUR', 'estimatedDays': '1 jour (avant 13h)', 'tracking': True},
-            {'carrier': 'Chronopost', 'service': 'Chrono 18', 'price': round(base_chrono * 0.85, 2), 'currency': 'EUR', 'estimatedDays': '1 jour (avant 18h)', 'tracking': True}
-        ])
-    
-    return {'fromZip': from_zip, 'toZip': to_zip, 'weight': weight, 'rates': rates}
+async def get_shipping_rates(request: Request, from_zip: str = '75001', to_zip: str = '69001', weight: float = 1.0, carrier: Optional[str] = None):
+    await get_current_user(request)
+    
+    cards = await rate_engine.cards({carrier.upper()} if carrier else None)
+    prices = quote_batch(cards, [to_zip], [weight])[0] if cards else np.empty(0)
+    return {'fromZip': from_zip, 'toZip': to_zip, 'weight': weight, 'rates': _quote_rows(cards, prices)}
+
+class RateBatchRequest(BaseModel):
+    # [{'id': ..., 'to_zip': '69001', 'weight': 1.2}]: plain dicts, a wave is thousands of rows
+    parcels: List[dict]
+    carriers: Optional[List[str]] = None
+    cheapest_only: bool = False
+
+@app.post('/api/carriers/rates/batch')
+async def quote_rates_batch(data: RateBatchRequest, request: Request):
+    """Tarifs de tous les transporteurs pour N colis en un seul calcul"""
+    await get_current_user(request)
+    if len(data.parcels) > MAX_RATE_PARCELS:
+        raise HTTPException(status_code=400, detail=f'Maximum {MAX_RATE_PARCELS} colis par requête')
+    try:
+        zips = [str(p['to_zip']) for p in data.parcels]
+        weights = np.array([float(p['weight']) for p in data.parcels], dtype=float)
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail='Chaque colis doit avoir to_zip et weight')
+    if weights.size and not (np.isfinite(weights).all() and (weights > 0).all()):
+        raise HTTPException(status_code=400, detail='Poids invalide (doit être > 0)')
+    
+    cards = await rate_engine.cards({c.upper() for c in data.carriers} if data.carriers else None)
+    prices = quote_batch(cards, zips, weights) if cards and zips else np.empty((len(zips), 0))
+    ids = [p.get('id', i) for i, p in enumerate(data.parcels)]
+    if data.cheapest_only:
+        # inf where a service does not carry the parcel: argmin skips it
+        masked = np.where(np.isnan(prices), np.inf, prices) if cards else np.full((len(zips), 1), np.inf)
+        best = masked.argmin(axis=1)
+        best_prices = masked[np.arange(len(zips)), best]
+        return MongoJSONResponse({
+            'services': [card.describe() for card in cards],
+            'parcels': [
+                {'id': parcel_id, 'service': service if price != np.inf else None, 'price': price if price != np.inf else None}
+                for parcel_id, service, price in zip(ids, best.tolist(), best_prices.tolist())
+            ],
+        })
+    # Columnar: one price per service, in `services` order (null = not carried)
+    return MongoJSONResponse({
+        'services': [card.describe() for card in cards],
+        'parcels': [{'id': parcel_id, 'prices': row} for parcel_id, row in zip(ids, prices.tolist())],
+    })
+
+class RateCardsUpdate(BaseModel):
+    rate_cards: List[dict]
+
+@app.put('/api/carriers/{code}/rate-cards')
+async def update_rate_cards(code: str, data: RateCardsUpdate, request: Request):
+    """Remplacer les grilles tarifaires d'un transporteur (une par service)"""
+    user = await get_current_user(request)
+    if user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail='Accès non autorisé')
+    carrier = await db.carriers.find_one({'code': code.upper()}, {'name': 1})
+    if not carrier:
+        raise HTTPException(status_code=404, detail='Transporteur non trouvé')
+    try:
+        compile_cards([{'code': code.upper(), 'name': carrier.get('name'), 'rate_cards': data.rate_cards}])
+    except (InvalidRateCard, KeyError, TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f'Grille tarifaire invalide : {e}')
+    await db.carriers.update_one({'_id': carrier['_id']}, {'$set': {'rate_cards': data.rate_cards}})
+    rate_engine.invalidate()
+    return {'success': True, 'message': f'{len(data.rate_cards)} grille(s) enregistrée(s)'}
+
+# ==================== EXPORTS ====================
+@app.get('/api/export/{resource}')
+async def export_resource(
+    resource: str,
+    request: Request,
+    client_id: Optional[str] = None,
+    format: str = Query('csv', pattern='^(csv|ndjson)$'),
+    gzip: bool = False
+):
+    """Export complet en flux (CSV ou NDJSON, gzip optionnel), sans limite de lignes"""
+    user = await get_current_user(request)
+    if resource not in EXPORT_COLUMNS:
+        raise HTTPException(status_code=404, detail='Export inconnu')
+    
+    query = await tenant_query(user, client_id, flagged=resource in ('products', 'orders', 'inventory'))
+    
+    cursor = db[resource].aggregate(export_pipeline(resource, query), batchSize=EXPORT_BATCH_SIZE, allowDiskUse=True)
+    filename = f"{resource}-{datetime.now(timezone.utc):%Y%m%d-%H%M%S}.{format}" + ('.gz' if gzip else '')
+    return StreamingResponse(
+        stream_export(cursor, EXPORT_COLUMNS[resource], format, compress=gzip),
+        media_type='application/gzip' if gzip else MEDIA_TYPES[format],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+# ==================== LIVE CHANGES ====================
+live_changes = change_feed.ChangeFeed(db, tenant_registry.is_demo, queue_size=CHANGE_FEED_QUEUE_SIZE)
+
+def change_scope(user, client_id=None):
+    """Tenant whose changes a connection receives; admins without client_id get all non-demo tenants"""
+    if user['role'] == 'client':
+        return str(user['client_id'])
+    return client_id or change_feed.ALL_TENANTS
+
+def parse_collections(collections):
+    if not collections:
+        return None
+    requested = {c.strip() for c in collections.split(',') if c.strip()}
+    unknown = requested - set(change_feed.WATCHED)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Collections non suivies : {', '.join(sorted(unknown))}")
+    return requested
+
+def subscribe_changes(user, client_id, collections):
+    if not CHANGE_FEED_ENABLED:
+        raise change_feed.FeedUnavailable('Flux temps réel désactivé')
+    return live_changes.subscribe(change_scope(user, client_id), parse_collections(collections))
+
+@app.get('/api/changes/stream')
+async def stream_changes(
+    request: Request,
+    token: Optional[str] = None,
+    client_id: Optional[str] = None,
+    collections: Optional[str] = None
+):
+    """Flux SSE des changements (commandes, inventaire, réceptions) du client; token en paramètre pour EventSource"""
+    user = await user_from_token(token) if token else await get_current_user(request)
+    try:
+        subscription = subscribe_changes(user, client_id, collections)
+    except change_feed.FeedUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    
+    async def events():
+        try:
+            # The client refetches once, then applies the deltas
+            yield b'retry: 5000\nevent: ready\ndata: {}\n\n'
+            while True:
+                event = await subscription.next(CHANGE_FEED_KEEPALIVE_SECONDS)
+                if event is None:
+                    # Comment line: keeps proxies from closing an idle connection
+                    yield b': ping\n\n'
+                    continue
+                head = f"id: {event['seq']}\n" if 'seq' in event else ''
+                yield f"{head}event: {event['type']}\ndata: ".encode() + dumps(event) + b'\n\n'
+                if event['type'] == 'unavailable':
+                    # The feed stopped: end the stream, the client falls back to polling
+                    break
+        finally:
+            live_changes.unsubscribe(subscription)
+    
+    return StreamingResponse(events(), media_type='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        # nginx: flush every event instead of buffering the response
+        'X-Accel-Buffering': 'no',
+    })
+
+@app.websocket('/api/changes/ws')
+async def websocket_changes(
+    websocket: WebSocket,
+    token: str = '',
+    client_id: Optional[str] = None,
+    collections: Optional[str] = None
+):
+    """Même flux que /api/changes/stream sur WebSocket"""
+    try:
+        user = await user_from_token(token)
+        subscription = subscribe_changes(user, client_id, collections)
+    except HTTPException as e:
+        await websocket.close(code=4000 + e.status_code, reason=str(e.detail))
+        return
+    except change_feed.FeedUnavailable as e:
+        await websocket.close(code=1013, reason=str(e))
+        return
+    
+    await websocket.accept()
+    try:
+        await websocket.send_text(dumps({'type': 'ready'}).decode())
+        while True:
+            event = await subscription.next(CHANGE_FEED_KEEPALIVE_SECONDS)
+            # Sending also detects clients gone without a close frame
+            await websocket.send_text(dumps(event or {'type': 'ping'}).decode())
+            if event and event['type'] == 'unavailable':
+                await websocket.close(code=1013, reason='Flux temps réel indisponible')
+                break
+    except WebSocketDisconnect:
+        pass
+    finally:
+        live_changes.unsubscribe(subscription)
 
 # ==================== NOTIFICATIONS ====================
 @app.get('/api/notifications/history')
-def get_notification_history(request: Request, limit: int = 50):
-    user = get_current_user(request)
+async def get_notification_history(request: Request, limit: int = 50):
+    user = await get_current_user(request)
     
-    notifications = list(db.email_notifications.find().sort('created_at', -1).limit(limit))
-    return serialize_doc(notifications)
+    notifications = await db.email_notifications.find().sort('created_at', -1).limit(limit).to_list(length=None)
+    return MongoJSONResponse(notifications)
 
 @app.get('/api/notifications/settings')
-def get_notification_settings(request: Request, client_id: Optional[str] = None):
-    user = get_current_user(request)
+async def get_notification_settings(request: Request, client_id: Optional[str] = None):
+    user = await get_current_user(request)
 
     query = {}
     if user['role'] == 'client':
@@ -1236,71 +1696,68 @@ def get_notification_settings(request: Request, client_id: Optional[str] = None)
     elif client_id:
         query['client_id'] = client_id
 
-    settings = list(db.notification_settings.find(query))
-    return serialize_doc(settings)
+    settings = await db.notification_settings.find(query).to_list(length=None)
+    return MongoJSONResponse(settings)
 
 @app.get('/api/notifications/alert-settings')
-def get_alert_settings(request: Request):
-    user = get_current_user(request)
+async def get_alert_settings(request: Request):
+    user = await get_current_user(request)
 
     query = {}
     if user['role'] == 'client':
         query['client_id'] = user['client_id']
 
-    settings = list(db.notification_settings.find(query))
-    return serialize_doc(settings)
+    settings = await db.notification_settings.find(query).to_list(length=None)
+    return MongoJSONResponse(settings)
 
 @app.post('/api/notifications/check-alerts')
-def check_alerts(request: Request):
-    user = get_current_user(request)
-    alerts_sent = 0
+async def check_alerts(request: Request):
+    user = await get_current_user(request)
 
     query = {}
     if user['role'] == 'client':
-        query['client_id'] = user['client_id']
+        query['client_id'] = client_id_match(user['client_id'])
 
-    products = list(db.products.find(query))
-    for product in products:
-        product_id = str(product['_id'])
-        stock_result = list(db.inventory.aggregate([
-            {'$match': {'product_id': product_id}},
-            {'$group': {'_id': None, 'total': {'$sum': '$quantity'}}}
-        ]))
-        current_stock = stock_result[0]['total'] if stock_result else 0
-        min_level = product.get('min_stock_level', 0)
-
-        if current_stock < min_level:
-            db.email_notifications.insert_one({
-                'type': 'low_stock',
-                'recipient': user.get('username', ''),
-                'subject': f"Stock faible : {product.get('name', '')}",
-                'status': 'pending',
-                'created_at': datetime.utcnow().isoformat()
-            })
-            alerts_sent += 1
-
-    return {'alertsSent': alerts_sent}
+    # Only products that crossed their minimum since the last check alert
+    alerts_sent, recovered = await check_low_stock(db, query, user.get('username', ''))
+    return {'alertsSent': alerts_sent, 'recovered': recovered}
 
 # ==================== LOCATIONS ====================
+LOCATION_SORT_FIELDS = ['code', '_id']
+
 @app.get('/api/locations')
-def get_locations(request: Request):
-    get_current_user(request)
+async def get_locations(
+    request: Request,
+    zone_id: Optional[str] = None,
+    aisle: Optional[str] = None,
+    sort: str = 'code',
+    cursor: Optional[str] = None,
+    limit: int = Query(200, ge=1, le=MAX_PAGE_SIZE)
+):
+    await get_current_user(request)
     
-    pipeline = [
+    query = {}
+    if zone_id:
+        query['zone_id'] = ObjectId(zone_id)
+    if aisle:
+        query['aisle'] = aisle
+    
+    sort_field, direction = parse_sort(sort, LOCATION_SORT_FIELDS)
+    pipeline = page_stages(query, sort_field, direction, cursor, limit) + [
         {'$lookup': {'from': 'warehouse_zones', 'localField': 'zone_id', 'foreignField': '_id', 'as': 'zone'}},
         {'$addFields': {'zone_name': {'$arrayElemAt': ['$zone.name', 0]}}},
-        {'$project': {'zone': 0}},
-        {'$limit': 200}
+        {'$project': {'zone': 0}}
     ]
     
-    locations = list(db.locations.aggregate(pipeline))
-    return serialize_doc(locations)
+    locations = await db.locations.aggregate(pipeline).to_list(length=None)
+    locations, next_cursor = split_page(locations, sort_field, direction, limit)
+    return page_response(locations, next_cursor)
 
 @app.get('/api/warehouse-zones')
-def get_warehouse_zones(request: Request):
-    get_current_user(request)
-    zones = list(db.warehouse_zones.find({'active': True}))
-    return serialize_doc(zones)
+async def get_warehouse_zones(request: Request):
+    await get_current_user(request)
+    zones = await db.warehouse_zones.find({'active': True}).to_list(length=None)
+    return MongoJSONResponse(zones)
 
 # ============================================================================
 # NOUVEAUX ENDPOINTS À AJOUTER AU FICHIER server.py
@@ -1336,8 +1793,7 @@ async def create_client(client_data: ClientCreate, request: Request):
     # (Ajoutez votre logique d'authentification ici)
     
     # Créer le code client automatiquement
-    client_count = db.clients.count_documents({})
-    client_code = f"CLI{str(client_count + 1).zfill(3)}"
+    client_code = sequences.client_code(await sequences.next_number(db, 'clients'))
     
     # Créer le client
     new_client = {
@@ -1361,15 +1817,16 @@ async def create_client(client_data: ClientCreate, request: Request):
         "created_at": datetime.now(timezone.utc)
     }
     
-    result = db.clients.insert_one(new_client)
+    result = await db.clients.insert_one(new_client)
+    await tenant_registry.bump()
     
     # Créer un compte utilisateur pour ce client
     username = client_data.company_name.lower().replace(" ", "")
-    default_password = bcrypt.hashpw("Client2024".encode('utf-8'), bcrypt.gensalt())
+    default_password = await password_hasher.hash("Client2024")
     
     user = {
         "username": username,
-        "password": default_password.decode('utf-8'),
+        "password": default_password,
         "name": f"{client_data.contact_first_name} {client_data.contact_last_name}",
         "email": client_data.contact_email,
         "role": "client",
@@ -1378,7 +1835,7 @@ async def create_client(client_data: ClientCreate, request: Request):
         "created_at": datetime.now(timezone.utc)
     }
     
-    db.users.insert_one(user)
+    await db.users.insert_one(user)
     
     return {
         "success": True,
@@ -1412,7 +1869,7 @@ async def update_client(client_id: str, client_data: ClientCreate, request: Requ
         "updated_at": datetime.now(timezone.utc)
     }
     
-    result = db.clients.update_one(
+    result = await db.clients.update_one(
         {"_id": ObjectId(client_id)},
         {"$set": update_data}
     )
@@ -1420,6 +1877,36 @@ async def update_client(client_id: str, client_data: ClientCreate, request: Requ
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Client non trouvé")
     
+    # Le nom du client est mis en cache avec ses utilisateurs
+    user_cache.invalidate_where(lambda u: u.get('client_id') == client_id)
+    await tenant_registry.bump()
+    # client_name is joined into the lists
+    await versions.bump(db, versions.VERSIONED, [client_id])
+    
+    return {"success": True, "message": "Client mis à jour"}
+
+class ClientDemoFlag(BaseModel):
+    is_demo: bool
+
+@app.put("/api/clients/{client_id}/demo")
+async def set_client_demo(client_id: str, data: ClientDemoFlag, request: Request):
+    """Marquer un client comme démo (exclu des vues admin) ou réel"""
+    
+    user = await get_current_user(request)
+    if user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail='Accès non autorisé')
+    
+    result = await db.clients.update_one(
+        {"_id": ObjectId(client_id)},
+        {"$set": {"is_demo": data.is_demo, "updated_at": datetime.now(timezone.utc)}}
+    )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Client non trouvé")
+    
+    await sync_demo_flags(db, client_id, data.is_demo)
+    await tenant_registry.bump()
+    await versions.bump(db, versions.VERSIONED, [client_id])
+    
     return {"success": True, "message": "Client mis à jour"}
 
 # ============================================================================
@@ -1454,7 +1941,7 @@ async def update_product(product_id: str, product_data: ProductUpdate, request:
     
     update_fields["updated_at"] = datetime.now(timezone.utc)
     
-    result = db.products.update_one(
+    result = await db.products.update_one(
         {"_id": ObjectId(product_id)},
         {"$set": update_fields}
     )
@@ -1462,6 +1949,11 @@ async def update_product(product_id: str, product_data: ProductUpdate, request:
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Produit non trouvé")
     
+    # sku, nom et seuil mini sont repris dans product_stock
+    await refresh_product_stock(db, [ObjectId(product_id)])
+    product = await db.products.find_one({"_id": ObjectId(product_id)}, {"client_id": 1})
+    await versions.bump(db, ['products', 'inventory'], [product['client_id']] if product else [])
+    
     return {"success": True, "message": "Produit mis à jour"}
 
 
@@ -1471,10 +1963,10 @@ async def delete_product(product_id: str, request: Request):
     
     try:
         # Vérifier que l'utilisateur est authentifié
-        current_user = get_current_user(request)
+        current_user = await get_current_user(request)
         
         # Vérifier que le produit existe
-        product = db.products.find_one({"_id": ObjectId(product_id)})
+        product = await db.products.find_one({"_id": ObjectId(product_id)})
         
         if not product:
             raise HTTPException(status_code=404, detail="Produit non trouvé")
@@ -1487,7 +1979,7 @@ async def delete_product(product_id: str, request: Request):
                 raise HTTPException(status_code=403, detail="Non autorisé à supprimer ce produit")
         
         # Vérifier si le produit a du stock
-        inventory_count = db.inventory.count_documents({"product_id": ObjectId(product_id), "quantity": {"$gt": 0}})
+        inventory_count = await db.inventory.count_documents({"product_id": ObjectId(product_id), "quantity": {"$gt": 0}})
         
         if inventory_count > 0:
             raise HTTPException(
@@ -1496,11 +1988,16 @@ async def delete_product(product_id: str, request: Request):
             )
         
         # Supprimer le produit
-        result = db.products.delete_one({"_id": ObjectId(product_id)})
+        result = await db.products.delete_one({"_id": ObjectId(product_id)})
         
         if result.deleted_count == 0:
             raise HTTPException(status_code=500, detail="Erreur lors de la suppression")
         
+        # Ses emplacements vides ne doivent pas rester dans l'inventaire
+        await db.inventory.delete_many({"product_id": ObjectId(product_id)})
+        await refresh_product_stock(db, [ObjectId(product_id)])
+        await versions.bump(db, ['products', 'inventory'], [product.get('client_id')])
+        
         return {
             "success": True,
             "message": "Produit supprimé avec succès"
@@ -1528,8 +2025,7 @@ async def create_receipt(receipt_data: ReceiptCreate, request: Request):
     """Créer une nouvelle réception"""
     
     # Générer le numéro de réception
-    receipt_count = db.receipts.count_documents({})
-    receipt_number = f"REC-{str(receipt_count + 1).zfill(6)}"
+    receipt_number = sequences.receipt_number(await sequences.next_number(db, 'receipts'))
     
     new_receipt = {
         "receipt_number": receipt_number,
@@ -1542,7 +2038,7 @@ async def create_receipt(receipt_data: ReceiptCreate, request: Request):
         "created_at": datetime.now(timezone.utc)
     }
     
-    result = db.receipts.insert_one(new_receipt)
+    result = await db.receipts.insert_one(new_receipt)
     receipt_id = str(result.inserted_id)
     
     # Créer les lignes de réception
@@ -1556,7 +2052,7 @@ async def create_receipt(receipt_data: ReceiptCreate, request: Request):
             "expiry_date": product.get("expiry_date"),
             "location_id": None
         }
-        db.receipt_lines.insert_one(receipt_line)
+        await db.receipt_lines.insert_one(receipt_line)
     
     return {
         "success": True,
@@ -1565,28 +2061,37 @@ async def create_receipt(receipt_data: ReceiptCreate, request: Request):
         "message": "Réception créée avec succès"
     }
 
+LINE_PRODUCT_FIELDS = ['sku', 'name', 'barcode', 'category', 'description', 'unit_weight', 'weight']
+RECEIPT_LINE_FIELDS = ['id', 'product_id', 'expected_quantity', 'received_quantity', 'lot_number', 'expiry_date',
+                       'location_id'] + [f'product.{f}' for f in LINE_PRODUCT_FIELDS]
+ORDER_LINE_FIELDS = ['id', 'product_id', 'quantity_ordered', 'quantity_picked'] + [f'product.{f}' for f in LINE_PRODUCT_FIELDS]
+
+def detail_line_stages(match, fields, quantity_field):
+    """Lines of a details view joined to their product, projected before and inside the join"""
+    lookup = {"from": "products", "localField": "product_id", "foreignField": "_id", "as": "product"}
+    stages = [{"$match": match}]
+    if fields:
+        # Weight and quantity feed the totals even when not returned
+        stages.append(project_stage([f for f in fields if not f.startswith('product.')], keep=['product_id', quantity_field]))
+        product_fields = {f.split('.', 1)[1]: 1 for f in fields if f.startswith('product.')}
+        lookup["pipeline"] = [{"$project": {**product_fields, "weight": 1}}]
+    return stages + [{"$lookup": lookup}, {"$unwind": "$product"}]
+
 @app.get("/api/receipts/{receipt_id}/details")
-async def get_receipt_details(receipt_id: str, request: Request):
-    """Obtenir les détails complets d'une réception"""
+async def get_receipt_details(receipt_id: str, request: Request, fields: Optional[str] = None):
+    """Obtenir les détails complets d'une réception (fields= : champs des lignes, ex. product.sku)"""
+    
+    fields = parse_fields(fields, RECEIPT_LINE_FIELDS)
     
     # Récupérer la réception
-    receipt = db.receipts.find_one({"_id": ObjectId(receipt_id)})
+    receipt = await db.receipts.find_one({"_id": ObjectId(receipt_id)})
     if not receipt:
         raise HTTPException(status_code=404, detail="Réception non trouvée")
     
     # Récupérer les lignes de réception
-    lines = list(db.receipt_lines.aggregate([
-        {"$match": {"receipt_id": receipt_id}},
-        {
-            "$lookup": {
-                "from": "products",
-                "localField": "product_id",
-                "foreignField": "_id",
-                "as": "product"
-            }
-        },
-        {"$unwind": "$product"}
-    ]))
+    lines = await db.receipt_lines.aggregate(
+        detail_line_stages({"receipt_id": receipt_id}, fields, "received_quantity")
+    ).to_list(length=None)
     
     # Calculer le poids total
     total_weight = sum(
@@ -1595,15 +2100,15 @@ async def get_receipt_details(receipt_id: str, request: Request):
     )
     
     # Récupérer le client
-    client = db.clients.find_one({"_id": ObjectId(receipt["client_id"])})
+    client = await db.clients.find_one({"_id": ObjectId(receipt["client_id"])})
     
-    return {
-        "receipt": serialize_doc(receipt),
-        "client": serialize_doc(client),
-        "lines": serialize_doc(lines),
+    return MongoJSONResponse({
+        "receipt": receipt,
+        "client": client,
+        "lines": trim_fields(lines, fields),
         "total_weight": total_weight,
         "total_products": sum(line["received_quantity"] for line in lines)
-    }
+    })
 
 # ============================================================================
 # 4. COMMANDES - Création manuelle et détails complets
@@ -1623,8 +2128,7 @@ async def create_order(order_data: OrderCreate, request: Request):
     """Créer une nouvelle commande manuellement"""
     
     # Générer le numéro de commande
-    order_count = db.orders.count_documents({})
-    order_number = f"CMD-{str(order_count + 1).zfill(6)}"
+    order_number = sequences.order_number(await sequences.next_number(db, 'orders'))
     
     new_order = {
         "order_number": order_number,
@@ -1641,10 +2145,11 @@ async def create_order(order_data: OrderCreate, request: Request):
         "external_platform": "manual",  # Créée manuellement
         "preparation_date": None,
         "pickup_date": None,
+        "is_demo_tenant": await tenant_registry.is_demo(order_data.client_id),
         "created_at": datetime.now(timezone.utc)
     }
     
-    result = db.orders.insert_one(new_order)
+    result = await db.orders.insert_one(new_order)
     order_id = str(result.inserted_id)
     
     # Créer les lignes de commande
@@ -1655,7 +2160,8 @@ async def create_order(order_data: OrderCreate, request: Request):
             "quantity_ordered": product["quantity"],
             "quantity_picked": 0
         }
-        db.order_lines.insert_one(order_line)
+        await db.order_lines.insert_one(order_line)
+    await versions.bump(db, ['orders'], [order_data.client_id])
     
     return {
         "success": True,
@@ -1664,28 +2170,179 @@ async def create_order(order_data: OrderCreate, request: Request):
         "message": "Commande créée avec succès"
     }
 
+MAX_BULK_ORDERS = int(os.environ.get('MAX_BULK_ORDERS', '10000'))
+
+class BulkOrderLine(BaseModel):
+    product_id: Optional[str] = None
+    sku: Optional[str] = None
+    quantity: int
+
+class BulkOrder(BaseModel):
+    customer_name: str
+    customer_email: Optional[str] = None
+    shipping_address: Optional[str] = None
+    priority: str = "medium"
+    notes: Optional[str] = None
+    external_order_id: Optional[str] = None
+    lines: List[BulkOrderLine]
+
+class BulkOrderImport(BaseModel):
+    client_id: str
+    orders: List[dict]  # Validées ligne par ligne pour un rapport par commande
+
+def _bulk_row_error(index, message):
+    return {"index": index, "success": False, "error": message}
+
+@app.post("/api/orders/bulk")
+async def create_orders_bulk(data: BulkOrderImport, request: Request):
+    """Importer des milliers de commandes (avec lignes) en une requête, avec un résultat par commande"""
+    
+    user = await get_current_user(request)
+    if user['role'] == 'client' and user['client_id'] != data.client_id:
+        raise HTTPException(status_code=403, detail='Accès non autorisé')
+    if len(data.orders) > MAX_BULK_ORDERS:
+        raise HTTPException(status_code=400, detail=f'Maximum {MAX_BULK_ORDERS} commandes par import')
+    if not ObjectId.is_valid(data.client_id) or not await db.clients.find_one({'_id': ObjectId(data.client_id)}, {'_id': 1}):
+        raise HTTPException(status_code=404, detail='Client non trouvé')
+    
+    results = [None] * len(data.orders)
+    
+    # 1. Validation de toutes les lignes
+    parsed = {}
+    for index, row in enumerate(data.orders):
+        try:
+            order = BulkOrder.model_validate(row)
+        except ValidationError as e:
+            results[index] = _bulk_row_error(index, e.errors(include_url=False)[0]['msg'])
+            continue
+        if not order.lines:
+            results[index] = _bulk_row_error(index, "Commande sans ligne")
+        elif any(line.quantity <= 0 for line in order.lines):
+            results[index] = _bulk_row_error(index, "Quantité invalide")
+        elif any(not line.product_id and not line.sku for line in order.lines):
+            results[index] = _bulk_row_error(index, "Ligne sans product_id ni sku")
+        else:
+            parsed[index] = order
+    
+    # 2. Résolution des produits (id ou SKU) en une seule requête
+    product_ids = {line.product_id for order in parsed.values() for line in order.lines if line.product_id and ObjectId.is_valid(line.product_id)}
+    skus = {line.sku for order in parsed.values() for line in order.lines if line.sku}
+    by_id, by_sku = {}, {}
+    if product_ids or skus:
+        async for product in db.products.find(
+            {'client_id': client_id_match(data.client_id), '$or': [
+                {'_id': {'$in': [ObjectId(p) for p in product_ids]}},
+                {'sku': {'$in': list(skus)}}
+            ]},
+            {'_id': 1, 'sku': 1}
+        ):
+            by_id[str(product['_id'])] = product['_id']
+            by_sku[product['sku']] = product['_id']
+    
+    # 3. Commandes déjà importées (external_order_id) en une seule requête
+    external_ids = [o.external_order_id for o in parsed.values() if o.external_order_id]
+    already_imported = set()
+    if external_ids:
+        already_imported = set(await db.orders.distinct('external_order_id', {
+            'client_id': client_id_match(data.client_id),
+            'external_platform': 'bulk_import',
+            'external_order_id': {'$in': external_ids}
+        }))
+    
+    resolved = {}
+    seen_external = set()
+    for index, order in parsed.items():
+        if order.external_order_id and (order.external_order_id in already_imported or order.external_order_id in seen_external):
+            results[index] = _bulk_row_error(index, f"Commande {order.external_order_id} déjà importée")
+            continue
+        lines = []
+        for line in order.lines:
+            product_oid = by_id.get(line.product_id) if line.product_id else by_sku.get(line.sku)
+            if product_oid is None:
+                break
+            lines.append((product_oid, line.quantity))
+        else:
+            if order.external_order_id:
+                seen_external.add(order.external_order_id)
+            resolved[index] = (order, lines)
+            continue
+        results[index] = _bulk_row_error(index, f"Produit inconnu : {line.product_id or line.sku}")
+    
+    # 4. Numérotation en un seul appel, écriture en insert_many non ordonné
+    if resolved:
+        first_number = await sequences.reserve(db, 'orders', len(resolved))
+        is_demo = await tenant_registry.is_demo(data.client_id)
+        now = datetime.now(timezone.utc)
+        order_docs, indexes = [], []
+        for offset, (index, (order, _)) in enumerate(resolved.items()):
+            doc = {
+                "_id": ObjectId(),
+                "order_number": sequences.order_number(first_number + offset),
+                "client_id": data.client_id,
+                "customer_name": order.customer_name,
+                "customer_email": order.customer_email,
+                "shipping_address": order.shipping_address,
+                "order_date": now.isoformat(),
+                "due_date": None,
+                "status": "pending",
+                "priority": order.priority,
+                "tracking_number": None,
+                "notes": order.notes,
+                "external_platform": "bulk_import",
+                "preparation_date": None,
+                "pickup_date": None,
+                "is_demo_tenant": is_demo,
+                "created_by": ObjectId(user['id']),
+                "created_at": now
+            }
+            # Only set when given: the unique (platform, external id) index skips orders without one
+            if order.external_order_id:
+                doc["external_order_id"] = order.external_order_id
+            order_docs.append(doc)
+            indexes.append(index)
+        
+        line_docs = [
+            [{
+                "order_id": str(doc["_id"]),
+                "product_id": product_oid,
+                "quantity_ordered": quantity,
+                "quantity_picked": 0
+            } for product_oid, quantity in resolved[index][1]]
+            for index, doc in zip(indexes, order_docs)
+        ]
+        failed_positions = await bulk_orders.insert_orders(db, order_docs, line_docs)
+        
+        for position, (index, doc) in enumerate(zip(indexes, order_docs)):
+            if position in failed_positions:
+                results[index] = _bulk_row_error(index, failed_positions[position])
+            else:
+                results[index] = {"index": index, "success": True, "order_id": str(doc["_id"]), "order_number": doc["order_number"]}
+        if len(failed_positions) < len(order_docs):
+            await versions.bump(db, ['orders'], [data.client_id])
+    
+    created = sum(1 for r in results if r["success"])
+    return {
+        "success": created == len(results),
+        "created": created,
+        "failed": len(results) - created,
+        "results": results
+    }
+
 @app.get("/api/orders/{order_id}/details")
-async def get_order_details(order_id: str, request: Request):
-    """Obtenir les détails complets d'une commande"""
+async def get_order_details(order_id: str, request: Request, fields: Optional[str] = None):
+    """Obtenir les détails complets d'une commande (fields= : champs des lignes, ex. product.sku)"""
+    
+    fields = parse_fields(fields, ORDER_LINE_FIELDS)
     
     # Récupérer la commande
-    order = db.orders.find_one({"_id": ObjectId(order_id)})
+    order = await db.orders.find_one({"_id": ObjectId(order_id)})
     if not order:
         raise HTTPException(status_code=404, detail="Commande non trouvée")
     
     # Récupérer les lignes de commande avec produits
-    lines = list(db.order_lines.aggregate([
-        {"$match": {"order_id": order_id}},
-        {
-            "$lookup": {
-                "from": "products",
-                "localField": "product_id",
-                "foreignField": "_id",
-                "as": "product"
-            }
-        },
-        {"$unwind": "$product"}
-    ]))
+    lines = await db.order_lines.aggregate(
+        detail_line_stages({"order_id": order_id}, fields, "quantity_ordered")
+    ).to_list(length=None)
     
     # Calculer le poids total
     total_weight = sum(
@@ -1697,19 +2354,19 @@ async def get_order_details(order_id: str, request: Request):
     total_products = sum(line["quantity_ordered"] for line in lines)
     
     # Récupérer le client
-    client = db.clients.find_one({"_id": ObjectId(order["client_id"])})
+    client = await db.clients.find_one({"_id": ObjectId(order["client_id"])})
     
-    return {
-        "order": serialize_doc(order),
-        "client": serialize_doc(client),
-        "lines": serialize_doc(lines),
+    return MongoJSONResponse({
+        "order": order,
+        "client": client,
+        "lines": trim_fields(lines, fields),
         "total_weight": total_weight,
         "total_products": total_products,
         "order_date": order.get("order_date"),
         "preparation_date": order.get("preparation_date"),
         "pickup_date": order.get("pickup_date"),
         "platform": order.get("external_platform", "manual")
-    }
+    })
 
 @app.put("/api/orders/{order_id}/update-dates")
 async def update_order_dates(
@@ -1729,16 +2386,98 @@ async def update_order_dates(
     if not update_fields:
         raise HTTPException(status_code=400, detail="Aucune date fournie")
     
-    result = db.orders.update_one(
+    order = await db.orders.find_one_and_update(
         {"_id": ObjectId(order_id)},
-        {"$set": update_fields}
+        {"$set": update_fields},
+        projection={"client_id": 1}
     )
     
-    if result.modified_count == 0:
+    if not order:
         raise HTTPException(status_code=404, detail="Commande non trouvée")
+    await versions.bump(db, ['orders'], [order.get('client_id')])
     
     return {"success": True, "message": "Dates mises à jour"}
 
+# ==================== PICK ROUTES ====================
+class PickRouteRequest(BaseModel):
+    order_ids: List[str]
+
+@app.post("/api/pick-routes")
+async def plan_pick_route(data: PickRouteRequest, request: Request):
+    """Tournée de préparation d'une ou plusieurs commandes : emplacements dans l'ordre de passage"""
+    
+    user = await get_current_user(request)
+    if not data.order_ids or len(data.order_ids) > MAX_ROUTE_ORDERS:
+        raise HTTPException(status_code=400, detail=f"Entre 1 et {MAX_ROUTE_ORDERS} commandes par tournée")
+    invalid = [i for i in data.order_ids if not ObjectId.is_valid(i)]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Identifiants invalides : {', '.join(invalid[:10])}")
+    
+    tenant = {'client_id': client_id_match(user['client_id'])} if user['role'] == 'client' else {}
+    orders = await db.orders.find(
+        {'_id': {'$in': [ObjectId(i) for i in data.order_ids]}, **tenant}, {'order_number': 1}
+    ).to_list(length=None)
+    if len(orders) != len(set(data.order_ids)):
+        raise HTTPException(status_code=404, detail="Commande non trouvée")
+    order_numbers = {str(o['_id']): o.get('order_number') for o in orders}
+    
+    # Quantités restant à prélever, par produit
+    lines = await db.order_lines.find(
+        {'order_id': {'$in': list(order_numbers)}},
+        {'order_id': 1, 'product_id': 1, 'quantity_ordered': 1, 'quantity_picked': 1}
+    ).to_list(length=None)
+    lines = [line for line in lines if line['quantity_ordered'] - (line.get('quantity_picked') or 0) > 0]
+    demand = {}
+    for line in lines:
+        key = str(line['product_id'])
+        demand[key] = demand.get(key, 0) + line['quantity_ordered'] - (line.get('quantity_picked') or 0)
+    
+    product_ids = [ObjectId(p) for p in demand if ObjectId.is_valid(p)]
+    products = await db.products.find({'_id': {'$in': product_ids}}, {'sku': 1, 'name': 1}).to_list(length=None)
+    products = {str(p['_id']): p for p in products}
+    rows = await db.inventory.find(
+        {'product_id': {'$in': product_ids}, 'quantity': {'$gt': 0}},
+        {'product_id': 1, 'location_id': 1, 'quantity': 1}
+    ).to_list(length=None)
+    locations = await db.locations.find(
+        {'_id': {'$in': list({r['location_id'] for r in rows if r.get('location_id')})}}, {'code': 1}
+    ).to_list(length=None)
+    codes = {loc['_id']: loc['code'] for loc in locations}
+    stock = {}
+    for row in rows:
+        if row.get('location_id') in codes:
+            stock.setdefault(str(row['product_id']), {}).setdefault(codes[row['location_id']], 0)
+            stock[str(row['product_id'])][codes[row['location_id']]] += row['quantity']
+    stock = {p: list(by_code.items()) for p, by_code in stock.items()}
+    
+    chosen = pick_route.assign_locations(demand, stock)
+    layout = pick_route.Layout(await db.locations.distinct('code', {'active': True}))
+    route = pick_route.plan_route(layout, chosen.values())
+    
+    picks = {}
+    for line in lines:
+        product_id = str(line['product_id'])
+        code = chosen.get(product_id)
+        product = products.get(product_id, {})
+        picks.setdefault(code, []).append({
+            'order_id': line['order_id'],
+            'order_number': order_numbers[line['order_id']],
+            'product_id': product_id,
+            'sku': product.get('sku'),
+            'product_name': product.get('name'),
+            'quantity': line['quantity_ordered'] - (line.get('quantity_picked') or 0),
+            'available': dict(stock.get(product_id, [])).get(code, 0),
+        })
+    
+    return {
+        'stops': [{'location_code': code, 'lines': picks[code]} for code in route.stops + route.unrouted],
+        'distance': route.distance,
+        'naive_distance': round(pick_route.route_length(layout, pick_route.naive_order(chosen.values())), 2),
+        'unrouted': route.unrouted,
+        # Produits sans stock localisé
+        'missing': picks.get(None, []),
+    }
+
 # ============================================================================
 # ENDPOINT API - CHANGEMENT DE MOT DE PASSE
 # À AJOUTER dans backend/server.py
@@ -1763,8 +2502,6 @@ async def change_password(password_data: dict, request: Request):
     """Changer le mot de passe de l'utilisateur connecté"""
     
     try:
-        import bcrypt
-        
         current_password = password_data.get("current_password")
         new_password = password_data.get("new_password")
         
@@ -1772,16 +2509,16 @@ async def change_password(password_data: dict, request: Request):
             raise HTTPException(status_code=400, detail="Mots de passe requis")
         
         # Utiliser get_current_user qui décode le JWT token
-        current_user = get_current_user(request)
+        current_user = await get_current_user(request)
         
         # Récupérer l'utilisateur complet depuis la base
-        user = db.users.find_one({"_id": ObjectId(current_user["id"])})
+        user = await db.users.find_one({"_id": ObjectId(current_user["id"])})
         
         if not user:
             raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
         
         # Vérifier l'ancien mot de passe
-        if not bcrypt.checkpw(current_password.encode('utf-8'), user["password"].encode('utf-8')):
+        if not await password_hasher.verify(current_password, user["password"]):
             raise HTTPException(status_code=400, detail="Mot de passe actuel incorrect")
         
         # Valider le nouveau mot de passe
@@ -1789,35 +2526,58 @@ async def change_password(password_data: dict, request: Request):
             raise HTTPException(status_code=400, detail="Le nouveau mot de passe doit contenir au moins 8 caractères")
         
         # Hasher le nouveau mot de passe
-        new_hashed_password = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt())
+        new_hashed_password = await password_hasher.hash(new_password)
         
         # Mettre à jour le mot de passe
-        result = db.users.update_one(
+        result = await db.users.update_one(
             {"_id": user["_id"]},
-            {"$set": {"password": new_hashed_password.decode('utf-8')}}
+            {"$set": {"password": new_hashed_password}}
         )
         
         if result.modified_count == 0:
             raise HTTPException(status_code=500, detail="Erreur lors de la mise à jour")
         
+        user_cache.invalidate(current_user["id"])
+        
         return {
             "success": True,
             "message": "Mot de passe changé avec succès"
         }
         
-    except HTTPException:
+    except (HTTPException, PasswordPoolBusy):
         raise
     except Exception as e:
         print(f"Erreur changement mot de passe: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.put("/api/users/{user_id}/deactivate")
+async def deactivate_user(user_id: str, request: Request):
+    """Désactiver un compte utilisateur (Admin uniquement)"""
+    
+    current_user = await get_current_user(request)
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail='Accès non autorisé')
+    
+    result = await db.users.update_one(
+        {"_id": ObjectId(user_id)},
+        {"$set": {"active": False, "updated_at": datetime.now(timezone.utc)}}
+    )
+    
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
+    
+    # Les tokens déjà émis sont refusés dès la prochaine requête
+    user_cache.invalidate(user_id)
+    
+    return {"success": True, "message": "Utilisateur désactivé"}
+
 @app.get("/api/users/profile")
 async def get_user_profile(request: Request):
     """Récupérer le profil de l'utilisateur connecté"""
     
     try:
         # Utiliser get_current_user qui décode le JWT token
-        current_user = get_current_user(request)
+        current_user = await get_current_user(request)
         
         # Ne pas renvoyer le mot de passe
         user_data = {
@@ -1945,7 +2705,7 @@ async def forgot_password(request: ForgotPasswordRequest):
     email = request.email.lower().strip()
     
     # Vérifier si le client existe
-    client_doc = db.clients.find_one({"email": email})
+    client_doc = await db.clients.find_one({"email": email})
     
     if not client_doc:
         # Ne pas révéler si l'email existe ou non (sécurité)
@@ -1961,10 +2721,10 @@ async def forgot_password(request: ForgotPasswordRequest):
     expires_at = datetime.utcnow() + timedelta(hours=1)
     
     # Supprimer les anciens tokens pour cet email
-    reset_tokens.delete_many({"email": email})
+    await reset_tokens.delete_many({"email": email})
     
     # Sauvegarder le nouveau token
-    reset_tokens.insert_one({
+    await reset_tokens.insert_one({
         "email": email,
         "token": reset_token,
         "expires_at": expires_at,
@@ -1973,7 +2733,7 @@ async def forgot_password(request: ForgotPasswordRequest):
     })
     
     # Envoyer l'email
-    email_sent = send_reset_email(email, reset_token)
+    email_sent = await run_in_threadpool(send_reset_email, email, reset_token)
     
     if not email_sent:
         # En cas d'erreur, afficher quand même le lien dans les logs (pour debug)
@@ -2005,7 +2765,7 @@ async def reset_password(request: ResetPasswordRequest):
         )
     
     # Trouver le token
-    token_doc = reset_tokens.find_one({
+    token_doc = await reset_tokens.find_one({
         "token": token,
         "used": False
     })
@@ -2026,16 +2786,16 @@ async def reset_password(request: ResetPasswordRequest):
     email = token_doc['email']
     
     # Hasher le nouveau mot de passe avec bcrypt
-    hashed_password = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    hashed_password = await password_hasher.hash(new_password)
     
     # Mettre à jour le mot de passe dans la table clients
-    db.clients.update_one(
+    await db.clients.update_one(
         {"email": email},
         {"$set": {"password": hashed_password}}
     )
     
     # Mettre à jour le mot de passe dans la table users (avec hash bcrypt)
-    result = db.users.update_one(
+    result = await db.users.update_one(
         {"email": email},
         {"$set": {"password": hashed_password}}
     )
@@ -2046,8 +2806,11 @@ async def reset_password(request: ResetPasswordRequest):
             detail="Utilisateur introuvable"
         )
     
+    async for reset_user in db.users.find({"email": email}, {"_id": 1}):
+        user_cache.invalidate(str(reset_user["_id"]))
+    
     # Marquer le token comme utilisé
-    reset_tokens.update_one(
+    await reset_tokens.update_one(
         {"token": token},
         {"$set": {"used": True, "used_at": datetime.utcnow()}}
     )
@@ -2062,7 +2825,7 @@ async def reset_password(request: ResetPasswordRequest):
 async def verify_reset_token(token: str):
     """Vérifie si un token est valide (sans le consommer)"""
     
-    token_doc = reset_tokens.find_one({
+    token_doc = await reset_tokens.find_one({
         "token": token,
         "used": False
     })
@@ -2076,6 +2839,90 @@ async def verify_reset_token(token: str):
     return {"valid": True, "email": token_doc['email']}
 
 
+# ==================== ADMIN / METRICS ====================
+@app.get('/api/admin/cache-stats')
+async def get_cache_stats(request: Request):
+    user = await get_current_user(request)
+    if user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail='Accès non autorisé')
+    return {
+        'user_cache': user_cache.stats(),
+        'tenant_registry': tenant_registry.stats(),
+        'dashboard_snapshots': dashboard_snapshots.stats()
+    }
+
+@app.get('/api/admin/password-pool-stats')
+async def get_password_pool_stats(request: Request):
+    user = await get_current_user(request)
+    if user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail='Accès non autorisé')
+    return {'password_pool': password_hasher.stats()}
+
+@app.post('/api/admin/product-stock/rebuild')
+async def rebuild_product_stock_endpoint(request: Request):
+    """Recalculer product_stock depuis l'inventaire (réparation des écarts)"""
+    user = await get_current_user(request)
+    if user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail='Accès non autorisé')
+    count = await rebuild_product_stock(db)
+    return {'success': True, 'products': count}
+
+
+@app.get('/api/admin/sync-scheduler')
+async def get_sync_scheduler_stats(request: Request):
+    user = await get_current_user(request)
+    if user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail='Accès non autorisé')
+    return {'enabled': SYNC_SCHEDULER_ENABLED, **sync_scheduler.stats()}
+
+@app.get('/api/admin/http-pool-stats')
+async def get_http_pool_stats(request: Request):
+    user = await get_current_user(request)
+    if user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail='Accès non autorisé')
+    return {'http_pool': http_clients.stats()}
+
+@app.get('/api/admin/indexes')
+async def get_index_report(request: Request):
+    """Index déclarés absents de la base et index présents non déclarés"""
+    user = await get_current_user(request)
+    if user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail='Accès non autorisé')
+    return await index_report(db)
+
+@app.post('/api/admin/indexes/reconcile')
+async def reconcile_indexes(request: Request):
+    user = await get_current_user(request)
+    if user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail='Accès non autorisé')
+    errors = await ensure_indexes(db)
+    return {'success': not errors, 'errors': errors, **await index_report(db)}
+
+@app.get('/api/admin/compression-stats')
+async def get_compression_stats(request: Request):
+    user = await get_current_user(request)
+    if user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail='Accès non autorisé')
+    return {'compression': compression_stats.as_dict()}
+
+@app.post('/api/admin/stock-snapshots/compact')
+async def compact_stock_snapshots(request: Request):
+    """Compacter maintenant les mouvements de stock en instantanés"""
+    user = await get_current_user(request)
+    if user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail='Accès non autorisé')
+    try:
+        return MongoJSONResponse(await stock_ledger.compact_snapshots(db))
+    except stock_ledger.CompactionRunning as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.get('/api/admin/change-feed')
+async def get_change_feed_stats(request: Request):
+    user = await get_current_user(request)
+    if user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail='Accès non autorisé')
+    return {'enabled': CHANGE_FEED_ENABLED, **live_changes.stats()}
+
 if __name__ == '__main__':
     import uvicorn
     uvicorn.run(app, host='0.0.0.0', port=8001)
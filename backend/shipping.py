@@ -0,0 +1,218 @@
+"""
+Carrier shipment creation, one order or a whole wave.
+
+A carrier adapter turns one order into a tracking number. Carriers with an
+`api_base_url` go through HttpCarrier (the shared 'carriers' HTTP client);
+the others use DemoCarrier, which makes tracking numbers up locally, as the
+single-order endpoint always did.
+
+ship_wave() loads every order of a wave with one query, calls the adapter
+with at most `concurrency` requests in flight, and persists the tracking
+numbers and shipped status with a single bulk_write. The update only
+matches orders not shipped yet, so a wave sent twice never overwrites a
+tracking number; each order gets its own result.
+
+Buying a label is not idempotent. HttpCarrier only retries when the carrier
+cannot have processed the request: connection failures, 429 and 503. A read
+timeout or a gateway error is reported, never re-sent. Every request also
+carries an Idempotency-Key (order id + parcel) for carriers that dedupe on it.
+"""
+
+import asyncio
+import hashlib
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import httpx
+from bson import ObjectId
+from pymongo import UpdateOne
+
+SHIPPED_STATUSES = ('shipped', 'delivered')
+TRACKING_PREFIXES = {'COLISSIMO': '6A', 'CHRONOPOST': 'XY'}
+MAX_RETRIES = 2
+# Statuses that mean "not processed, come back later"
+RETRY_STATUSES = (429, 503)
+MAX_RETRY_AFTER = 30.0
+
+
+class CarrierError(Exception):
+    """The carrier refused or failed one shipment."""
+
+
+class DemoCarrier:
+    mode = 'demo'
+
+    def __init__(self, carrier):
+        self.prefix = TRACKING_PREFIXES.get(carrier['code'], 'TK')
+
+    async def create_shipment(self, order, weight, service_type):
+        return {'tracking_number': f"{self.prefix}{random.randint(100000000, 999999999)}FR"}
+
+
+def retry_after_seconds(value, default):
+    """Seconds to wait from a Retry-After header: delay-seconds or HTTP-date, capped."""
+    if not value:
+        return default
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+        except (TypeError, ValueError):
+            return default
+    return min(MAX_RETRY_AFTER, max(0.0, seconds))
+
+
+def idempotency_key(order, payload):
+    """Same order and parcel, same key: a re-sent purchase is recognised by the carrier."""
+    digest = hashlib.blake2b(repr(sorted(payload.items())).encode(), digest_size=8).hexdigest()
+    return f"{order['_id']}-{digest}"
+
+
+class HttpCarrier:
+    """Carrier API: POST {api_base_url}/shipments -> {'tracking_number', 'label_url'}."""
+
+    mode = 'live'
+
+    def __init__(self, carrier, http):
+        self.url = carrier['api_base_url'].rstrip('/') + '/shipments'
+        self.headers = {'Authorization': f"Bearer {carrier.get('api_key', '')}"}
+        self.http = http
+
+    async def create_shipment(self, order, weight, service_type):
+        payload = {
+            'reference': order.get('order_number'),
+            'service': service_type,
+            'weight': weight,
+            'recipient': {
+                'name': order.get('customer_name'),
+                'email': order.get('customer_email'),
+                'address': order.get('shipping_address'),
+            },
+        }
+        headers = {**self.headers, 'Idempotency-Key': idempotency_key(order, payload)}
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                response = await self.http.post(self.url, json=payload, headers=headers)
+            except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                # Never connected: the carrier did not see this request
+                if attempt == MAX_RETRIES:
+                    raise CarrierError(f'Transporteur injoignable : {e.__class__.__name__}')
+                await asyncio.sleep(2 ** attempt * 0.5)
+                continue
+            except httpx.HTTPError as e:
+                # Sent, maybe processed: retrying could buy a second label
+                raise CarrierError(f'Réponse transporteur perdue : {e.__class__.__name__}')
+            if response.status_code in RETRY_STATUSES and attempt < MAX_RETRIES:
+                await asyncio.sleep(retry_after_seconds(response.headers.get('Retry-After'), 2 ** attempt * 0.5))
+                continue
+            break
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        if response.status_code >= 400:
+            detail = body.get('detail') if isinstance(body, dict) else None
+            raise CarrierError(str(detail or f'Erreur transporteur : HTTP {response.status_code}'))
+        if not isinstance(body, dict) or not body.get('tracking_number'):
+            raise CarrierError('Réponse transporteur sans numéro de suivi')
+        return body
+
+
+def adapter_for(carrier, http):
+    if carrier.get('api_base_url'):
+        return HttpCarrier(carrier, http)
+    return DemoCarrier(carrier)
+
+
+def tracking_url(carrier, tracking_number):
+    template = carrier.get('tracking_url_template')
+    return template.replace('{tracking}', tracking_number) if template else None
+
+
+def valid_weight(weight):
+    return isinstance(weight, (int, float)) and not isinstance(weight, bool) and weight > 0
+
+
+async def create_labels(adapter, orders, weights, service_type, concurrency):
+    """{order _id: adapter result or CarrierError} with at most `concurrency` calls in flight.
+
+    A failure only fails its own order: labels already bought are always returned.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(order):
+        weight = weights.get(str(order['_id']))
+        if not valid_weight(weight):
+            return order['_id'], CarrierError('Poids manquant ou invalide')
+        async with semaphore:
+            try:
+                return order['_id'], await adapter.create_shipment(order, weight, service_type)
+            except CarrierError as e:
+                return order['_id'], e
+            except Exception as e:
+                return order['_id'], CarrierError(f'Erreur transporteur : {e.__class__.__name__}')
+
+    return dict(await asyncio.gather(*(one(order) for order in orders)))
+
+
+async def ship_wave(db, carrier, adapter, order_ids, tenant, weights, default_weight, service_type, concurrency):
+    """Ship every order of `order_ids` visible through `tenant`. Returns (results, client ids shipped)."""
+    orders = await db.orders.find(
+        {'_id': {'$in': order_ids}, **tenant},
+        {'order_number': 1, 'client_id': 1, 'status': 1, 'tracking_number': 1,
+         'customer_name': 1, 'customer_email': 1, 'shipping_address': 1}
+    ).to_list(length=None)
+    by_id = {order['_id']: order for order in orders}
+    to_ship = [o for o in orders if o.get('status') not in SHIPPED_STATUSES]
+    weights = {key: weights.get(key, default_weight) for key in (str(o['_id']) for o in to_ship)}
+    labels = await create_labels(adapter, to_ship, weights, service_type, concurrency)
+
+    wave_id = ObjectId()
+    shipped_at = datetime.now(timezone.utc)
+    created = [(order_id, label) for order_id, label in labels.items() if not isinstance(label, CarrierError)]
+    saved = set()
+    if created:
+        result = await db.orders.bulk_write([
+            UpdateOne(
+                {'_id': order_id, 'status': {'$nin': list(SHIPPED_STATUSES)}},
+                {'$set': {
+                    'tracking_number': label['tracking_number'],
+                    'status': 'shipped',
+                    'carrier_code': carrier['code'],
+                    'shipped_at': shipped_at,
+                    'shipment_wave_id': wave_id,
+                }}
+            )
+            for order_id, label in created
+        ], ordered=False)
+        if result.modified_count == len(created):
+            saved = {order_id for order_id, _ in created}
+        else:
+            # Some were shipped by someone else meanwhile: find out which ones are ours
+            ours = await db.orders.find(
+                {'_id': {'$in': [order_id for order_id, _ in created]}, 'shipment_wave_id': wave_id},
+                {'_id': 1}
+            ).to_list(length=None)
+            saved = {o['_id'] for o in ours}
+
+    results = []
+    for order_id in order_ids:
+        order = by_id.get(order_id)
+        entry = {'order_id': str(order_id)}
+        if order is None:
+            entry.update(success=False, error='Commande non trouvée')
+        elif order_id not in labels:
+            entry.update(success=False, error='Commande déjà expédiée', trackingNumber=order.get('tracking_number'))
+        elif isinstance(labels[order_id], CarrierError):
+            entry.update(success=False, error=str(labels[order_id]))
+        elif order_id not in saved:
+            entry.update(success=False, error='Commande expédiée entre-temps')
+        else:
+            number = labels[order_id]['tracking_number']
+            entry.update(success=True, orderNumber=order.get('order_number'), trackingNumber=number,
+                         trackingUrl=tracking_url(carrier, number), labelUrl=labels[order_id].get('label_url'))
+        results.append(entry)
+    client_ids = {by_id[order_id]['client_id'] for order_id in saved}
+    return results, client_ids
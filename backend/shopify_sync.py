@@ -0,0 +1,200 @@
+"""
+Incremental Shopify order sync.
+
+Each integration stores a sync_cursor. The first run walks the whole store in
+id order (since_id) and then switches to updated_at_min, so later runs only
+fetch what changed. Pages are followed through the Link header and the cursor
+is saved after every page: an interrupted sync resumes where it stopped.
+Each page is deduplicated with one $in query and written with one bulk_write.
+"""
+
+import asyncio
+import re
+from datetime import datetime, timezone
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+import sequences
+import versions
+
+API_VERSION = '2024-01'
+PAGE_SIZE = 250
+MAX_RETRIES = 3
+
+_NEXT_LINK = re.compile(r'<([^>]+)>;\s*rel="?next"?')
+
+
+class ShopifyError(Exception):
+    """Shopify answered with an error the sync cannot recover from."""
+
+
+class ShopifyAuthError(ShopifyError):
+    pass
+
+
+class ShopifyRateLimited(ShopifyError):
+    def __init__(self, retry_after):
+        super().__init__(f'Limite de requêtes Shopify atteinte (réessayer dans {retry_after:.0f} s)')
+        self.retry_after = retry_after
+
+
+def shop_base_url(store_url):
+    """'ma-boutique.myshopify.com' -> 'https://ma-boutique.myshopify.com'.
+
+    An explicit http:// is kept so a local fake store can be used in tests.
+    """
+    store_url = store_url.strip().rstrip('/')
+    if store_url.startswith('http://') or store_url.startswith('https://'):
+        return store_url
+    return f'https://{store_url}'
+
+
+def next_page_url(link_header):
+    """URL of the rel="next" entry of a Link header, or None."""
+    if not link_header:
+        return None
+    for part in link_header.split(','):
+        match = _NEXT_LINK.search(part)
+        if match:
+            return match.group(1)
+    return None
+
+
+def first_page_params(cursor):
+    """Query parameters of the first page for the stored cursor."""
+    params = {'status': 'any', 'limit': PAGE_SIZE}
+    if cursor.get('updated_at_min'):
+        params['updated_at_min'] = cursor['updated_at_min']
+        params['order'] = 'updated_at asc'
+    else:
+        params['since_id'] = cursor.get('since_id', 0)
+        params['order'] = 'id asc'
+    return params
+
+
+def advance_cursor(cursor, orders, last_page, started_at):
+    """Cursor to store once `orders` (one page) has been written."""
+    cursor = dict(cursor)
+    if not orders and not last_page:
+        return cursor
+    updated = [o['updated_at'] for o in orders if o.get('updated_at')]
+    if cursor.get('updated_at_min'):
+        # Pages come in updated_at order: the last one is the high-water mark
+        if updated:
+            cursor['updated_at_min'] = max(updated)
+        return cursor
+    # Backfill in id order
+    cursor.setdefault('backfill_started_at', started_at)
+    if orders:
+        cursor['since_id'] = max(o['id'] for o in orders)
+    if last_page:
+        # Orders changed while the backfill was running are fetched again
+        cursor['updated_at_min'] = cursor.pop('backfill_started_at')
+        cursor.pop('since_id', None)
+    return cursor
+
+
+async def _get(http, url, headers, params=None):
+    for attempt in range(MAX_RETRIES + 1):
+        response = await http.get(url, headers=headers, params=params)
+        if response.status_code == 401:
+            raise ShopifyAuthError('Authentification Shopify échouée')
+        if response.status_code != 429:
+            break
+        retry_after = float(response.headers.get('Retry-After', 2 ** attempt))
+        if attempt == MAX_RETRIES:
+            raise ShopifyRateLimited(retry_after)
+        await asyncio.sleep(retry_after)
+    if response.status_code >= 400:
+        raise ShopifyError(f'Erreur API Shopify: HTTP {response.status_code}')
+    return response
+
+
+async def iter_pages(http, store_url, access_token, cursor):
+    """Yield (orders, is_last_page) for every page after `cursor`."""
+    headers = {'X-Shopify-Access-Token': access_token, 'Content-Type': 'application/json'}
+    url = f'{shop_base_url(store_url)}/admin/api/{API_VERSION}/orders.json'
+    params = first_page_params(cursor)
+    while url:
+        response = await _get(http, url, headers, params)
+        url = next_page_url(response.headers.get('Link'))
+        # The next link already carries every parameter
+        params = None
+        yield response.json().get('orders', []), url is None
+
+
+def _order_fields(shop_order):
+    shipping = shop_order.get('shipping_address') or {}
+    return {
+        'customer_name': f"{shipping.get('first_name', '')} {shipping.get('last_name', '')}".strip() or 'Client Shopify',
+        'customer_email': shop_order.get('contact_email', ''),
+        'shipping_address': f"{shipping.get('address1', '')}, {shipping.get('city', '')} {shipping.get('zip', '')}, {shipping.get('country', '')}",
+        'shopify_updated_at': shop_order.get('updated_at'),
+    }
+
+
+async def write_page(db, integration, orders, created_by, is_demo):
+    """Upsert one page of Shopify orders. Returns (imported, updated)."""
+    if not orders:
+        return 0, 0
+    client_id = integration['client_id']
+    external_ids = list({str(o['id']) for o in orders})
+    existing = set(await db.orders.distinct('external_order_id', {
+        'client_id': client_id,
+        'external_platform': 'shopify',
+        'external_order_id': {'$in': external_ids},
+    }))
+    new_ids = [i for i in external_ids if i not in existing]
+    numbers = {}
+    if new_ids:
+        first = await sequences.reserve(db, 'orders', len(new_ids))
+        numbers = {external_id: first + offset for offset, external_id in enumerate(new_ids)}
+
+    now = datetime.now(timezone.utc)
+    operations = []
+    for shop_order in orders:
+        external_id = str(shop_order['id'])
+        on_insert = {
+            'status': 'pending',
+            'priority': 'medium',
+            'is_demo_tenant': is_demo,
+            'created_by': ObjectId(created_by) if created_by else None,
+            'created_at': now,
+        }
+        if external_id in numbers:
+            on_insert['order_number'] = sequences.order_number(numbers.pop(external_id), prefix='SHOP')
+        operations.append(UpdateOne(
+            {'client_id': client_id, 'external_platform': 'shopify', 'external_order_id': external_id},
+            {'$set': _order_fields(shop_order), '$setOnInsert': on_insert},
+            upsert=True
+        ))
+    result = await db.orders.bulk_write(operations, ordered=False)
+    if result.upserted_count or result.modified_count:
+        await versions.bump(db, ['orders'], [client_id])
+    return result.upserted_count, result.modified_count
+
+
+async def sync_orders(db, integration, http, created_by=None, is_demo=False, on_page=None):
+    """Fetch and store every Shopify order changed since the stored cursor.
+
+    `on_page` is awaited after each stored page (lease renewal).
+    """
+    cursor = integration.get('sync_cursor') or {}
+    started_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    stats = {'pages': 0, 'fetched': 0, 'imported': 0, 'updated': 0}
+    async for orders, last_page in iter_pages(http, integration['store_url'], integration['access_token'], cursor):
+        imported, updated = await write_page(db, integration, orders, created_by, is_demo)
+        cursor = advance_cursor(cursor, orders, last_page, started_at)
+        await db.integrations.update_one({'_id': integration['_id']}, {'$set': {'sync_cursor': cursor}})
+        stats['pages'] += 1
+        stats['fetched'] += len(orders)
+        stats['imported'] += imported
+        stats['updated'] += updated
+        if on_page is not None:
+            await on_page()
+    await db.integrations.update_one(
+        {'_id': integration['_id']},
+        {'$set': {'last_sync': datetime.now(timezone.utc)}}
+    )
+    return stats
@@ -0,0 +1,80 @@
+"""
+Materialized per-product stock totals.
+
+The product_stock collection holds one document per product (same _id):
+on-hand quantity, number of stocked locations, last movement date, plus the
+product fields that stock screens filter on. Listing, dashboard and alert
+queries read it instead of summing every inventory row through a $lookup.
+Every inventory write path must call refresh_product_stock for the products
+it touched; rebuild_product_stock repairs drift.
+
+Inventory rows also carry their product's client_id and is_demo_tenant, so
+tenant filters hit an index on inventory itself. Writers copy both fields
+from the product; backfill_inventory_tenants fills in older rows.
+"""
+
+from datetime import datetime, timezone
+
+
+def _summary_stages(updated_at):
+    return [
+        {'$lookup': {'from': 'inventory', 'localField': '_id', 'foreignField': 'product_id', 'as': 'inv'}},
+        {'$project': {
+            '_id': 1,
+            'client_id': 1,
+            'sku': 1,
+            'name': 1,
+            'active': 1,
+            'is_demo_tenant': {'$ifNull': ['$is_demo_tenant', False]},
+            'min_stock_level': {'$ifNull': ['$min_stock_level', 0]},
+            'on_hand': {'$sum': '$inv.quantity'},
+            'location_count': {'$size': {'$filter': {'input': '$inv', 'cond': {'$gt': ['$$this.quantity', 0]}}}},
+            'last_movement_at': {'$max': '$inv.last_updated'},
+        }},
+        {'$set': {
+            'below_min': {'$lt': ['$on_hand', '$min_stock_level']},
+            'updated_at': updated_at,
+        }},
+        {'$merge': {'into': 'product_stock', 'on': '_id', 'whenMatched': 'replace', 'whenNotMatched': 'insert'}},
+    ]
+
+
+async def refresh_product_stock(db, product_ids):
+    """Recompute the summary of the given products from their inventory rows."""
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+    now = datetime.now(timezone.utc)
+    await db.products.aggregate([{'$match': {'_id': {'$in': product_ids}}}] + _summary_stages(now)).to_list(length=None)
+    # Products deleted since their last refresh
+    existing = await db.products.distinct('_id', {'_id': {'$in': product_ids}})
+    gone = set(product_ids) - set(existing)
+    if gone:
+        await db.product_stock.delete_many({'_id': {'$in': list(gone)}})
+
+
+async def rebuild_product_stock(db):
+    """Recompute every summary and drop orphans. Returns the number of summaries."""
+    now = datetime.now(timezone.utc)
+    # BSON dates keep milliseconds only: truncate so the orphan sweep below
+    # does not catch summaries written by this run
+    started = now.replace(microsecond=now.microsecond // 1000 * 1000)
+    await db.products.aggregate(_summary_stages(started)).to_list(length=None)
+    await db.product_stock.delete_many({'updated_at': {'$lt': started}})
+    return await db.product_stock.count_documents({})
+
+
+async def backfill_inventory_tenants(db):
+    """Copy client_id / is_demo_tenant from products onto inventory rows missing them."""
+    if not await db.inventory.count_documents({'client_id': {'$exists': False}}, limit=1):
+        return
+    await db.inventory.aggregate([
+        {'$match': {'client_id': {'$exists': False}}},
+        {'$lookup': {'from': 'products', 'localField': 'product_id', 'foreignField': '_id', 'as': 'product'}},
+        {'$unwind': '$product'},
+        {'$project': {
+            'client_id': '$product.client_id',
+            'is_demo_tenant': {'$ifNull': ['$product.is_demo_tenant', False]},
+        }},
+        {'$merge': {'into': 'inventory', 'on': '_id', 'whenMatched': 'merge', 'whenNotMatched': 'discard'}},
+    ]).to_list(length=None)
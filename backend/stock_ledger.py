@@ -0,0 +1,284 @@
+"""
+Append-only stock movement ledger with periodic snapshots.
+
+Every change to an inventory row is recorded in stock_movements as a signed
+quantity on one (product, location) pair: receipts and positive adjustments
+add, picks and negative adjustments remove, a transfer writes one leg of
+each sign sharing a transfer_id. Movements are never updated or deleted.
+
+compact_snapshots() periodically writes a full snapshot into
+stock_snapshots: the previous compaction's rows plus the movements since,
+one row per pair with a non-zero quantity at the compaction time. Stable
+pairs are carried forward, so stock_as_of() reads exactly one compaction's
+rows (an equality match on as_of) plus the movements since: the tail never
+spans more than one compaction interval, and the query cost does not grow
+with the number of compactions.
+
+Inventory rows stay the current-state table the API lists from; the ledger
+is written right after the inventory update it describes. Without
+multi-document transactions a crash between the two can drop one movement;
+the opening balance written by open_ledger() is the only other movement
+not written by record_movement().
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+MOVEMENT_TYPES = ('receipt', 'pick', 'adjustment', 'transfer')
+# Movements written less than this long ago are left to the next compaction:
+# a write started before the cut may still be in flight
+COMPACTION_LAG = timedelta(seconds=60)
+# A compaction whose lease expired was interrupted: the next call resumes it
+COMPACTION_LEASE = timedelta(minutes=10)
+
+
+class InsufficientStock(Exception):
+    """Not enough stock at the source location for a pick, transfer or negative adjustment."""
+
+
+class CompactionRunning(Exception):
+    """Another worker is compacting snapshots."""
+
+
+def movement_legs(movement_type, quantity, location_id, to_location_id=None):
+    """[(location_id, signed quantity)] of one movement, the removal first."""
+    if movement_type not in MOVEMENT_TYPES:
+        raise ValueError(f"Type de mouvement inconnu : {movement_type}")
+    if movement_type == 'adjustment':
+        if quantity == 0:
+            raise ValueError('Quantité nulle')
+        return [(location_id, quantity)]
+    if quantity <= 0:
+        raise ValueError('La quantité doit être positive')
+    if movement_type == 'receipt':
+        return [(location_id, quantity)]
+    if movement_type == 'pick':
+        return [(location_id, -quantity)]
+    if not to_location_id or to_location_id == location_id:
+        raise ValueError('Transfert : emplacement de destination invalide')
+    return [(location_id, -quantity), (to_location_id, quantity)]
+
+
+async def _apply_leg(db, product, location_id, delta, lot_number, now):
+    """Move `delta` on the inventory row; returns the quantity after, None if stock is short."""
+    row = {'product_id': product['_id'], 'location_id': location_id}
+    if lot_number:
+        row['lot_number'] = lot_number
+    if delta < 0:
+        # Conditional decrement: stock never goes below zero
+        updated = await db.inventory.find_one_and_update(
+            {**row, 'quantity': {'$gte': -delta}},
+            {'$inc': {'quantity': delta}, '$set': {'last_updated': now}},
+            projection={'quantity': 1},
+            return_document=ReturnDocument.AFTER
+        )
+        return updated['quantity'] if updated else None
+    updated = await db.inventory.find_one_and_update(
+        row,
+        {
+            '$inc': {'quantity': delta},
+            '$set': {'last_updated': now},
+            '$setOnInsert': {
+                'client_id': product['client_id'],
+                'is_demo_tenant': product.get('is_demo_tenant', False),
+            },
+        },
+        projection={'quantity': 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return updated['quantity']
+
+
+async def record_movement(db, product, movement_type, quantity, location_id, to_location_id=None,
+                          lot_number=None, reference=None, reason=None, created_by=None):
+    """Apply one movement to inventory and append it to the ledger. Returns the movement documents."""
+    legs = movement_legs(movement_type, quantity, location_id, to_location_id)
+    now = datetime.now(timezone.utc)
+    transfer_id = ObjectId() if movement_type == 'transfer' else None
+    movements = []
+    for leg_location, delta in legs:
+        balance = await _apply_leg(db, product, leg_location, delta, lot_number, now)
+        if balance is None:
+            # Only the first leg can remove stock: nothing has been applied yet
+            raise InsufficientStock('Stock insuffisant à cet emplacement')
+        movements.append({
+            'type': movement_type,
+            'product_id': product['_id'],
+            'location_id': leg_location,
+            'quantity': delta,
+            'balance_after': balance,
+            'client_id': product['client_id'],
+            'is_demo_tenant': product.get('is_demo_tenant', False),
+            'lot_number': lot_number,
+            'transfer_id': transfer_id,
+            'reference': reference,
+            'reason': reason,
+            'created_by': ObjectId(created_by) if created_by else None,
+            'created_at': now,
+        })
+    await db.stock_movements.insert_many(movements)
+    return movements
+
+
+async def open_ledger(db):
+    """Record the current inventory as opening movements when the ledger is empty."""
+    if await db.stock_movements.estimated_document_count() or not await db.inventory.estimated_document_count():
+        return
+    await db.inventory.aggregate([
+        {'$project': {
+            'type': 'opening',
+            'product_id': 1,
+            'location_id': 1,
+            'quantity': 1,
+            'balance_after': '$quantity',
+            'client_id': 1,
+            'is_demo_tenant': 1,
+            'lot_number': 1,
+            'created_at': {'$ifNull': ['$last_updated', '$$NOW']},
+        }},
+        {'$merge': {'into': 'stock_movements', 'on': '_id', 'whenMatched': 'keepExisting', 'whenNotMatched': 'insert'}},
+    ]).to_list(length=None)
+
+
+async def last_compaction(db, before=None):
+    """as_of of the latest completed compaction (at or before `before`), or None."""
+    query = {'status': 'completed'}
+    if before is not None:
+        query['as_of'] = {'$lte': before}
+    run = await db.stock_snapshot_runs.find_one(query, {'as_of': 1}, sort=[('as_of', -1)])
+    return run['as_of'] if run else None
+
+
+async def compact_snapshots(db, until=None):
+    """Full snapshot of every pair with stock at the cut. Returns {'as_of', 'snapshots'}."""
+    now = datetime.now(timezone.utc)
+    # Resume an interrupted compaction at its own cut, once its lease expired:
+    # snapshots are keyed on (pair, as_of) and replaced, so redoing it is harmless
+    pending = await db.stock_snapshot_runs.find_one_and_update(
+        {'status': 'running', 'lease_until': {'$lt': now}},
+        {'$set': {'lease_until': now + COMPACTION_LEASE}, '$inc': {'attempts': 1}},
+        projection={'as_of': 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if pending:
+        run_id, as_of = pending['_id'], pending['as_of']
+    else:
+        as_of = until or now - COMPACTION_LAG
+        try:
+            run_id = (await db.stock_snapshot_runs.insert_one({
+                'status': 'running',
+                'as_of': as_of,
+                'lease_until': now + COMPACTION_LEASE,
+                'attempts': 1,
+                'started_at': now,
+            })).inserted_id
+        except DuplicateKeyError:
+            # Unique partial index: one running compaction at a time, and its lease is live
+            raise CompactionRunning('Compactage des instantanés déjà en cours')
+
+    previous = await last_compaction(db, before=as_of)
+    window = {'$lte': as_of}
+    if previous is not None:
+        window['$gt'] = previous
+    fields = {'_id': 0, 'product_id': 1, 'location_id': 1, 'client_id': 1, 'is_demo_tenant': 1, 'quantity': 1}
+    stages = [{'$match': {'created_at': window}}, {'$project': fields}]
+    if previous is not None:
+        # Carry every pair of the previous snapshot forward, moved or not
+        stages.append({'$unionWith': {'coll': 'stock_snapshots', 'pipeline': [
+            {'$match': {'as_of': previous}},
+            {'$project': fields},
+        ]}})
+    await db.stock_movements.aggregate(stages + [
+        {'$group': {
+            '_id': {'product_id': '$product_id', 'location_id': '$location_id'},
+            'quantity': {'$sum': '$quantity'},
+            'client_id': {'$last': '$client_id'},
+            'is_demo_tenant': {'$last': '$is_demo_tenant'},
+        }},
+        {'$match': {'quantity': {'$ne': 0}}},
+        {'$project': {
+            '_id': {'product_id': '$_id.product_id', 'location_id': '$_id.location_id', 'as_of': as_of},
+            'product_id': '$_id.product_id',
+            'location_id': '$_id.location_id',
+            'client_id': 1,
+            'is_demo_tenant': 1,
+            'as_of': as_of,
+            'quantity': 1,
+        }},
+        {'$merge': {'into': 'stock_snapshots', 'on': '_id', 'whenMatched': 'replace', 'whenNotMatched': 'insert'}},
+    ], allowDiskUse=True).to_list(length=None)
+    count = await db.stock_snapshots.count_documents({'as_of': as_of})
+    await db.stock_snapshot_runs.update_one({'_id': run_id}, {
+        '$set': {'status': 'completed', 'snapshots': count, 'finished_at': datetime.now(timezone.utc)},
+        '$unset': {'lease_until': ''},
+    })
+    return {'as_of': as_of, 'snapshots': count}
+
+
+async def stock_as_of(db, query, at):
+    """[{product_id, location_id, quantity}] at date `at` for the pairs matching `query`.
+
+    query filters on product_id / location_id / client_id, fields shared by
+    snapshots and movements.
+    """
+    compacted = await last_compaction(db, before=at)
+    quantities = {}
+    if compacted is not None:
+        # Every compaction is a full snapshot: only its own rows are read
+        async for row in db.stock_snapshots.find(
+            {**query, 'as_of': compacted}, {'product_id': 1, 'location_id': 1, 'quantity': 1}
+        ):
+            quantities[(row['product_id'], row['location_id'])] = row['quantity']
+    tail = {'$lte': at}
+    if compacted is not None:
+        tail['$gt'] = compacted
+    async for row in db.stock_movements.aggregate([
+        {'$match': {**query, 'created_at': tail}},
+        {'$group': {
+            '_id': {'product_id': '$product_id', 'location_id': '$location_id'},
+            'delta': {'$sum': '$quantity'},
+        }},
+    ]):
+        key = (row['_id']['product_id'], row['_id']['location_id'])
+        quantities[key] = quantities.get(key, 0) + row['delta']
+    return [
+        {'product_id': product_id, 'location_id': location_id, 'quantity': quantity}
+        for (product_id, location_id), quantity in sorted(quantities.items(), key=lambda item: (str(item[0][0]), str(item[0][1])))
+        if quantity
+    ]
+
+
+class SnapshotCompactor:
+    """Runs compact_snapshots every `interval` seconds in the background."""
+
+    def __init__(self, db, interval):
+        self.db = db
+        self.interval = interval
+        self.last_result = None
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.last_result = await compact_snapshots(self.db)
+            except CompactionRunning:
+                # Another worker is on it
+                pass
+            except Exception as e:
+                print(f"Erreur compactage des instantanés de stock: {e}")
@@ -0,0 +1,213 @@
+"""
+Background sync of integrations flagged auto_sync_orders / auto_sync_stock.
+
+One asyncio task per worker scans for due integrations every few seconds.
+The schedule lives on the integration document (sync_status.next_run_at), so
+it survives restarts. A lease (sync_lease_until) keeps two workers from
+syncing the same integration at once; manual syncs take the same lease
+through claim() / release(). Long syncs renew() it after every page, and a
+run cancelled by a shutdown still releases it.
+
+Load is bounded so the API keeps its event loop: at most `max_concurrency`
+syncs run in a worker, and at most `per_store` per store. Intervals are
+jittered. A 429 or any other failure backs off exponentially.
+"""
+
+import asyncio
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from shopify_sync import ShopifyRateLimited
+
+
+class SyncScheduler:
+    """Runs `jobs[(platform, kind)](integration)` for every due integration.
+
+    kind is 'orders' for auto_sync_orders and 'stock' for auto_sync_stock.
+    """
+
+    def __init__(self, db, jobs, interval=300.0, jitter=0.2, tick=5.0,
+                 max_concurrency=20, per_store=1, max_backoff=3600.0, lease=900.0):
+        self._db = db
+        self.jobs = jobs
+        self.interval = interval
+        self.jitter = jitter
+        self.tick = tick
+        self.max_concurrency = max_concurrency
+        self.per_store = per_store
+        self.max_backoff = max_backoff
+        self.lease = lease
+        self._task = None
+        self._running = {}
+        self._store_running = defaultdict(int)
+        self.runs = 0
+        self.failures = 0
+        self.rate_limited = 0
+        self.last_tick_at = None
+        self.last_tick_ms = 0.0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for task in list(self._running.values()):
+            task.cancel()
+        await asyncio.gather(*self._running.values(), return_exceptions=True)
+
+    def _jittered(self, seconds):
+        return seconds * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _backoff(self, failures, retry_after=0.0):
+        return min(self.max_backoff, max(retry_after, self._jittered(self.interval / 4 * 2 ** failures)))
+
+    @staticmethod
+    def _store_key(integration):
+        return (integration.get('store_url') or str(integration['_id'])).lower().rstrip('/')
+
+    def _kinds(self, integration):
+        kinds = []
+        if integration.get('auto_sync_orders') and (integration['platform'], 'orders') in self.jobs:
+            kinds.append('orders')
+        if integration.get('auto_sync_stock') and (integration['platform'], 'stock') in self.jobs:
+            kinds.append('stock')
+        return kinds
+
+    async def _loop(self):
+        while True:
+            started = time.perf_counter()
+            try:
+                await self.run_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Erreur planificateur de synchronisation: {e}")
+            self.last_tick_at = datetime.now(timezone.utc)
+            self.last_tick_ms = (time.perf_counter() - started) * 1000
+            await asyncio.sleep(self._jittered(self.tick))
+
+    async def run_due(self):
+        """Start every due integration that fits under the concurrency caps."""
+        free = self.max_concurrency - len(self._running)
+        if free <= 0:
+            return
+        now = datetime.now(timezone.utc)
+        platforms = sorted({platform for platform, _ in self.jobs})
+        candidates = await self._db.integrations.find({
+            'status': 'active',
+            'platform': {'$in': platforms},
+            'store_url': {'$nin': [None, '']},
+            'access_token': {'$nin': [None, '']},
+            '$or': [{'auto_sync_orders': True}, {'auto_sync_stock': True}],
+            'sync_status.next_run_at': {'$not': {'$gt': now}},
+            '_id': {'$nin': list(self._running)},
+        }).sort('sync_status.next_run_at', 1).limit(free * 4).to_list(length=None)
+
+        for integration in candidates:
+            if len(self._running) >= self.max_concurrency:
+                break
+            store = self._store_key(integration)
+            if self._store_running[store] >= self.per_store or not self._kinds(integration):
+                continue
+            if not await self.claim(integration['_id'], now):
+                continue
+            self._store_running[store] += 1
+            task = asyncio.ensure_future(self._run(integration, store, now))
+            self._running[integration['_id']] = task
+
+    async def claim(self, integration_id, now=None):
+        """Take the sync lease of an integration. False while another sync holds it."""
+        now = now or datetime.now(timezone.utc)
+        result = await self._db.integrations.update_one(
+            {'_id': integration_id, 'sync_lease_until': {'$not': {'$gt': now}}},
+            {'$set': {'sync_lease_until': now + timedelta(seconds=self.lease)}}
+        )
+        return result.modified_count == 1
+
+    async def renew(self, integration_id):
+        """Push the lease back while a sync is still making progress (called once per page)."""
+        await self._db.integrations.update_one(
+            {'_id': integration_id},
+            {'$set': {'sync_lease_until': datetime.now(timezone.utc) + timedelta(seconds=self.lease)}}
+        )
+
+    async def release(self, integration_id):
+        # Shielded: a cancelled sync (shutdown, client gone) must not keep the lease
+        await asyncio.shield(self._db.integrations.update_one(
+            {'_id': integration_id}, {'$set': {'sync_lease_until': None}}
+        ))
+
+    async def _run(self, integration, store, scanned_at):
+        status = integration.get('sync_status') or {}
+        due_at = status.get('next_run_at') or scanned_at
+        if due_at.tzinfo is None:
+            due_at = due_at.replace(tzinfo=timezone.utc)
+        started_at = datetime.now(timezone.utc)
+        started = time.perf_counter()
+        update = {
+            'sync_status.last_run_at': started_at,
+            'sync_status.lag_seconds': round(max(0.0, (started_at - due_at).total_seconds()), 3),
+        }
+        failures = status.get('consecutive_failures', 0)
+        try:
+            results = {}
+            for kind in self._kinds(integration):
+                results[kind] = await self.jobs[(integration['platform'], kind)](integration)
+            delay = self._jittered(self.interval)
+            update.update({
+                'sync_status.last_success_at': datetime.now(timezone.utc),
+                'sync_status.last_result': results,
+                'sync_status.last_error': None,
+                'sync_status.consecutive_failures': 0,
+            })
+        except asyncio.CancelledError:
+            # The final update below is skipped: free the integration now
+            await self.release(integration['_id'])
+            raise
+        except ShopifyRateLimited as e:
+            self.rate_limited += 1
+            self.failures += 1
+            delay = self._backoff(failures, e.retry_after)
+            update.update({'sync_status.last_error': str(e), 'sync_status.consecutive_failures': failures + 1})
+        except Exception as e:
+            self.failures += 1
+            delay = self._backoff(failures)
+            update.update({'sync_status.last_error': str(e), 'sync_status.consecutive_failures': failures + 1})
+        finally:
+            self.runs += 1
+            self._store_running[store] -= 1
+            if not self._store_running[store]:
+                del self._store_running[store]
+            self._running.pop(integration['_id'], None)
+
+        update['sync_status.last_duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        update['sync_status.next_run_at'] = datetime.now(timezone.utc) + timedelta(seconds=delay)
+        update['sync_lease_until'] = None
+        await self._db.integrations.update_one({'_id': integration['_id']}, {'$set': update})
+
+    async def run_now(self, integration_id):
+        """Make an integration due at the next tick."""
+        await self._db.integrations.update_one(
+            {'_id': integration_id},
+            {'$set': {'sync_status.next_run_at': datetime.now(timezone.utc)}}
+        )
+
+    def stats(self):
+        return {
+            'running': len(self._running),
+            'max_concurrency': self.max_concurrency,
+            'per_store': self.per_store,
+            'interval_seconds': self.interval,
+            'stores_in_flight': len(self._store_running),
+            'runs': self.runs,
+            'failures': self.failures,
+            'rate_limited': self.rate_limited,
+            'last_tick_at': self.last_tick_at.isoformat() if self.last_tick_at else None,
+            'last_tick_ms': round(self.last_tick_ms, 1),
+        }
@@ -0,0 +1,107 @@
+"""
+Demo / non-demo tenant registry.
+
+Admin views exclude demo clients. Instead of re-reading the clients
+collection on every request, the registry keeps both id sets in memory and
+reloads them when the tenants version stored in app_state changes. Any write
+that can change a client's demo status must call bump().
+
+orders, products and inventory also carry a denormalized is_demo_tenant flag
+so the admin "all clients" lists filter on an index instead of a large $in.
+"""
+
+import time
+
+TENANTS_STATE_ID = 'tenants'
+
+
+def _both_forms(ids):
+    """client_id is stored as a string or an ObjectId: match both"""
+    ids = list(ids)
+    return [str(i) for i in ids] + ids
+
+
+class TenantRegistry:
+    """In-memory copy of the demo / non-demo client id sets.
+
+    Other workers learn about a bump() within `recheck_seconds`.
+    """
+
+    def __init__(self, db, recheck_seconds=5.0):
+        self._db = db
+        self.recheck_seconds = recheck_seconds
+        self.version = None
+        self._checked_at = 0.0
+        self._demo_ids = frozenset()
+        self._non_demo_ids = frozenset()
+
+    async def _refresh(self):
+        now = time.monotonic()
+        if self.version is not None and now - self._checked_at < self.recheck_seconds:
+            return
+        state = await self._db.app_state.find_one({'_id': TENANTS_STATE_ID}, {'version': 1})
+        remote_version = state['version'] if state else 0
+        self._checked_at = now
+        if remote_version == self.version:
+            return
+        # Version is read before the clients: the sets are at least that recent
+        clients = await self._db.clients.find({}, {'_id': 1, 'is_demo': 1}).to_list(length=None)
+        self._demo_ids = frozenset(c['_id'] for c in clients if c.get('is_demo') is True)
+        self._non_demo_ids = frozenset(c['_id'] for c in clients if c.get('is_demo') is not True)
+        self.version = remote_version
+
+    async def non_demo_client_ids(self):
+        """Non-demo client ids in both stored forms, ready for a $in"""
+        await self._refresh()
+        return _both_forms(self._non_demo_ids)
+
+    async def demo_client_ids(self):
+        await self._refresh()
+        return _both_forms(self._demo_ids)
+
+    async def is_demo(self, client_id):
+        await self._refresh()
+        return str(client_id) in {str(i) for i in self._demo_ids}
+
+    async def bump(self):
+        await self._db.app_state.update_one(
+            {'_id': TENANTS_STATE_ID},
+            {'$inc': {'version': 1}},
+            upsert=True
+        )
+        # Reload on next read in this worker
+        self._checked_at = 0.0
+
+    def stats(self):
+        return {
+            'version': self.version,
+            'demo_clients': len(self._demo_ids),
+            'non_demo_clients': len(self._non_demo_ids),
+        }
+
+
+async def sync_demo_flags(db, client_id, is_demo):
+    """Rewrite is_demo_tenant on every row of one client."""
+    client_match = {'$in': _both_forms([client_id])}
+    await db.products.update_many({'client_id': client_match}, {'$set': {'is_demo_tenant': is_demo}})
+    await db.orders.update_many({'client_id': client_match}, {'$set': {'is_demo_tenant': is_demo}})
+    await db.inventory.update_many({'client_id': client_match}, {'$set': {'is_demo_tenant': is_demo}})
+    await db.product_stock.update_many({'client_id': client_match}, {'$set': {'is_demo_tenant': is_demo}})
+
+
+async def backfill_demo_flags(db, registry):
+    """Set is_demo_tenant on rows written before the flag existed. Cheap once done."""
+    demo_ids = await registry.demo_client_ids()
+    missing = {'is_demo_tenant': {'$exists': False}}
+    for name in ('products', 'orders'):
+        if demo_ids:
+            await db[name].update_many({**missing, 'client_id': {'$in': demo_ids}}, {'$set': {'is_demo_tenant': True}})
+        await db[name].update_many(missing, {'$set': {'is_demo_tenant': False}})
+    # inventory and product_stock rows follow their product
+    for name, product_key in (('inventory', 'product_id'), ('product_stock', '_id')):
+        if not await db[name].count_documents(missing, limit=1):
+            continue
+        demo_products = await db.products.distinct('_id', {'is_demo_tenant': True})
+        if demo_products:
+            await db[name].update_many({**missing, product_key: {'$in': demo_products}}, {'$set': {'is_demo_tenant': True}})
+        await db[name].update_many(missing, {'$set': {'is_demo_tenant': False}})
@@ -0,0 +1,33 @@
+import asyncio
+import os
+import sys
+import uuid
+
+import pytest
+
+# Les modules du backend (server.py, cache.py, ...) sont importés à plat
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TEST_MONGO_URL = os.environ.get('TEST_MONGO_URL')
+
+
+@pytest.fixture
+def mongo():
+    """Runs `scenario(db)` on a throwaway database (declared indexes included) of TEST_MONGO_URL"""
+    if not TEST_MONGO_URL:
+        pytest.skip('TEST_MONGO_URL not set')
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from indexes import ensure_indexes
+
+    def run(scenario):
+        async def main():
+            client = AsyncIOMotorClient(TEST_MONGO_URL)
+            db = client[f'wms_test_{uuid.uuid4().hex[:8]}']
+            try:
+                await ensure_indexes(db)
+                return await scenario(db)
+            finally:
+                await client.drop_database(db.name)
+                client.close()
+        return asyncio.run(main())
+    return run
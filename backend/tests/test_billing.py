@@ -0,0 +1,43 @@
+"""
+Tests for invoice pricing and the month-end billing run helpers
+"""
+from datetime import datetime
+
+from bson import ObjectId
+
+import billing
+
+
+class TestBilling:
+    """Period bounds, totals and invoice documents (no MongoDB needed)"""
+
+    def test_month_bounds_cover_the_whole_month(self):
+        start, end = billing.month_bounds('2024-02')
+        assert start == datetime(2024, 2, 1)
+        assert end == datetime(2024, 2, 29, 23, 59, 59, 999999)
+
+    def test_run_id_is_stable_per_period(self):
+        start, end = billing.month_bounds('2026-09')
+        assert billing.run_id(start, end) == '20260901-20260930'
+
+    def test_totals_include_storage_fee_and_tax(self):
+        subtotal, tax, total = billing.invoice_totals(billing.invoice_lines(10, 2))
+        assert subtotal == 10 * billing.ORDER_PRICE + 2 * billing.RECEIPT_PRICE + billing.STORAGE_FEE
+        assert tax == subtotal * billing.TAX_RATE / 100
+        assert total == subtotal + tax
+
+    def test_build_invoice_links_lines_to_invoice_and_run(self):
+        client_id = ObjectId()
+        start, end = billing.month_bounds('2026-09')
+        issued = datetime(2026, 10, 1)
+        invoice, lines = billing.build_invoice(client_id, 42, start, end, {'orders': 3}, issued, billing_run_id='run')
+        assert invoice['invoice_number'] == 'FACT-202610-0042'
+        assert invoice['billing_run_id'] == 'run'
+        assert {line['invoice_id'] for line in lines} == {invoice['_id']}
+        assert all(line['client_id'] == client_id for line in lines)
+        assert lines[1]['quantity'] == 0
+
+    def test_manual_invoice_carries_no_run_id(self):
+        invoice, lines = billing.build_invoice(ObjectId(), 1, datetime(2026, 9, 1), datetime(2026, 9, 30), {}, datetime(2026, 10, 1))
+        assert 'billing_run_id' not in invoice
+        assert all('billing_run_id' not in line for line in lines)
@@ -0,0 +1,42 @@
+"""
+Tests for the bulk order import write path: per-order errors, no order left
+without its lines (needs a MongoDB in TEST_MONGO_URL)
+"""
+from bson import ObjectId
+
+from bulk_orders import insert_orders
+
+
+def order(number):
+    return {'_id': ObjectId(), 'order_number': number, 'client_id': 'c1'}
+
+
+def lines(order_doc, count=1):
+    return [{'order_id': str(order_doc['_id']), 'product_id': ObjectId(), 'quantity_ordered': 1} for _ in range(count)]
+
+
+class TestInsertOrders:
+    """Write errors are mapped back to their orders"""
+
+    def test_duplicate_number_and_line_failure(self, mongo):
+        first, duplicate, broken = order('CMD-000001'), order('CMD-000001'), order('CMD-000002')
+        first_lines, broken_lines = lines(first), lines(broken, 2)
+        # The second line of `broken` reuses an _id already taken: its insert fails
+        broken_lines[1]['_id'] = first_lines[0]['_id'] = ObjectId()
+
+        async def scenario(db):
+            failed = await insert_orders(db, [first, duplicate, broken], [first_lines, lines(duplicate), broken_lines])
+            assert set(failed) == {1, 2}
+            assert 'E11000' in failed[1] and failed[2].startswith('Lignes non écrites')
+            # Only the complete order is left, with its lines
+            assert [o['_id'] for o in await db.orders.find().to_list(length=None)] == [first['_id']]
+            assert {line['order_id'] for line in await db.order_lines.find().to_list(length=None)} == {str(first['_id'])}
+        mongo(scenario)
+
+    def test_all_written(self, mongo):
+        orders = [order(f'CMD-{n:06d}') for n in range(3)]
+
+        async def scenario(db):
+            assert await insert_orders(db, orders, [lines(o, 2) for o in orders]) == {}
+            assert await db.order_lines.count_documents({}) == 6
+        mongo(scenario)
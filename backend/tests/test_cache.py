@@ -0,0 +1,87 @@
+"""
+Tests for the in-process TTL/LRU cache used by get_current_user
+"""
+import asyncio
+import time
+
+from cache import SnapshotCache, TTLCache
+
+
+class TestTTLCache:
+    """Hit/miss accounting, LRU bound and invalidation"""
+
+    def test_hit_and_miss_counters(self):
+        cache = TTLCache(maxsize=10, ttl=60)
+        assert cache.get('u1') is None
+        cache.set('u1', {'id': 'u1'})
+        assert cache.get('u1') == {'id': 'u1'}
+        stats = cache.stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 1
+        assert stats['hit_ratio'] == 0.5
+
+    def test_lru_eviction(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        assert cache.get('b') is None
+        assert cache.get('a') == 1
+        assert cache.stats()['evictions'] == 1
+
+    def test_expiry(self):
+        cache = TTLCache(maxsize=2, ttl=0.01)
+        cache.set('a', 1)
+        time.sleep(0.02)
+        assert cache.get('a') is None
+
+    def test_invalidate_where(self):
+        cache = TTLCache()
+        cache.set('u1', {'client_id': 'c1'})
+        cache.set('u2', {'client_id': 'c2'})
+        cache.invalidate_where(lambda u: u.get('client_id') == 'c1')
+        assert cache.get('u1') is None
+        assert cache.get('u2') == {'client_id': 'c2'}
+
+
+class TestSnapshotCache:
+    """Fresh hits, stale-while-revalidate and single-flight misses"""
+
+    def test_single_flight_miss(self):
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return len(calls)
+
+        async def scenario():
+            cache = SnapshotCache(ttl=60, stale_ttl=120)
+            results = await asyncio.gather(*(cache.get('t1', compute) for _ in range(5)))
+            return results, await cache.get('t1', compute), cache.stats()
+
+        results, again, stats = asyncio.run(scenario())
+        assert results == [1] * 5
+        assert again == 1
+        assert len(calls) == 1
+        assert stats['hits'] == 1
+
+    def test_stale_value_served_while_refreshing(self):
+        values = iter([1, 2])
+
+        async def compute():
+            return next(values)
+
+        async def scenario():
+            cache = SnapshotCache(ttl=0.01, stale_ttl=60)
+            first = await cache.get('t1', compute)
+            await asyncio.sleep(0.02)
+            stale = await cache.get('t1', compute)
+            await asyncio.sleep(0.01)
+            refreshed = cache._data['t1'][1]
+            return first, stale, refreshed, cache.stats()
+
+        first, stale, refreshed, stats = asyncio.run(scenario())
+        assert (first, stale, refreshed) == (1, 1, 2)
+        assert stats['stale_hits'] == 1
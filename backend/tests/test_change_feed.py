@@ -0,0 +1,162 @@
+"""
+Tests for the live change feed: delta payloads, tenant routing and backpressure.
+The end-to-end test needs a replica set (benchmarks/replset.py) in REPLSET_MONGO_URL.
+"""
+import asyncio
+import os
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+
+from change_feed import ALL_TENANTS, ChangeFeed, FeedUnavailable, delta_event
+
+REPLSET_MONGO_URL = os.environ.get('REPLSET_MONGO_URL')
+
+TENANT_A = ObjectId()
+TENANT_B = ObjectId()
+DEMO_TENANT = ObjectId()
+
+
+async def is_demo(client_id):
+    return client_id == DEMO_TENANT
+
+
+def update(collection, client_id, fields, demo=False):
+    return {
+        'operationType': 'update',
+        'ns': {'coll': collection},
+        'documentKey': {'_id': ObjectId()},
+        'updateDescription': {'updatedFields': fields, 'removedFields': []},
+        'fullDocument': {'client_id': client_id, 'is_demo_tenant': demo, **fields},
+    }
+
+
+class TestDeltaEvents:
+    """Payloads carry allow-listed fields only"""
+
+    def test_update_sends_changed_fields_only(self):
+        event = delta_event(update('orders', TENANT_A, {'status': 'shipped', 'sync_lease_until': 1}))
+        assert event['op'] == 'update'
+        assert event['changes'] == {'status': 'shipped'}
+
+    def test_internal_only_update_is_dropped(self):
+        assert delta_event(update('orders', TENANT_A, {'shopify_updated_at': 'x'})) is None
+
+    def test_insert_is_trimmed(self):
+        change = {
+            'operationType': 'insert',
+            'ns': {'coll': 'inventory'},
+            'documentKey': {'_id': 1},
+            'fullDocument': {'_id': 1, 'quantity': 5, 'client_id': TENANT_A, 'is_demo_tenant': False},
+        }
+        assert delta_event(change)['changes'] == {'quantity': 5}
+
+
+class TestRouting:
+    """Tenants only see their own changes; admins see non-demo tenants"""
+
+    def feed(self, queue_size=8):
+        return ChangeFeed(None, is_demo, queue_size=queue_size)
+
+    def test_tenant_and_admin_scopes(self):
+        async def scenario():
+            feed = self.feed()
+            a, b, admin = feed.subscribe(str(TENANT_A)), feed.subscribe(str(TENANT_B)), feed.subscribe(ALL_TENANTS)
+            await feed.dispatch(update('orders', TENANT_A, {'status': 'shipped'}))
+            assert a.queue.qsize() == 1 and admin.queue.qsize() == 1
+            assert b.queue.empty()
+        asyncio.run(scenario())
+
+    def test_demo_tenants_stay_out_of_admin_scope(self):
+        async def scenario():
+            feed = self.feed()
+            admin = feed.subscribe(ALL_TENANTS)
+            await feed.dispatch(update('orders', DEMO_TENANT, {'status': 'shipped'}, demo=True))
+            # receipts have no flag: the registry decides
+            receipt = update('receipts', DEMO_TENANT, {'status': 'received'})
+            del receipt['fullDocument']['is_demo_tenant']
+            await feed.dispatch(receipt)
+            assert admin.queue.empty()
+        asyncio.run(scenario())
+
+    def test_collection_filter(self):
+        async def scenario():
+            feed = self.feed()
+            orders_only = feed.subscribe(str(TENANT_A), {'orders'})
+            await feed.dispatch(update('inventory', TENANT_A, {'quantity': 3}))
+            assert orders_only.queue.empty()
+        asyncio.run(scenario())
+
+    def test_slow_subscriber_gets_a_single_reset(self):
+        async def scenario():
+            feed = self.feed(queue_size=2)
+            slow = feed.subscribe(str(TENANT_A))
+            for _ in range(5):
+                await feed.dispatch(update('orders', TENANT_A, {'status': 'shipped'}))
+            events = [slow.queue.get_nowait() for _ in range(slow.queue.qsize())]
+            assert {'type': 'reset'} in events
+            assert len(events) <= 2
+        asyncio.run(scenario())
+
+    def test_unsubscribe_drops_empty_scopes(self):
+        feed = self.feed()
+        subscription = feed.subscribe(str(TENANT_A))
+        feed.unsubscribe(subscription)
+        assert feed.stats()['connections'] == 0 and feed.stats()['scopes'] == 0
+
+
+class StandaloneDb:
+    """A MongoDB without replica set: watch() is refused"""
+
+    def watch(self, *args, **kwargs):
+        raise OperationFailure('The $changeStream stage is only supported on replica sets', code=40573)
+
+
+class TestUnavailable:
+    """Connections accepted before the stream failed are told, not left hanging"""
+
+    def test_early_subscribers_get_unavailable(self):
+        async def scenario():
+            feed = ChangeFeed(StandaloneDb(), is_demo, queue_size=2)
+            early = feed.subscribe(str(TENANT_A))
+            early.push({'type': 'change'})
+            early.push({'type': 'change'})
+            feed.start()
+            assert await early.next(timeout=5) == {'type': 'unavailable'}
+            assert early.queue.empty()
+            assert feed.stats()['connections'] == 0
+            with pytest.raises(FeedUnavailable):
+                feed.subscribe(str(TENANT_A))
+            feed.unsubscribe(early)
+            await feed.stop()
+        asyncio.run(scenario())
+
+
+@pytest.mark.skipif(not REPLSET_MONGO_URL, reason='REPLSET_MONGO_URL not set (python benchmarks/replset.py)')
+class TestChangeStream:
+    """End to end against a real replica set"""
+
+    def test_insert_reaches_its_tenant_only(self):
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        async def scenario():
+            client = AsyncIOMotorClient(REPLSET_MONGO_URL)
+            db = client['wms_change_feed_test']
+            feed = ChangeFeed(db, is_demo)
+            a, b = feed.subscribe(str(TENANT_A)), feed.subscribe(str(TENANT_B))
+            feed.start()
+            try:
+                while feed.available is None:
+                    await asyncio.sleep(0.05)
+                # Give the stream time to be established before writing
+                await asyncio.sleep(0.5)
+                await db.orders.insert_one({'client_id': TENANT_A, 'is_demo_tenant': False, 'status': 'pending'})
+                event = await a.next(timeout=10)
+                assert event['collection'] == 'orders' and event['changes']['status'] == 'pending'
+                assert b.queue.empty()
+            finally:
+                await feed.stop()
+                await client.drop_database('wms_change_feed_test')
+                client.close()
+        asyncio.run(scenario())
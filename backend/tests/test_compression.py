@@ -0,0 +1,118 @@
+"""
+Tests for the gzip / brotli compression middleware
+"""
+import asyncio
+import gzip
+import zlib
+
+from fastapi import FastAPI, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from compression import CompressionMiddleware, CompressionStats
+
+stats = CompressionStats()
+app = FastAPI()
+app.add_middleware(CompressionMiddleware, minimum_size=500, stats=stats)
+BIG = 'ligne de données répétée\n' * 200
+
+
+@app.get('/small')
+def small():
+    return PlainTextResponse('court')
+
+
+@app.get('/big')
+def big():
+    return PlainTextResponse(BIG)
+
+
+@app.get('/stream')
+def stream():
+    return StreamingResponse((BIG for _ in range(5)), media_type='text/csv')
+
+
+@app.get('/events')
+def events():
+    return StreamingResponse(iter(['data: x\n\n']), media_type='text/event-stream')
+
+
+@app.get('/not-modified')
+def not_modified():
+    return Response(status_code=304, headers={'ETag': 'W/"x"'})
+
+
+client = TestClient(app)
+
+
+class TestCompression:
+    """Thresholds, codec negotiation and pass-through cases"""
+
+    def test_small_body_untouched(self):
+        r = client.get('/small', headers={'Accept-Encoding': 'gzip'})
+        assert 'content-encoding' not in r.headers
+        assert r.text == 'court'
+
+    def test_gzip(self):
+        r = client.get('/big', headers={'Accept-Encoding': 'gzip'})
+        assert r.headers['content-encoding'] == 'gzip'
+        assert 'Accept-Encoding' in r.headers['vary']
+        assert int(r.headers['content-length']) < len(BIG.encode())
+        assert r.text == BIG
+
+    def test_brotli_preferred(self):
+        r = client.get('/big', headers={'Accept-Encoding': 'gzip, br'})
+        assert r.headers['content-encoding'] == 'br'
+        # httpx decodes br itself when brotli is installed
+        assert r.text == BIG
+
+    def test_identity(self):
+        r = client.get('/big', headers={'Accept-Encoding': 'identity'})
+        assert 'content-encoding' not in r.headers
+
+    def test_refused_codings(self):
+        r = client.get('/big', headers={'Accept-Encoding': 'br;q=0, gzip'})
+        assert r.headers['content-encoding'] == 'gzip'
+        r = client.get('/big', headers={'Accept-Encoding': 'gzip;q=0'})
+        assert 'content-encoding' not in r.headers
+        r = client.get('/big', headers={'Accept-Encoding': 'gzip;q=0, *;q=0'})
+        assert 'content-encoding' not in r.headers
+
+    def test_highest_quality_wins(self):
+        r = client.get('/big', headers={'Accept-Encoding': 'br;q=0.5, gzip;q=1'})
+        assert r.headers['content-encoding'] == 'gzip'
+        r = client.get('/big', headers={'Accept-Encoding': '*'})
+        assert r.headers['content-encoding'] == 'br'
+
+    def test_streaming(self):
+        with client.stream('GET', '/stream', headers={'Accept-Encoding': 'gzip'}) as r:
+            raw = b''.join(r.iter_raw())
+        assert r.headers['content-encoding'] == 'gzip'
+        assert gzip.decompress(raw).decode() == BIG * 5
+
+    def test_stream_chunks_decode_on_arrival(self):
+        # Raw ASGI: the test client joins the chunks before handing them over
+        async def two_blocks(scope, receive, send):
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [(b'content-type', b'text/csv')]})
+            await send({'type': 'http.response.body', 'body': b'premier bloc\n', 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b'second bloc\n', 'more_body': False})
+
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {'type': 'http', 'headers': [(b'accept-encoding', b'gzip')]}
+        asyncio.run(CompressionMiddleware(two_blocks, minimum_size=500)(scope, None, send))
+        first, second = [m['body'] for m in sent[1:]]
+        decoder = zlib.decompressobj(31)
+        # The first chunk alone already decodes to the first block
+        assert decoder.decompress(first) == b'premier bloc\n'
+        assert decoder.decompress(second) == b'second bloc\n'
+
+    def test_pass_through(self):
+        assert 'content-encoding' not in client.get('/events', headers={'Accept-Encoding': 'gzip'}).headers
+        r = client.get('/not-modified', headers={'Accept-Encoding': 'gzip'})
+        assert r.status_code == 304
+        assert 'content-encoding' not in r.headers
+        assert stats.as_dict()['responses_compressed'] > 0
@@ -0,0 +1,56 @@
+"""
+Tests for streaming exports: CSV / NDJSON rows, chunking and gzip
+"""
+import asyncio
+import csv
+import gzip
+import io
+import json
+from datetime import datetime
+
+from bson import ObjectId
+
+from exports import EXPORT_COLUMNS, export_pipeline, stream_export
+
+COLUMNS = ['id', 'sku', 'quantity', 'created_at']
+
+
+async def documents(count):
+    for i in range(count):
+        yield {'_id': ObjectId(), 'sku': f'SKU-{i}', 'quantity': i, 'created_at': datetime(2025, 1, 1), 'secret': 'x'}
+
+
+def collect(count, fmt, compress=False, chunk_rows=10):
+    async def run():
+        return [chunk async for chunk in stream_export(documents(count), COLUMNS, fmt, compress, chunk_rows)]
+    return asyncio.run(run())
+
+
+class TestExports:
+    """Row formats, chunk boundaries and compression"""
+
+    def test_csv_header_and_rows(self):
+        chunks = collect(25, 'csv')
+        rows = list(csv.reader(io.StringIO(b''.join(chunks).decode())))
+        assert rows[0] == COLUMNS
+        assert len(rows) == 26
+        assert rows[1][1:] == ['SKU-0', '0', '2025-01-01T00:00:00']
+        # Header + 3 chunks of at most 10 rows
+        assert len(chunks) == 4
+
+    def test_ndjson_keeps_only_export_columns(self):
+        lines = b''.join(collect(3, 'ndjson')).decode().splitlines()
+        row = json.loads(lines[0])
+        assert list(row) == COLUMNS
+        assert row['quantity'] == 0
+
+    def test_gzip_round_trip(self):
+        plain = b''.join(collect(50, 'csv'))
+        compressed = b''.join(collect(50, 'csv', compress=True))
+        assert gzip.decompress(compressed).count(b'\n') == plain.count(b'\n')
+
+    def test_pipelines_match_before_joins(self):
+        for resource in EXPORT_COLUMNS:
+            pipeline = export_pipeline(resource, {'client_id': 'c1'})
+            assert pipeline[0] == {'$match': {'client_id': 'c1'}}
+            assert '$sort' in pipeline[1]
@@ -0,0 +1,95 @@
+"""
+Tests for the shared outbound HTTP clients: one client per upstream, transport metrics, shutdown
+No network: requests go through httpx.MockTransport
+"""
+import asyncio
+
+import httpx
+
+from http_clients import HttpClients, _MeteredTransport
+
+
+def metered(handler):
+    return _MeteredTransport(httpx.MockTransport(handler))
+
+
+class TestRegistry:
+    """One long-lived client per upstream, closed at shutdown"""
+
+    def test_client_reused_per_upstream(self):
+        async def scenario():
+            clients = HttpClients()
+            shopify = clients.get('shopify')
+            assert clients.get('shopify') is shopify
+            assert clients.get('carriers') is not shopify
+            assert set(clients.stats()['upstreams']) == {'shopify', 'carriers'}
+            await clients.aclose()
+        asyncio.run(scenario())
+
+    def test_timeouts_and_limits(self):
+        clients = HttpClients(connect_timeout=2.0, read_timeout=10.0, max_connections=7)
+        client = clients.get('shopify')
+        assert client.timeout.connect == 2.0 and client.timeout.read == 10.0
+        stats = clients.stats()
+        assert stats['max_connections'] == 7
+        assert stats['upstreams']['shopify']['connections'] == {'open': 0, 'idle': 0, 'http2': 0}
+        asyncio.run(clients.aclose())
+
+    def test_aclose_closes_every_client(self):
+        async def scenario():
+            clients = HttpClients()
+            opened = [clients.get('shopify'), clients.get('carriers')]
+            await clients.aclose()
+            assert all(client.is_closed for client in opened)
+            assert clients.stats()['upstreams'] == {}
+            # A later get() starts a fresh client
+            assert not clients.get('shopify').is_closed
+            await clients.aclose()
+        asyncio.run(scenario())
+
+
+class TestMeteredTransport:
+    """Requests, errors, time and concurrency are counted around the real transport"""
+
+    def test_requests_and_errors_counted(self):
+        def handler(request):
+            if request.url.path == '/down':
+                raise httpx.ConnectError('refused', request=request)
+            return httpx.Response(200, json={'ok': True})
+
+        async def scenario():
+            transport = metered(handler)
+            async with httpx.AsyncClient(transport=transport) as client:
+                assert (await client.get('http://upstream.test/ok')).json() == {'ok': True}
+                try:
+                    await client.get('http://upstream.test/down')
+                except httpx.ConnectError:
+                    pass
+            return transport
+
+        transport = asyncio.run(scenario())
+        assert transport.requests == 2
+        assert transport.errors == 1
+        assert transport.in_flight == 0
+        assert transport.total_ms >= 0
+
+    def test_peak_in_flight(self):
+        async def scenario():
+            release = asyncio.Event()
+
+            async def slow(request):
+                await release.wait()
+                return httpx.Response(204)
+
+            transport = metered(slow)
+            async with httpx.AsyncClient(transport=transport) as client:
+                calls = [asyncio.ensure_future(client.get(f'http://upstream.test/{i}')) for i in range(4)]
+                while transport.in_flight < 4:
+                    await asyncio.sleep(0)
+                release.set()
+                await asyncio.gather(*calls)
+            return transport
+
+        transport = asyncio.run(scenario())
+        assert transport.peak_in_flight == 4
+        assert transport.in_flight == 0 and transport.requests == 4
@@ -0,0 +1,32 @@
+"""
+Tests for the declarative index registry
+"""
+from indexes import INDEXES, declared_names
+
+
+class TestIndexRegistry:
+    """Hot query shapes are declared once, with the expected options"""
+
+    def test_hot_query_shapes_are_declared(self):
+        names = declared_names()
+        assert 'client_id_1_created_at_-1__id_-1' in names['orders']
+        assert 'product_id_1' in names['inventory']
+        assert 'client_id_1__id_1' in names['inventory']
+        assert 'order_id_1' in names['order_lines']
+        assert 'receipt_id_1' in names['receipt_lines']
+        assert 'created_at_-1' in names['email_notifications']
+        assert 'token_1' in names['password_reset_tokens']
+
+    def test_reset_tokens_expire(self):
+        ttl = [m.document for m in INDEXES['password_reset_tokens'] if 'expireAfterSeconds' in m.document]
+        assert ttl == [{'key': {'expires_at': 1}, 'name': 'expires_at_1', 'expireAfterSeconds': 0}]
+
+    def test_imported_orders_are_unique(self):
+        [model] = [m.document for m in INDEXES['orders'] if 'external_order_id' in m.document['key']]
+        assert list(model['key']) == ['client_id', 'external_platform', 'external_order_id']
+        assert model['unique'] and model['partialFilterExpression'] == {'external_order_id': {'$exists': True}}
+
+    def test_no_duplicate_declarations(self):
+        for name, models in INDEXES.items():
+            keys = [tuple(m.document['key'].items()) for m in models]
+            assert len(keys) == len(set(keys)), name
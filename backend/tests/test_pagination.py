@@ -0,0 +1,68 @@
+"""
+Tests for keyset pagination cursors and stages
+"""
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from pagination import (
+    InvalidPageRequest, decode_cursor, page_stages, parse_fields, parse_sort, project_stage, split_page, trim_fields
+)
+
+
+class TestPagination:
+    """Cursor round trip, whitelisting and stage ordering"""
+
+    def test_parse_sort_whitelist(self):
+        assert parse_sort('-created_at', ['created_at']) == ('created_at', -1)
+        assert parse_sort('sku', ['created_at', 'sku']) == ('sku', 1)
+        with pytest.raises(InvalidPageRequest):
+            parse_sort('password', ['created_at'])
+
+    def test_cursor_round_trip(self):
+        docs = [{'_id': ObjectId(), 'created_at': datetime(2025, 1, 10 - i)} for i in range(3)]
+        page, cursor = split_page(docs, 'created_at', -1, 2)
+        assert page == docs[:2]
+        value, last_id = decode_cursor(cursor, 'created_at', -1)
+        assert value == docs[1]['created_at']
+        assert last_id == docs[1]['_id']
+
+    def test_last_page_has_no_cursor(self):
+        docs = [{'_id': ObjectId(), 'created_at': datetime(2025, 1, 1)}]
+        assert split_page(docs, 'created_at', -1, 2) == (docs, None)
+
+    def test_cursor_bound_to_sort(self):
+        docs = [{'_id': ObjectId(), 'sku': f'SKU-{i}'} for i in range(3)]
+        _, cursor = split_page(docs, 'sku', 1, 2)
+        with pytest.raises(InvalidPageRequest):
+            decode_cursor(cursor, 'created_at', -1)
+        with pytest.raises(InvalidPageRequest):
+            decode_cursor('not-a-cursor', 'sku', 1)
+
+    def test_stages_match_before_sort_and_limit(self):
+        docs = [{'_id': ObjectId(), 'created_at': datetime(2025, 1, 10 - i)} for i in range(3)]
+        _, cursor = split_page(docs, 'created_at', -1, 2)
+        stages = page_stages({'client_id': 'c1'}, 'created_at', -1, cursor, 2)
+        assert list(stages[0]) == ['$match']
+        assert stages[0]['$match']['$and'][0] == {'client_id': 'c1'}
+        assert stages[1] == {'$sort': {'created_at': -1, '_id': -1}}
+        assert stages[2] == {'$limit': 3}
+
+    def test_parse_fields_whitelist(self):
+        assert parse_fields(None, ['sku']) is None
+        assert parse_fields('sku, name,sku', ['sku', 'name']) == ['sku', 'name']
+        with pytest.raises(InvalidPageRequest):
+            parse_fields('sku,password', ['sku'])
+
+    def test_project_keeps_sort_and_join_keys(self):
+        assert project_stage(['id', 'sku'], keep=['created_at']) == {'$project': {'sku': 1, 'created_at': 1}}
+
+    def test_trim_fields_nested(self):
+        oid = ObjectId()
+        docs = [{'_id': oid, 'created_at': datetime(2025, 1, 1), 'quantity': 2,
+                 'product': {'_id': oid, 'sku': 'A', 'weight': 1.5}}]
+        assert trim_fields(docs, ['quantity', 'product.sku']) == [
+            {'_id': oid, 'quantity': 2, 'product': {'_id': oid, 'sku': 'A'}}
+        ]
+        assert trim_fields(docs, None) is docs
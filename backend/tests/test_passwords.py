@@ -0,0 +1,43 @@
+"""
+Tests for the bounded bcrypt worker pool
+"""
+import asyncio
+import time
+
+import pytest
+
+from passwords import PasswordHasher, PasswordPoolBusy
+
+
+class TestPasswordHasher:
+    """Hash/verify round trip, queue cap and metrics"""
+
+    def test_hash_and_verify(self):
+        async def scenario():
+            hasher = PasswordHasher(workers=2, max_queue=4)
+            hashed = await hasher.hash('Secret2024')
+            assert await hasher.verify('Secret2024', hashed)
+            assert not await hasher.verify('wrong', hashed)
+            hasher.shutdown()
+            return hasher.stats()
+
+        stats = asyncio.run(scenario())
+        assert stats['completed'] == 3
+        assert stats['in_flight'] == 0
+        assert stats['queue_depth'] == 0
+
+    def test_queue_cap_rejects_overflow(self):
+        async def scenario():
+            hasher = PasswordHasher(workers=1, max_queue=2)
+            jobs = [asyncio.ensure_future(hasher._submit(time.sleep, 0.05)) for _ in range(3)]
+            await asyncio.sleep(0)
+            with pytest.raises(PasswordPoolBusy):
+                await hasher._submit(time.sleep, 0.05)
+            await asyncio.gather(*jobs)
+            hasher.shutdown()
+            return hasher.stats()
+
+        stats = asyncio.run(scenario())
+        assert stats['rejected'] == 1
+        assert stats['completed'] == 3
+        assert stats['peak_queue_depth'] >= 1
@@ -0,0 +1,87 @@
+"""
+Tests for pick-path routing over the Z{zone}-{aisle}{rack:02d}-{level} grid
+"""
+import random
+import time
+
+from pick_route import Layout, Slot, assign_locations, naive_order, parse_location, plan_route, route_length
+
+SEED_CODES = [f'Z{z}-{a}{r:02d}-{l}' for z in range(1, 5) for a in 'ABC' for r in range(1, 6) for l in range(1, 4)]
+LARGE_CODES = [f'Z{z}-{a}{r:02d}-{l}' for z in range(1, 7) for a in 'ABCDEFGH' for r in range(1, 31) for l in range(1, 5)]
+
+
+class TestDistanceModel:
+    """Ladder warehouse: aisles joined by front and back cross-aisles, zones side by side"""
+
+    def test_parse(self):
+        assert parse_location('Z2-B04-3') == Slot(2, 1, 4, 3)
+        assert parse_location('Z1-AB12-1') == Slot(1, 27, 12, 1)
+        assert parse_location('QUAI-1') is None
+        assert parse_location(None) is None
+
+    def test_walking_distances(self):
+        layout = Layout(SEED_CODES)  # 5 racks: back cross-aisle at 6 m
+        # Depot -> Z1-A03 -> depot, straight up aisle A
+        assert route_length(layout, ['Z1-A03-1']) == 6.0
+        # Levels of one rack are the same floor point
+        assert route_length(layout, ['Z1-A03-1', 'Z1-A03-3']) == 6.0
+        # Up A (5), A05 -> B05 round the back (1 + 3 + 1), down B and across to the depot (5 + 3)
+        assert route_length(layout, ['Z1-A05-1', 'Z1-B05-1']) == 5.0 + 5 + 8
+        # Next zone starts after 3 aisles and the 6 m zone gap
+        assert route_length(layout, ['Z2-A01-1']) == 2 * (15.0 + 1)
+
+
+class TestPlanRoute:
+    """Optimized visit order against the code-sorted one"""
+
+    def test_shorter_than_code_order(self):
+        layout = Layout(SEED_CODES)
+        codes = ['Z1-A05-1', 'Z1-A01-1', 'Z1-B05-2', 'Z1-B01-1', 'Z1-C05-1', 'Z1-C01-1']
+        route = plan_route(layout, codes)
+        # Code order walks every aisle upwards: 1 + 4 + 9 + 4 + 9 + 4 + 11
+        assert route_length(layout, naive_order(codes)) == 42.0
+        # Pure S-shape (up A, down B, up C) would be 34; 2-opt returns along the front instead
+        assert route.stops == ['Z1-A01-1', 'Z1-A05-1', 'Z1-B05-2', 'Z1-C05-1', 'Z1-C01-1', 'Z1-B01-1']
+        assert route.distance == route_length(layout, route.stops) == 28.0
+
+    def test_levels_grouped_and_unrouted_kept(self):
+        route = plan_route(Layout(SEED_CODES), ['Z1-B02-3', 'QUAI-1', 'Z1-B02-1', 'Z1-B02-3'])
+        assert route.stops == ['Z1-B02-1', 'Z1-B02-3']
+        assert route.unrouted == ['QUAI-1']
+        assert plan_route(Layout(SEED_CODES), []).stops == []
+
+    def test_never_longer_than_code_order(self):
+        layout = Layout(LARGE_CODES)
+        rng = random.Random(7)
+        for size in (1, 2, 5, 20, 60):
+            codes = rng.sample(LARGE_CODES, size)
+            route = plan_route(layout, codes)
+            assert sorted(route.stops) == naive_order(codes)
+            assert route.distance <= route_length(layout, naive_order(codes))
+
+    def test_200_lines_in_milliseconds(self):
+        layout = Layout(LARGE_CODES)
+        codes = random.Random(1).sample(LARGE_CODES, 200)
+        started = time.perf_counter()
+        route = plan_route(layout, codes)
+        elapsed = time.perf_counter() - started
+        assert route.distance < 0.9 * route_length(layout, naive_order(codes))
+        assert elapsed < 0.1
+
+
+class TestAssignLocations:
+    """Which location each product is picked from"""
+
+    def test_preferences(self):
+        stock = {
+            'p1': [('Z1-A01-1', 10)],
+            'p2': [('Z3-C05-1', 100), ('Z1-A01-1', 5), ('Z2-A01-1', 2)],
+            'p3': [('Z1-B01-1', 1), ('Z1-B02-1', 3)],
+            'p4': [('Z1-C01-1', 0)],
+        }
+        chosen = assign_locations({'p1': 2, 'p2': 4, 'p3': 5, 'p4': 1}, stock)
+        # p2: enough at the stop already on the route beats the fullest location
+        assert chosen['p1'] == chosen['p2'] == 'Z1-A01-1'
+        # p3: nowhere holds 5, take the fullest
+        assert chosen['p3'] == 'Z1-B02-1'
+        assert 'p4' not in chosen
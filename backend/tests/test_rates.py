@@ -0,0 +1,109 @@
+"""
+Tests for the table-driven carrier rate engine
+"""
+import time
+
+import numpy as np
+import pytest
+
+from rates import DEFAULT_RATE_CARDS, InvalidRateCard, RateCard, compile_cards, quote_batch
+
+CARD = {
+    'service': 'Standard',
+    'weight_breaks': [1, 5, 10],
+    'zones': {'FR': [], 'IDF': ['75', '92'], 'PARIS1': ['7501']},
+    'prices': {'FR': [6, 8, 12], 'IDF': [5, 7, 10], 'PARIS1': [4, 6, 9]},
+    'extra_kg': 1.0,
+    'surcharges': [
+        {'name': 'Corse', 'type': 'zip_prefix', 'prefixes': ['20'], 'amount': 10},
+        {'name': 'Lourd', 'type': 'weight_over', 'threshold': 8, 'amount': 3},
+        {'name': 'Signature', 'type': 'fixed', 'amount': 1},
+    ],
+}
+
+
+def quote(card, zips, weights):
+    return quote_batch([RateCard('TEST', 'Test', card)], zips, weights)[:, 0].tolist()
+
+
+class TestRateCard:
+    """Weight breaks, zones and surcharges"""
+
+    def test_weight_breaks_are_upper_bounds(self):
+        assert quote(CARD, ['69001', '69001', '69001'], [1, 1.01, 5]) == [7, 9, 9]
+
+    def test_longest_zip_prefix_wins(self):
+        # 7501x -> PARIS1, other 75 / 92 -> IDF, anything else -> default zone (+1 signature)
+        assert quote(CARD, ['75011', '75020', '92100', '13001'], [1, 1, 1, 1]) == [5, 6, 6, 7]
+
+    def test_surcharges(self):
+        # Corse zip surcharge; heavy surcharge above 8 kg
+        assert quote(CARD, ['20000', '69001'], [1, 9]) == [17, 16]
+
+    def test_above_last_break_uses_extra_kg_or_is_not_carried(self):
+        assert quote(CARD, ['69001'], [12.5]) == [12 + 3 * 1 + 3 + 1]
+        no_extra = {**CARD, 'extra_kg': None}
+        assert np.isnan(quote(no_extra, ['69001'], [12.5])[0])
+
+    def test_zip_without_zone_is_not_carried(self):
+        card = {**CARD, 'zones': {'IDF': ['75']}, 'prices': {'IDF': [5, 7, 10]}}
+        prices = quote(card, ['75001', '69001'], [1, 1])
+        assert prices[0] == 6 and np.isnan(prices[1])
+
+    def test_percent_applies_last(self):
+        card = {**CARD, 'surcharges': [{'type': 'fixed', 'amount': 2}, {'type': 'percent', 'rate': 10}]}
+        assert quote(card, ['69001'], [1]) == [8.8]
+
+    @pytest.mark.parametrize('broken', [
+        {'weight_breaks': [5, 1]},
+        {'prices': {'FR': [6, 8], 'IDF': [5, 7, 10], 'PARIS1': [4, 6, 9]}},
+        {'surcharges': [{'type': 'discount', 'amount': 1}]},
+    ])
+    def test_invalid_cards_are_rejected(self, broken):
+        with pytest.raises(InvalidRateCard):
+            RateCard('TEST', 'Test', {**CARD, **broken})
+
+
+def previous_rates(weight):
+    """Prices of the former hardcoded get_shipping_rates, in DEFAULT_RATE_CARDS order"""
+    base_colissimo = 4.95 + (weight * 0.5)
+    base_chrono = 9.90 + (weight * 1.2)
+    return [round(base_colissimo, 2), round(base_colissimo + 1.50, 2), round(base_chrono, 2), round(base_chrono * 0.85, 2)]
+
+
+class TestDefaults:
+    """Carriers without rate_cards keep the historical prices"""
+
+    def test_default_cards_match_previous_formulas(self):
+        cards = compile_cards([{'code': 'COLISSIMO', 'name': 'Colissimo'}, {'code': 'CHRONOPOST', 'name': 'Chronopost'}])
+        # Between and on breaks, above 30 kg, Corse, DOM and odd zips: the former formulas ignored the zip
+        weights = [0.1, 1.0, 1.3, 2.75, 9.99, 30, 30.5, 45.2, 120]
+        zips = ['69001', '20000', '20200', '97100', '97400', '75011', 'ABC', '']
+        all_zips = [z for z in zips for _ in weights]
+        prices = quote_batch(cards, all_zips, weights * len(zips))
+        assert prices.tolist() == [previous_rates(w) for w in weights] * len(zips)
+        # Dense weight grid, rounding included
+        grid = np.round(np.arange(0.01, 60, 0.01), 2)
+        prices = quote_batch(cards, ['69001'] * len(grid), grid)
+        assert prices.tolist() == [previous_rates(w) for w in grid.tolist()]
+
+    def test_carrier_without_card_has_no_service(self):
+        assert compile_cards([{'code': 'UPS', 'name': 'UPS'}]) == []
+        assert set(DEFAULT_RATE_CARDS) == {'COLISSIMO', 'CHRONOPOST'}
+
+
+class TestBatch:
+    """10k parcels for every default service well under 100 ms"""
+
+    def test_ten_thousand_parcels(self):
+        rng = np.random.default_rng(0)
+        zips = [f'{z:05d}' for z in rng.integers(1000, 98000, 10000)]
+        weights = rng.uniform(0.1, 29, 10000)
+        cards = compile_cards([{'code': 'COLISSIMO', 'name': 'Colissimo'}, {'code': 'CHRONOPOST', 'name': 'Chronopost'}])
+        quote_batch(cards, zips, weights)
+        started = time.perf_counter()
+        prices = quote_batch(cards, zips, weights)
+        elapsed = time.perf_counter() - started
+        assert prices.shape == (10000, 4)
+        assert not np.isnan(prices).any()
+        assert elapsed < 0.1
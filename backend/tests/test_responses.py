@@ -0,0 +1,35 @@
+"""
+Tests for the orjson response class: same output as serialize_doc
+"""
+import json
+from datetime import datetime, timezone
+
+from bson import ObjectId
+
+from responses import MongoJSONResponse, page_response
+
+
+class TestMongoJSONResponse:
+    """ObjectId / datetime handling and _id renaming at every depth"""
+
+    def test_document_shape(self):
+        oid, nested = ObjectId(), ObjectId()
+        doc = {
+            '_id': oid,
+            'created_at': datetime(2025, 1, 2, 3, 4, 5, 123000),
+            'shipped_at': datetime(2025, 1, 2, tzinfo=timezone.utc),
+            'product': [{'_id': nested, 'name': 'a "_id": b'}],
+            'tracking_number': None,
+        }
+        body = json.loads(MongoJSONResponse([doc]).body)
+        assert body == [{
+            'id': str(oid),
+            'created_at': '2025-01-02T03:04:05.123000',
+            'shipped_at': '2025-01-02T00:00:00+00:00',
+            'product': [{'id': str(nested), 'name': 'a "_id": b'}],
+            'tracking_number': None,
+        }]
+
+    def test_page_response_cursor_header(self):
+        assert page_response([], 'abc').headers['X-Next-Cursor'] == 'abc'
+        assert 'X-Next-Cursor' not in page_response([], None).headers
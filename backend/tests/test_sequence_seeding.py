@@ -0,0 +1,30 @@
+"""
+Tests for counter seeding at startup: counters start above the highest
+number already issued (needs a MongoDB in TEST_MONGO_URL)
+"""
+import sequences
+
+
+class TestInitSequences:
+    """Counters start above the highest number already issued, not the document count"""
+
+    def test_seeded_from_highest_number(self, mongo):
+        async def scenario(db):
+            # Gaps left by deletions, two order prefixes, a client code past its padding
+            await db.orders.insert_many([{'order_number': n} for n in ('CMD-000007', 'SHOP-000012', 'CMD-000003')])
+            await db.receipts.insert_one({'receipt_number': 'TEST-REC-999'})
+            await db.clients.insert_many([{'code': 'CLI999'}, {'code': 'CLI1000'}])
+            await sequences.init_sequences(db)
+            assert await sequences.next_number(db, 'orders') == 13
+            assert await sequences.next_number(db, 'receipts') == 1
+            assert await sequences.next_number(db, 'clients') == 1001
+        mongo(scenario)
+
+    def test_existing_counter_kept(self, mongo):
+        """Once created, the counter is the source of truth: no recount at startup"""
+        async def scenario(db):
+            await db.counters.insert_one({'_id': 'orders', 'value': 40})
+            await db.orders.insert_one({'order_number': 'CMD-000050'})
+            await sequences.init_sequences(db)
+            assert await sequences.next_number(db, 'orders') == 41
+        mongo(scenario)
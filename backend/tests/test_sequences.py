@@ -0,0 +1,68 @@
+"""
+Concurrency test for the atomic document-number sequences
+Many parallel creators must never receive the same order / receipt number
+"""
+import pytest
+import requests
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+PARALLEL_CREATORS = int(os.environ.get('SEQUENCE_TEST_CREATORS', '50'))
+
+
+class TestSequences:
+    """Parallel creates get distinct, gap-free numbers"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Get auth token and a client id for tests"""
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "username": "admin",
+            "password": "admin123"
+        })
+        assert response.status_code == 200, f"Login failed: {response.text}"
+        self.headers = {"Authorization": f"Bearer {response.json()['token']}"}
+
+        clients_resp = requests.get(f"{BASE_URL}/api/clients", headers=self.headers)
+        assert clients_resp.status_code == 200
+        clients = clients_resp.json()
+        if not clients:
+            pytest.skip("No client found to create orders for")
+        self.client_id = clients[0]['id']
+
+    def _create_order(self, i):
+        response = requests.post(f"{BASE_URL}/api/orders/create", headers=self.headers, json={
+            "client_id": self.client_id,
+            "customer_name": f"TEST_SEQ {i}",
+            "customer_email": f"seq{i}@test.fr",
+            "shipping_address": "1 Rue du Test, 75001 Paris",
+            "products": []
+        })
+        assert response.status_code == 200, f"Create failed: {response.text}"
+        return response.json()['order_number']
+
+    def _create_receipt(self, i):
+        response = requests.post(f"{BASE_URL}/api/receipts/create", headers=self.headers, json={
+            "client_id": self.client_id,
+            "supplier_name": f"TEST_SEQ {i}",
+            "expected_date": "2026-01-01",
+            "products": []
+        })
+        assert response.status_code == 200, f"Create failed: {response.text}"
+        return response.json()['receipt_number']
+
+    def test_parallel_order_numbers_are_unique(self):
+        with ThreadPoolExecutor(max_workers=PARALLEL_CREATORS) as pool:
+            numbers = list(pool.map(self._create_order, range(PARALLEL_CREATORS)))
+        assert len(set(numbers)) == len(numbers), f"Duplicate order numbers: {sorted(numbers)}"
+        values = sorted(int(n.split('-')[-1]) for n in numbers)
+        # Numbers come from a single counter: one contiguous block when nothing else writes
+        assert values[-1] - values[0] >= len(values) - 1
+        print(f"SUCCESS: {len(numbers)} parallel orders, numbers {values[0]}..{values[-1]}")
+
+    def test_parallel_receipt_numbers_are_unique(self):
+        with ThreadPoolExecutor(max_workers=PARALLEL_CREATORS) as pool:
+            numbers = list(pool.map(self._create_receipt, range(PARALLEL_CREATORS)))
+        assert len(set(numbers)) == len(numbers), f"Duplicate receipt numbers: {sorted(numbers)}"
+        print(f"SUCCESS: {len(numbers)} parallel receipts, all numbers distinct")
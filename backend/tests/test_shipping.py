@@ -0,0 +1,169 @@
+"""
+Tests for wave shipments: carrier adapter, bounded concurrency and per-order errors
+Runs against the local fake carrier app (no network, no MongoDB)
+"""
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import httpx
+from bson import ObjectId
+
+os.environ.setdefault('FAKE_CARRIER_LATENCY_MS', '20')
+os.environ.setdefault('FAKE_CARRIER_503_EVERY', '7')
+
+from benchmarks import fake_carrier  # noqa: E402
+from shipping import (CarrierError, DemoCarrier, HttpCarrier, adapter_for, create_labels,  # noqa: E402
+                      retry_after_seconds, tracking_url)
+
+CARRIER = {'code': 'FAKE', 'api_base_url': 'http://carrier.test/', 'api_key': 'k',
+           'tracking_url_template': 'https://track.test/{tracking}'}
+
+
+def orders(count):
+    return [{'_id': ObjectId(), 'order_number': f'CMD-{n:06d}'} for n in range(count)]
+
+
+def label_wave(wave, weights, concurrency):
+    """Labels from the fake carrier; 1 kg for every order not in `weights`"""
+    weights = {**{str(o['_id']): 1.0 for o in wave}, **weights}
+
+    async def run():
+        transport = httpx.ASGITransport(app=fake_carrier.app)
+        async with httpx.AsyncClient(transport=transport) as http:
+            return await create_labels(HttpCarrier(CARRIER, http), wave, weights, 'standard', concurrency)
+    return asyncio.run(run())
+
+
+class FlakyCarrier:
+    """Fails with an unexpected exception on the orders of `broken`, counts its calls"""
+
+    mode = 'live'
+
+    def __init__(self, broken):
+        self.broken = broken
+        self.calls = 0
+
+    async def create_shipment(self, order, weight, service_type):
+        self.calls += 1
+        if order['_id'] in self.broken:
+            raise RuntimeError('socket closed')
+        return {'tracking_number': f"T{order['order_number']}"}
+
+
+class TestAdapters:
+    """Live carriers need an api_base_url, the others stay in demo mode"""
+
+    def test_adapter_choice(self):
+        assert isinstance(adapter_for(CARRIER, None), HttpCarrier)
+        assert isinstance(adapter_for({'code': 'COLISSIMO'}, None), DemoCarrier)
+
+    def test_demo_prefix_and_tracking_url(self):
+        label = asyncio.run(DemoCarrier({'code': 'COLISSIMO'}).create_shipment({}, 1.0, 'standard'))
+        assert label['tracking_number'].startswith('6A')
+        assert tracking_url(CARRIER, 'X1') == 'https://track.test/X1'
+        assert tracking_url({}, 'X1') is None
+
+
+class TestWaveLabels:
+    """Bounded parallelism, retries and per-order failures"""
+
+    def test_every_order_gets_a_label_within_the_concurrency_bound(self):
+        fake_carrier.stats['peak_in_flight'] = 0
+        wave = orders(60)
+        labels = label_wave(wave, {}, concurrency=8)
+        assert set(labels) == {o['_id'] for o in wave}
+        # 503s are retried: every label comes through
+        assert all(not isinstance(label, CarrierError) for label in labels.values())
+        assert len({label['tracking_number'] for label in labels.values()}) == 60
+        assert fake_carrier.stats['peak_in_flight'] <= 8
+
+    def test_refused_parcel_fails_alone(self):
+        wave = orders(3)
+        labels = label_wave(wave, {str(wave[1]['_id']): 50.0}, concurrency=3)
+        assert isinstance(labels[wave[1]['_id']], CarrierError)
+        assert 'Poids' in str(labels[wave[1]['_id']])
+        assert not isinstance(labels[wave[0]['_id']], CarrierError)
+
+    def test_non_json_error_body_fails_alone(self):
+        wave = orders(3)
+        wave[0]['order_number'] = 'BROKEN-1'
+        labels = label_wave(wave, {}, concurrency=3)
+        assert str(labels[wave[0]['_id']]) == 'Erreur transporteur : HTTP 500'
+        assert all(not isinstance(labels[o['_id']], CarrierError) for o in wave[1:])
+
+    def test_unexpected_error_keeps_the_labels_already_bought(self):
+        wave = orders(5)
+        carrier = FlakyCarrier({wave[2]['_id']})
+        labels = asyncio.run(create_labels(carrier, wave, {str(o['_id']): 1.0 for o in wave}, 'standard', 2))
+        assert str(labels[wave[2]['_id']]) == 'Erreur transporteur : RuntimeError'
+        assert [labels[o['_id']]['tracking_number'] for o in wave if o is not wave[2]] == [
+            f"T{o['order_number']}" for o in wave if o is not wave[2]
+        ]
+
+    def test_missing_or_zero_weight_never_reaches_the_carrier(self):
+        wave = orders(4)
+        carrier = FlakyCarrier(set())
+        weights = {str(wave[0]['_id']): 0, str(wave[1]['_id']): None, str(wave[2]['_id']): -1.0}
+        labels = asyncio.run(create_labels(carrier, wave, weights, 'standard', 2))
+        assert [str(labels[o['_id']]) for o in wave[:3]] == ['Poids manquant ou invalide'] * 3
+        assert carrier.calls == 0
+
+
+def post_once(handler):
+    """One HttpCarrier shipment through `handler`; returns (result or CarrierError, requests seen)"""
+    seen = []
+
+    def record(request):
+        seen.append(request)
+        return handler(request)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(record)) as http:
+            try:
+                return await HttpCarrier(CARRIER, http).create_shipment(orders(1)[0], 1.0, 'standard')
+            except CarrierError as e:
+                return e
+    return asyncio.run(run()), seen
+
+
+class TestRetries:
+    """A label purchase is only re-sent when the carrier cannot have seen it"""
+
+    def test_read_timeout_is_not_retried(self):
+        def timeout(request):
+            raise httpx.ReadTimeout('timed out', request=request)
+        result, seen = post_once(timeout)
+        assert str(result) == 'Réponse transporteur perdue : ReadTimeout'
+        assert len(seen) == 1
+
+    def test_connect_error_is_retried_with_the_same_key(self):
+        attempts = []
+
+        def flaky(request):
+            attempts.append(request)
+            if len(attempts) < 3:
+                raise httpx.ConnectError('refused', request=request)
+            return httpx.Response(200, json={'tracking_number': 'T1'})
+        result, seen = post_once(flaky)
+        assert result == {'tracking_number': 'T1'}
+        assert len(seen) == 3 and len({r.headers['Idempotency-Key'] for r in seen}) == 1
+
+    def test_fake_carrier_replays_a_known_key(self):
+        wave = orders(2)
+        before = fake_carrier.stats['labels']
+        first = label_wave(wave, {}, concurrency=2)
+        again = label_wave(wave, {}, concurrency=2)
+        assert [first[o['_id']] for o in wave] == [again[o['_id']] for o in wave]
+        assert fake_carrier.stats['labels'] == before + 2
+
+    def test_retry_after_forms(self):
+        assert retry_after_seconds('3', 1.0) == 3.0
+        assert retry_after_seconds(None, 1.0) == 1.0
+        assert retry_after_seconds('bientôt', 1.0) == 1.0
+        in_ten = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=10), usegmt=True)
+        assert 0 < retry_after_seconds(in_ten, 1.0) <= 10
+        past = format_datetime(datetime.now(timezone.utc) - timedelta(days=1), usegmt=True)
+        assert retry_after_seconds(past, 1.0) == 0.0
+        assert retry_after_seconds('3600', 1.0) == 30.0
@@ -0,0 +1,75 @@
+"""
+Tests for the incremental Shopify sync: Link pagination and cursor handling
+Runs the page walker against the local fake Shopify app (no network, no MongoDB)
+Page writes need a MongoDB in TEST_MONGO_URL
+"""
+import asyncio
+import os
+
+import httpx
+
+os.environ.setdefault('FAKE_SHOPIFY_ORDERS', '600')
+
+from benchmarks import fake_shopify  # noqa: E402
+from shopify_sync import advance_cursor, first_page_params, iter_pages, next_page_url, write_page  # noqa: E402
+
+
+def walk(cursor):
+    async def run():
+        transport = httpx.ASGITransport(app=fake_shopify.app)
+        async with httpx.AsyncClient(transport=transport) as http:
+            return [page async for page in iter_pages(http, 'http://shop.test', 'token', cursor)]
+    return asyncio.run(run())
+
+
+class TestShopifySync:
+    """Link header parsing, first-page parameters and full store walk"""
+
+    def test_next_page_url(self):
+        header = '<https://s.myshopify.com/orders.json?page_info=abc>; rel="previous", <https://s.myshopify.com/orders.json?page_info=def>; rel="next"'
+        assert next_page_url(header) == 'https://s.myshopify.com/orders.json?page_info=def'
+        assert next_page_url('<https://s.myshopify.com/orders.json?page_info=abc>; rel="previous"') is None
+        assert next_page_url(None) is None
+
+    def test_first_page_params(self):
+        assert first_page_params({})['since_id'] == 0
+        params = first_page_params({'updated_at_min': '2024-01-01T00:00:00+00:00'})
+        assert params['order'] == 'updated_at asc'
+        assert 'since_id' not in params
+
+    def test_backfill_follows_every_page(self):
+        pages = walk({})
+        orders = [o for page, _ in pages for o in page]
+        assert len(pages) == 3
+        assert [last for _, last in pages] == [False, False, True]
+        assert len({o['id'] for o in orders}) == len(fake_shopify.ORDERS)
+
+    def test_cursor_switches_to_updated_at_after_backfill(self):
+        cursor = {}
+        for orders, last_page in walk(cursor):
+            cursor = advance_cursor(cursor, orders, last_page, '2030-01-01T00:00:00+00:00')
+        assert cursor == {'updated_at_min': '2030-01-01T00:00:00+00:00'}
+        assert walk(cursor) == [([], True)]
+
+    def test_interrupted_backfill_resumes(self):
+        first_page, last_page = walk({})[0]
+        cursor = advance_cursor({}, first_page, last_page, '2030-01-01T00:00:00+00:00')
+        assert cursor['since_id'] == first_page[-1]['id']
+        remaining = [o for page, _ in walk(cursor) for o in page]
+        assert len(remaining) == len(fake_shopify.ORDERS) - len(first_page)
+
+
+class TestWritePage:
+    """Imported orders are unique per tenant, not across tenants"""
+
+    def test_same_external_id_in_two_tenants(self, mongo):
+        orders = [{'id': 1001, 'updated_at': '2030-01-01T00:00:00+00:00'}]
+
+        async def scenario(db):
+            for client_id in ('client-a', 'client-b'):
+                assert await write_page(db, {'client_id': client_id}, orders, None, False) == (1, 0)
+            # Re-importing updates the tenant's own order only
+            orders[0]['updated_at'] = '2030-01-02T00:00:00+00:00'
+            assert await write_page(db, {'client_id': 'client-a'}, orders, None, False) == (0, 1)
+            assert await db.orders.count_documents({'external_order_id': '1001'}) == 2
+        mongo(scenario)
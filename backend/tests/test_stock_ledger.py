@@ -0,0 +1,124 @@
+"""
+Tests for the stock movement ledger: movement legs and validation, compaction
+and as-of reads (those need a MongoDB in TEST_MONGO_URL)
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson import ObjectId
+
+from stock_ledger import (
+    MOVEMENT_TYPES, CompactionRunning, compact_snapshots, last_compaction, movement_legs, record_movement, stock_as_of,
+)
+
+
+class TestMovementLegs:
+    """Signed quantities per location for each movement type (no MongoDB needed)"""
+
+    def test_receipt_adds_and_pick_removes(self):
+        assert movement_legs('receipt', 5, 'A') == [('A', 5)]
+        assert movement_legs('pick', 5, 'A') == [('A', -5)]
+
+    def test_adjustment_keeps_its_sign(self):
+        assert movement_legs('adjustment', -3, 'A') == [('A', -3)]
+        assert movement_legs('adjustment', 3, 'A') == [('A', 3)]
+
+    def test_transfer_removes_first_and_nets_to_zero(self):
+        legs = movement_legs('transfer', 4, 'A', 'B')
+        assert legs == [('A', -4), ('B', 4)]
+        assert sum(quantity for _, quantity in legs) == 0
+
+    @pytest.mark.parametrize('args', [
+        ('receipt', 0, 'A'),
+        ('pick', -2, 'A'),
+        ('adjustment', 0, 'A'),
+        ('transfer', 2, 'A'),
+        ('transfer', 2, 'A', 'A'),
+        ('sale', 1, 'A'),
+    ])
+    def test_invalid_movements_are_rejected(self, args):
+        with pytest.raises(ValueError):
+            movement_legs(*args)
+
+    def test_every_type_is_handled(self):
+        for movement_type in MOVEMENT_TYPES:
+            assert movement_legs(movement_type, 1, 'A', 'B')
+
+
+def product():
+    return {'_id': ObjectId(), 'client_id': ObjectId(), 'is_demo_tenant': False}
+
+
+async def tick():
+    # Movements and cuts are stored to the millisecond: keep them apart
+    await asyncio.sleep(0.01)
+    now = datetime.now(timezone.utc)
+    await asyncio.sleep(0.01)
+    return now
+
+
+class TestSnapshots:
+    """Compaction and as-of reads against MongoDB (TEST_MONGO_URL)"""
+
+    def test_stable_pairs_are_carried_forward(self, mongo):
+        a, b = product(), product()
+        here, there = ObjectId(), ObjectId()
+
+        async def scenario(db):
+            await record_movement(db, a, 'receipt', 10, here)
+            await record_movement(db, b, 'receipt', 4, here)
+            first = (await compact_snapshots(db, until=await tick()))['as_of']
+            await record_movement(db, b, 'transfer', 4, here, there)
+            await record_movement(db, b, 'pick', 1, there)
+            second = await compact_snapshots(db, until=await tick())
+
+            # a did not move: still in the second snapshot. b emptied `here`: dropped
+            rows = await db.stock_snapshots.find({'as_of': second['as_of']}).to_list(length=None)
+            assert second['snapshots'] == 2
+            assert {(r['product_id'], r['location_id']): r['quantity'] for r in rows} == {
+                (a['_id'], here): 10, (b['_id'], there): 3,
+            }
+            # Reads one compaction plus its tail
+            await record_movement(db, a, 'pick', 2, here)
+            now = await tick()
+            assert [(r['product_id'], r['quantity']) for r in await stock_as_of(db, {'product_id': a['_id']}, now)] == [(a['_id'], 8)]
+            assert await stock_as_of(db, {'product_id': b['_id']}, first) == [
+                {'product_id': b['_id'], 'location_id': here, 'quantity': 4},
+            ]
+            assert await stock_as_of(db, {'client_id': b['client_id']}, now) == [
+                {'product_id': b['_id'], 'location_id': there, 'quantity': 3},
+            ]
+        mongo(scenario)
+
+    def test_interrupted_run_is_resumed_through_its_lease(self, mongo):
+        a = product()
+        here = ObjectId()
+
+        async def scenario(db):
+            await record_movement(db, a, 'receipt', 5, here)
+            cut = (await tick()).replace(microsecond=0)
+            await db.stock_snapshot_runs.insert_one({
+                'status': 'running', 'as_of': cut, 'attempts': 1,
+                'lease_until': datetime.now(timezone.utc) + timedelta(minutes=5),
+            })
+            # Live lease: another worker is on it
+            with pytest.raises(CompactionRunning):
+                await compact_snapshots(db)
+
+            # The worker died half way: lease expired, one wrong row written
+            await db.stock_snapshot_runs.update_one({'status': 'running'}, {'$set': {
+                'lease_until': datetime.now(timezone.utc) - timedelta(seconds=1),
+            }})
+            await db.stock_snapshots.insert_one({
+                '_id': {'product_id': a['_id'], 'location_id': here, 'as_of': cut},
+                'product_id': a['_id'], 'location_id': here, 'client_id': a['client_id'], 'as_of': cut, 'quantity': 99,
+            })
+            result = await compact_snapshots(db)
+            assert result['as_of'].replace(tzinfo=timezone.utc) == cut
+            assert result['snapshots'] == 1
+            run = await db.stock_snapshot_runs.find_one({})
+            assert run['status'] == 'completed' and run['attempts'] == 2 and 'lease_until' not in run
+            assert (await db.stock_snapshots.find_one({'as_of': cut}))['quantity'] == 5
+            assert await last_compaction(db) == cut.replace(tzinfo=None)
+        mongo(scenario)
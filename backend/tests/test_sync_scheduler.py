@@ -0,0 +1,96 @@
+"""
+Tests for the integration sync scheduler: job selection and backoff
+"""
+import asyncio
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from sync_scheduler import SyncScheduler
+
+
+async def job(integration):
+    return {}
+
+
+class TestSyncScheduler:
+    """Flags to jobs mapping and backoff bounds (no MongoDB needed)"""
+
+    def scheduler(self, **kwargs):
+        return SyncScheduler(None, {('shopify', 'orders'): job}, interval=300, **kwargs)
+
+    def test_kinds_follow_flags_and_registered_jobs(self):
+        scheduler = self.scheduler()
+        integration = {'_id': 1, 'platform': 'shopify', 'auto_sync_orders': True, 'auto_sync_stock': True}
+        # No stock job registered for Shopify
+        assert scheduler._kinds(integration) == ['orders']
+        assert scheduler._kinds({**integration, 'auto_sync_orders': False}) == []
+        assert scheduler._kinds({**integration, 'platform': 'woocommerce'}) == []
+
+    def test_backoff_grows_and_is_capped(self):
+        scheduler = self.scheduler(jitter=0, max_backoff=1000)
+        assert scheduler._backoff(0) == 75
+        assert scheduler._backoff(2) == 300
+        assert scheduler._backoff(10) == 1000
+
+    def test_backoff_honours_retry_after(self):
+        scheduler = self.scheduler(jitter=0)
+        assert scheduler._backoff(0, retry_after=120) == 120
+
+    def test_store_key_groups_integrations_of_one_store(self):
+        a = {'_id': 1, 'store_url': 'Boutique.myshopify.com/'}
+        b = {'_id': 2, 'store_url': 'boutique.myshopify.com'}
+        assert SyncScheduler._store_key(a) == SyncScheduler._store_key(b)
+
+
+class RecordingIntegrations:
+    """integrations collection stub: records every update"""
+
+    def __init__(self):
+        self.updates = []
+
+    async def update_one(self, query, update):
+        self.updates.append((query, update))
+
+
+class TestCancellation:
+    """A sync cancelled by a shutdown frees its integration (no MongoDB needed)"""
+
+    def test_cancelled_run_releases_the_lease(self):
+        async def scenario():
+            started = asyncio.Event()
+
+            async def endless(integration):
+                started.set()
+                await asyncio.sleep(3600)
+
+            db = SimpleNamespace(integrations=RecordingIntegrations())
+            scheduler = SyncScheduler(db, {('shopify', 'orders'): endless})
+            integration = {'_id': 1, 'platform': 'shopify', 'auto_sync_orders': True}
+            scheduler._store_running['store'] += 1
+            task = asyncio.ensure_future(scheduler._run(integration, 'store', datetime.now(timezone.utc)))
+            scheduler._running[1] = task
+            await asyncio.wait_for(started.wait(), 5)
+            await scheduler.stop()
+            assert task.cancelled()
+            assert db.integrations.updates == [({'_id': 1}, {'$set': {'sync_lease_until': None}})]
+            assert scheduler.stats()['running'] == 0
+        asyncio.run(scenario())
+
+
+class TestLease:
+    """Scheduled and manual syncs share sync_lease_until (needs TEST_MONGO_URL)"""
+
+    def test_one_sync_at_a_time(self, mongo):
+        async def scenario(db):
+            scheduler = SyncScheduler(db, {('shopify', 'orders'): job}, interval=300)
+            integration_id = (await db.integrations.insert_one({'platform': 'shopify'})).inserted_id
+            assert await scheduler.claim(integration_id)
+            assert not await scheduler.claim(integration_id)
+            await scheduler.release(integration_id)
+            assert await scheduler.claim(integration_id)
+            # A long sync renews its lease page after page
+            before = (await db.integrations.find_one({'_id': integration_id}))['sync_lease_until']
+            await asyncio.sleep(0.01)
+            await scheduler.renew(integration_id)
+            assert (await db.integrations.find_one({'_id': integration_id}))['sync_lease_until'] > before
+        mongo(scenario)
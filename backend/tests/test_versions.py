@@ -0,0 +1,24 @@
+"""
+Tests for change-version ETags
+"""
+from versions import etag_matches, make_etag
+
+
+class TestVersions:
+    """ETag shape and weak If-None-Match comparison"""
+
+    def test_etag_depends_on_version_and_request(self):
+        etag = make_etag('orders', 'c1', 3, 'client|c1|limit=50')
+        assert etag.startswith('W/"orders-3-')
+        assert etag == make_etag('orders', 'c1', 3, 'client|c1|limit=50')
+        assert etag != make_etag('orders', 'c1', 4, 'client|c1|limit=50')
+        assert etag != make_etag('orders', 'c1', 3, 'client|c1|limit=100')
+
+    def test_weak_comparison(self):
+        etag = make_etag('products', '*', 1, 'admin|*|')
+        assert etag_matches(etag, etag)
+        assert etag_matches(etag[2:], etag)
+        assert etag_matches(f'W/"other", {etag}', etag)
+        assert etag_matches('*', etag)
+        assert not etag_matches(None, etag)
+        assert not etag_matches('W/"other"', etag)